@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Message codecs microbenchmark.
+
+Parses and builds random messages of the hot LVAPP and module message
+types with the compiled codecs and with the construct definitions, checks
+that the results match and reports the messages parsed and built per
+second.
+"""
+
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+
+from empower.core.codec import random_message
+from empower.lvapp import HELLO
+from empower.lvapp import PROBE_REQUEST
+from empower.lvapp import AUTH_REQUEST
+from empower.lvapp import ASSOC_REQUEST
+from empower.lvapp import CAPS
+from empower.lvapp import SET_PORT
+from empower.lvapp import STATUS_PORT
+from empower.maps.maps import POLLER_RESPONSE
+from empower.counters.counters import STATS_RESPONSE
+from empower.triggers.summary import SUMMARY_TRIGGER
+
+MESSAGES = [HELLO, PROBE_REQUEST, AUTH_REQUEST, ASSOC_REQUEST, CAPS,
+            SET_PORT, STATUS_PORT, POLLER_RESPONSE, STATS_RESPONSE,
+            SUMMARY_TRIGGER]
+
+
+def run(func, items):
+    """Call func on all the items, return the elapsed time and the
+    results."""
+
+    start = time.perf_counter()
+    results = [func(x) for x in items]
+
+    return time.perf_counter() - start, results
+
+
+def main():
+    """Parse the command line and run the benchmark."""
+
+    parser = ArgumentParser(description="Message codecs microbenchmark")
+
+    parser.add_argument("-n", "--messages", dest="messages", default=5000,
+                        type=int, help="Messages per type; default=5000")
+    parser.add_argument("-e", "--entries", dest="entries", default=64,
+                        type=int, help="Max variable length field size; "
+                        "default=64")
+
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+
+    print("%u messages per type" % args.messages)
+    print("%-16s %12s %12s %8s %12s %12s %8s" %
+          ("message", "parse", "compiled", "", "build", "compiled", ""))
+
+    for codec in MESSAGES:
+
+        msgs = [random_message(rnd, codec, args.entries)
+                for _ in range(args.messages)]
+
+        legacy_build, expected = run(codec.construct.build, msgs)
+        build, results = run(codec.build, msgs)
+
+        if results != expected:
+            print("%s: built messages do not match" % codec.name)
+            sys.exit(1)
+
+        legacy_parse, expected = run(codec.construct.parse, results)
+        parse, results = run(codec.parse, results)
+
+        if results != expected:
+            print("%s: parsed messages do not match" % codec.name)
+            sys.exit(1)
+
+        print("%-16s %10.0f/s %10.0f/s %7.1fx %10.0f/s %10.0f/s %7.1fx" %
+              (codec.name,
+               args.messages / legacy_parse, args.messages / parse,
+               legacy_parse / parse,
+               args.messages / legacy_build, args.messages / build,
+               legacy_build / build))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,895 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""EmPOWER WTP emulator.
+
+Connects a number of emulated WTPs to an LVAPP server and drives a
+population of emulated stations through the probe/auth/assoc handshake.
+ADD_LVAP, SET_PORT, ADD_VAP and the module requests (ucqm, ncqm, counters,
+rates, txp bin counters, summary and rssi triggers) are answered with
+synthetic data. Periodically reports the probe to association latency
+percentiles, the message rates and (optionally) the controller CPU usage.
+
+The WTPs must be known to the controller. Use --tenant-id to register the
+emulated WTPs and to add them to the given tenant through the REST API.
+"""
+
+import os
+import time
+import json
+import base64
+import random
+import socket
+import struct
+import getpass
+import logging
+import tornado.ioloop
+import tornado.iostream
+
+from argparse import ArgumentParser
+from http.client import HTTPConnection
+from construct import Container
+
+from empower.datatypes.etheraddress import EtherAddress
+from empower.core.resourcepool import BT_L20
+from empower.lvapp import PT_VERSION
+from empower.lvapp import PT_HELLO
+from empower.lvapp import PT_PROBE_REQUEST
+from empower.lvapp import PT_PROBE_RESPONSE
+from empower.lvapp import PT_AUTH_REQUEST
+from empower.lvapp import PT_AUTH_RESPONSE
+from empower.lvapp import PT_ASSOC_REQUEST
+from empower.lvapp import PT_ASSOC_RESPONSE
+from empower.lvapp import PT_ADD_LVAP
+from empower.lvapp import PT_DEL_LVAP
+from empower.lvapp import PT_STATUS_LVAP
+from empower.lvapp import PT_SET_PORT
+from empower.lvapp import PT_STATUS_PORT
+from empower.lvapp import PT_CAPS
+from empower.lvapp import PT_ADD_VAP
+from empower.lvapp import PT_STATUS_VAP
+from empower.lvapp import HELLO
+from empower.lvapp import PROBE_REQUEST
+from empower.lvapp import AUTH_REQUEST
+from empower.lvapp import ASSOC_REQUEST
+from empower.lvapp import ADD_LVAP
+from empower.lvapp import DEL_LVAP
+from empower.lvapp import STATUS_LVAP
+from empower.lvapp import SET_PORT
+from empower.lvapp import STATUS_PORT
+from empower.lvapp import CAPS
+from empower.lvapp import ADD_VAP
+from empower.lvapp import STATUS_VAP
+from empower.lvapp import PROBE_RESPONSE
+from empower.lvapp import AUTH_RESPONSE
+from empower.lvapp import ASSOC_RESPONSE
+from empower.maps.maps import POLLER_REQUEST
+from empower.maps.maps import POLLER_RESPONSE
+from empower.maps import ucqm
+from empower.maps import ncqm
+from empower.counters.counters import PT_STATS_REQUEST
+from empower.counters.counters import PT_STATS_RESPONSE
+from empower.counters.counters import STATS_REQUEST
+from empower.counters.counters import STATS_RESPONSE
+from empower.lvap_stats.lvap_stats import PT_RATES_REQUEST
+from empower.lvap_stats.lvap_stats import PT_RATES_RESPONSE
+from empower.lvap_stats.lvap_stats import RATES_REQUEST
+from empower.lvap_stats.lvap_stats import RATES_RESPONSE
+from empower.txp_bin_counter.txp_bin_counter import \
+    PT_TXP_BIN_COUNTER_REQUEST
+from empower.txp_bin_counter.txp_bin_counter import \
+    PT_TXP_BIN_COUNTER_RESPONSE
+from empower.txp_bin_counter.txp_bin_counter import TXP_BIN_COUNTER_REQUEST
+from empower.txp_bin_counter.txp_bin_counter import TXP_BIN_COUNTER_RESPONSE
+from empower.triggers.summary import PT_ADD_SUMMARY
+from empower.triggers.summary import PT_SUMMARY
+from empower.triggers.summary import PT_DEL_SUMMARY
+from empower.triggers.summary import ADD_SUMMARY
+from empower.triggers.summary import SUMMARY_TRIGGER
+from empower.triggers.summary import DEL_SUMMARY
+from empower.triggers.rssi import PT_ADD_RSSI
+from empower.triggers.rssi import PT_RSSI
+from empower.triggers.rssi import PT_DEL_RSSI
+from empower.triggers.rssi import ADD_RSSI_TRIGGER
+from empower.triggers.rssi import RSSI_TRIGGER
+from empower.triggers.rssi import DEL_RSSI_TRIGGER
+
+LOG = logging.getLogger("emulator")
+
+# Base address of the emulated WTPs and stations
+WTP_BASE = 0x02ca00000000
+STA_BASE = 0x02cb00000000
+
+# Emulated resource blocks (channel, band)
+BLOCKS = [(6, BT_L20), (36, BT_L20)]
+
+# Emulated network ports (port id, interface name)
+PORTS = [(1, b"empower0")]
+
+# LVAPP header (version, type, length)
+HEADER_FORMAT = struct.Struct("!BBH")
+
+# Max number of bytes requested to the stream for each read
+READ_CHUNK_SIZE = 65536
+
+
+def to_addr(value):
+    """Convert an integer into an EtherAddress."""
+
+    return EtherAddress(value.to_bytes(6, 'big'))
+
+
+def build(codec, msg_type, length=0, **fields):
+    """Build a message of the given type. The length field is computed from
+    the built message unless it is required by the codec (e.g. variable
+    length ssids)."""
+
+    msg = bytearray(codec.build(Container(version=PT_VERSION, type=msg_type,
+                                          length=length, **fields)))
+    struct.pack_into("!H", msg, 2, len(msg))
+
+    return msg
+
+
+def percentile(values, percent):
+    """Return the given percentile of a sorted list (nearest rank)."""
+
+    if not values:
+        return 0.0
+
+    rank = int(round(percent / 100 * (len(values) - 1)))
+
+    return values[rank]
+
+
+class Stats(object):
+    """Emulator statistics."""
+
+    def __init__(self, pid=None):
+
+        self.pid = pid
+        self.started = time.time()
+        self.tx_msgs = 0
+        self.rx_msgs = 0
+        self.probes = 0
+        self.associated = 0
+        self.failed = 0
+        self.latencies = []
+        self.__last = (time.time(), 0, 0, self.__cpu_time())
+
+    def __cpu_time(self):
+        """Return the controller cpu time in seconds (if pid is known)."""
+
+        if not self.pid:
+            return None
+
+        try:
+            with open("/proc/%u/stat" % self.pid) as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except IOError:
+            return None
+
+        return (int(fields[11]) + int(fields[12])) / \
+            os.sysconf('SC_CLK_TCK')
+
+    def report(self):
+        """Log the statistics collected since the last report."""
+
+        now = time.time()
+        cpu_time = self.__cpu_time()
+        last_ts, last_tx, last_rx, last_cpu = self.__last
+        elapsed = max(now - last_ts, 1e-6)
+
+        latencies = sorted(self.latencies)
+
+        cpu = "n/a"
+        if cpu_time is not None and last_cpu is not None:
+            cpu = "%.1f%%" % (100 * (cpu_time - last_cpu) / elapsed)
+
+        LOG.info("t=%us probes=%u assoc=%u failed=%u "
+                 "tx=%.0f msg/s rx=%.0f msg/s "
+                 "latency p50=%.1fms p90=%.1fms p99=%.1fms ctrl cpu=%s",
+                 now - self.started, self.probes, self.associated,
+                 self.failed, (self.tx_msgs - last_tx) / elapsed,
+                 (self.rx_msgs - last_rx) / elapsed,
+                 percentile(latencies, 50) * 1000,
+                 percentile(latencies, 90) * 1000,
+                 percentile(latencies, 99) * 1000, cpu)
+
+        self.__last = (now, self.tx_msgs, self.rx_msgs, cpu_time)
+
+
+class Station(object):
+    """An emulated station."""
+
+    def __init__(self, wtp, addr, timeout, hearers, probes):
+
+        self.wtp = wtp
+        self.addr = addr
+        self.timeout = timeout
+        self.hearers = [wtp] + hearers
+        self.probes = probes
+        self.block = random.randrange(len(wtp.blocks))
+        self.net_bssid = None
+        self.lvap_bssid = None
+        self.ssids = []
+        self.state = None
+        self.probe_ts = None
+        self.__timer = None
+
+    def probe(self):
+        """Start the handshake."""
+
+        self.state = PT_PROBE_REQUEST
+        self.probe_ts = time.time()
+        self.wtp.stats.probes += 1
+
+        # every hearer reports the probe requests of the station, the
+        # serving wtp is then selected by the controller with ADD_LVAP
+        for _ in range(self.probes):
+            for wtp in self.hearers:
+
+                wtp.stations[self.addr] = self
+                hwaddr, channel, band = wtp.blocks[self.block]
+
+                wtp.send(build(PROBE_REQUEST, PT_PROBE_REQUEST,
+                               length=28,
+                               seq=wtp.seq,
+                               wtp=wtp.addr.to_raw(),
+                               sta=self.addr.to_raw(),
+                               hwaddr=hwaddr.to_raw(),
+                               channel=channel,
+                               band=band,
+                               ssid=b''))
+
+        self.__timer = tornado.ioloop.IOLoop.current().call_later(
+            self.timeout, self._on_timeout)
+
+    def _on_timeout(self):
+        """The handshake did not complete in time."""
+
+        LOG.debug("Station %s timed out (state %u)", self.addr, self.state)
+
+        self.state = None
+        self.wtp.stats.failed += 1
+
+    def handle_probe_response(self):
+        """Send auth request."""
+
+        if self.state != PT_PROBE_REQUEST or not self.net_bssid:
+            return
+
+        self.state = PT_AUTH_REQUEST
+
+        self.wtp.send(build(AUTH_REQUEST, PT_AUTH_REQUEST,
+                            seq=self.wtp.seq,
+                            wtp=self.wtp.addr.to_raw(),
+                            sta=self.addr.to_raw(),
+                            bssid=self.net_bssid.to_raw()))
+
+    def handle_auth_response(self):
+        """Send assoc request."""
+
+        if self.state != PT_AUTH_REQUEST or not self.ssids:
+            return
+
+        self.state = PT_ASSOC_REQUEST
+
+        ssid = self.ssids[0]
+
+        self.wtp.send(build(ASSOC_REQUEST, PT_ASSOC_REQUEST,
+                            length=26 + len(ssid),
+                            seq=self.wtp.seq,
+                            wtp=self.wtp.addr.to_raw(),
+                            sta=self.addr.to_raw(),
+                            bssid=self.lvap_bssid.to_raw(),
+                            ssid=ssid))
+
+    def handle_assoc_response(self):
+        """Handshake completed."""
+
+        if self.state != PT_ASSOC_REQUEST:
+            return
+
+        self.state = PT_ASSOC_RESPONSE
+
+        tornado.ioloop.IOLoop.current().remove_timeout(self.__timer)
+
+        self.wtp.stats.associated += 1
+        self.wtp.stats.latencies.append(time.time() - self.probe_ts)
+
+
+class EmulatedWTP(object):
+    """An emulated WTP."""
+
+    def __init__(self, index, host, port, period, stats):
+
+        self.index = index
+        self.host = host
+        self.port = port
+        self.period = period
+        self.stats = stats
+        self.addr = to_addr(WTP_BASE + (index << 8))
+        self.blocks = []
+        self.stations = {}
+        self.lvaps = {}
+        self.triggers = {}
+        self.neighbours = []
+        self.stream = None
+        self.__seq = 0
+        self.__spawned = 0
+        self.__buffer = bytearray()
+        self.__outbox = []
+
+        for offset, (channel, band) in enumerate(BLOCKS, 1):
+            hwaddr = to_addr(WTP_BASE + (index << 8) + offset)
+            self.blocks.append((hwaddr, channel, band))
+
+        self.__hello = tornado.ioloop.PeriodicCallback(self.send_hello,
+                                                       self.period)
+
+        self.handlers = {
+            PT_PROBE_RESPONSE: (PROBE_RESPONSE, self._handle_probe_response),
+            PT_AUTH_RESPONSE: (AUTH_RESPONSE, self._handle_auth_response),
+            PT_ASSOC_RESPONSE: (ASSOC_RESPONSE, self._handle_assoc_response),
+            PT_ADD_LVAP: (ADD_LVAP, self._handle_add_lvap),
+            PT_DEL_LVAP: (DEL_LVAP, self._handle_del_lvap),
+            PT_SET_PORT: (SET_PORT, self._handle_set_port),
+            PT_ADD_VAP: (ADD_VAP, self._handle_add_vap),
+            ucqm.PT_POLLER_REQUEST: (POLLER_REQUEST, self._handle_ucqm),
+            ncqm.PT_POLLER_REQUEST: (POLLER_REQUEST, self._handle_ncqm),
+            PT_STATS_REQUEST: (STATS_REQUEST, self._handle_stats),
+            PT_RATES_REQUEST: (RATES_REQUEST, self._handle_rates),
+            PT_TXP_BIN_COUNTER_REQUEST: (TXP_BIN_COUNTER_REQUEST,
+                                         self._handle_txp_bin_counter),
+            PT_ADD_SUMMARY: (ADD_SUMMARY, self._handle_add_summary),
+            PT_DEL_SUMMARY: (DEL_SUMMARY, self._handle_del_trigger),
+            PT_ADD_RSSI: (ADD_RSSI_TRIGGER, self._handle_add_rssi),
+            PT_DEL_RSSI: (DEL_RSSI_TRIGGER, self._handle_del_trigger),
+        }
+
+    @property
+    def seq(self):
+        """Return new sequence id."""
+
+        self.__seq += 1
+        return self.__seq
+
+    def connect(self):
+        """Connect to the controller."""
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.stream = tornado.iostream.IOStream(sock)
+        self.stream.set_close_callback(self._on_disconnect)
+        self.stream.connect((self.host, self.port), self._on_connect)
+
+    def _on_connect(self):
+        """Send hello and caps and start the hello timer."""
+
+        self.stream.set_nodelay(True)
+
+        self.send_hello()
+        self.send_caps()
+
+        self.__hello.start()
+        self._wait()
+
+    def _on_disconnect(self):
+        """Stop the timers."""
+
+        LOG.error("WTP %s disconnected", self.addr)
+
+        self.__hello.stop()
+
+        for trigger in self.triggers.values():
+            trigger.stop()
+
+        self.triggers = {}
+
+    def send(self, msg):
+        """Queue a message, all the messages queued in the same IOLoop
+        iteration are written with a single write."""
+
+        if not self.stream or self.stream.closed():
+            return
+
+        self.stats.tx_msgs += 1
+
+        if not self.__outbox:
+            tornado.ioloop.IOLoop.current().add_callback(self._flush)
+
+        self.__outbox.append(msg)
+
+    def _flush(self):
+        """Write the queued messages."""
+
+        outbox, self.__outbox = self.__outbox, []
+
+        if not self.stream.closed():
+            self.stream.write(b''.join(outbox))
+
+    def _wait(self):
+        """Wait for incoming data."""
+
+        if self.stream.closed():
+            return
+
+        self.stream.read_bytes(READ_CHUNK_SIZE, self._on_read, partial=True)
+
+    def _on_read(self, data):
+        """Dispatch the messages received from the controller."""
+
+        self.__buffer.extend(data)
+        offset = 0
+
+        while len(self.__buffer) - offset >= HEADER_FORMAT.size:
+
+            _, msg_type, length = \
+                HEADER_FORMAT.unpack_from(self.__buffer, offset)
+
+            if len(self.__buffer) - offset < length:
+                break
+
+            frame = bytes(self.__buffer[offset:offset + length])
+            offset += length
+
+            self.stats.rx_msgs += 1
+
+            if msg_type not in self.handlers:
+                LOG.warning("Unknown message type %u", msg_type)
+                continue
+
+            codec, handler = self.handlers[msg_type]
+            handler(codec.parse(frame))
+
+        del self.__buffer[:offset]
+
+        self._wait()
+
+    def add_station(self, timeout, hearers, probes):
+        """Spawn a new station and start its handshake. The probe requests
+        of the station are reported also by the hearers."""
+
+        addr = to_addr(STA_BASE + (self.index << 16) + self.__spawned)
+        self.__spawned += 1
+
+        station = Station(self, addr, timeout, hearers, probes)
+        station.probe()
+
+    def send_hello(self):
+        """Send HELLO message."""
+
+        self.send(build(HELLO, PT_HELLO,
+                        seq=self.seq,
+                        wtp=self.addr.to_raw(),
+                        period=self.period))
+
+    def send_caps(self):
+        """Send CAPS message."""
+
+        blocks = [[hwaddr.to_raw(), channel, band]
+                  for hwaddr, channel, band in self.blocks]
+
+        ports = [[self.blocks[0][0].to_raw(), port_id, iface.ljust(10, b'\0')]
+                 for port_id, iface in PORTS]
+
+        self.send(build(CAPS, PT_CAPS,
+                        seq=self.seq,
+                        wtp=self.addr.to_raw(),
+                        nb_resources_elements=len(blocks),
+                        nb_ports_elements=len(ports),
+                        blocks=blocks,
+                        ports=ports))
+
+    def _handle_probe_response(self, msg):
+        """Handle PROBE_RESPONSE."""
+
+        station = self.stations.get(EtherAddress(msg.sta))
+
+        if station:
+            station.handle_probe_response()
+
+    def _handle_auth_response(self, msg):
+        """Handle AUTH_RESPONSE."""
+
+        station = self.stations.get(EtherAddress(msg.sta))
+
+        if station:
+            station.handle_auth_response()
+
+    def _handle_assoc_response(self, msg):
+        """Handle ASSOC_RESPONSE."""
+
+        station = self.stations.get(EtherAddress(msg.sta))
+
+        if station:
+            station.handle_assoc_response()
+
+    def _handle_add_lvap(self, msg):
+        """Handle ADD_LVAP, reply with STATUS_LVAP."""
+
+        sta = EtherAddress(msg.sta)
+        self.lvaps[sta] = msg
+
+        station = self.stations.get(sta)
+
+        if station:
+            station.wtp = self
+            station.net_bssid = EtherAddress(msg.net_bssid)
+            station.lvap_bssid = EtherAddress(msg.lvap_bssid)
+            station.ssids = [x.ssid for x in msg.ssids[1:] if x.ssid]
+
+        ssids = [Container(length=len(x.ssid), ssid=x.ssid)
+                 for x in msg.ssids]
+
+        self.send(build(STATUS_LVAP, PT_STATUS_LVAP,
+                        seq=self.seq,
+                        flags=msg.flags,
+                        assoc_id=msg.assoc_id,
+                        wtp=self.addr.to_raw(),
+                        sta=msg.sta,
+                        encap=msg.encap,
+                        hwaddr=msg.hwaddr,
+                        channel=msg.channel,
+                        band=msg.band,
+                        net_bssid=msg.net_bssid,
+                        lvap_bssid=msg.lvap_bssid,
+                        ssids=ssids))
+
+    def _handle_del_lvap(self, msg):
+        """Handle DEL_LVAP."""
+
+        self.lvaps.pop(EtherAddress(msg.sta), None)
+
+    def _handle_set_port(self, msg):
+        """Handle SET_PORT, reply with STATUS_PORT."""
+
+        self.send(build(STATUS_PORT, PT_STATUS_PORT,
+                        seq=self.seq,
+                        flags=msg.flags,
+                        wtp=self.addr.to_raw(),
+                        sta=msg.sta,
+                        hwaddr=msg.hwaddr,
+                        channel=msg.channel,
+                        band=msg.band,
+                        rts_cts=msg.rts_cts,
+                        tx_mcast=msg.tx_mcast,
+                        ur_mcast_count=msg.ur_mcast_count,
+                        nb_mcses=msg.nb_mcses,
+                        mcs=msg.mcs))
+
+    def _handle_add_vap(self, msg):
+        """Handle ADD_VAP, reply with STATUS_VAP."""
+
+        self.send(build(STATUS_VAP, PT_STATUS_VAP,
+                        length=28 + len(msg.ssid),
+                        seq=self.seq,
+                        wtp=self.addr.to_raw(),
+                        hwaddr=msg.hwaddr,
+                        channel=msg.channel,
+                        band=msg.band,
+                        net_bssid=msg.net_bssid,
+                        ssid=msg.ssid))
+
+    def __send_poller_response(self, msg_type, msg, addrs):
+        """Send POLLER_RESPONSE with synthetic rssi values."""
+
+        entries = []
+
+        for addr in addrs:
+            rssi = random.randint(-90, -30)
+            entries.append([addr.to_raw(), random.randint(0, 10), rssi,
+                            random.randint(0, 1000), random.randint(0, 1000),
+                            rssi])
+
+        self.send(build(POLLER_RESPONSE, msg_type,
+                        seq=self.seq,
+                        module_id=msg.module_id,
+                        wtp=self.addr.to_raw(),
+                        nb_entries=len(entries),
+                        img_entries=entries))
+
+    def _handle_ucqm(self, msg):
+        """Handle UCQM POLLER_REQUEST."""
+
+        self.__send_poller_response(ucqm.PT_POLLER_RESPONSE, msg,
+                                    list(self.stations))
+
+    def _handle_ncqm(self, msg):
+        """Handle NCQM POLLER_REQUEST."""
+
+        self.__send_poller_response(ncqm.PT_POLLER_RESPONSE, msg,
+                                    [wtp.addr for wtp in self.neighbours])
+
+    def _handle_stats(self, msg):
+        """Handle STATS_REQUEST."""
+
+        tx_stats = [[size, random.randint(0, 1000)]
+                    for size in (64, 512, 1500)]
+        rx_stats = [[size, random.randint(0, 1000)]
+                    for size in (64, 512, 1500)]
+
+        self.send(build(STATS_RESPONSE, PT_STATS_RESPONSE,
+                        seq=self.seq,
+                        module_id=msg.module_id,
+                        wtp=self.addr.to_raw(),
+                        sta=msg.sta,
+                        nb_tx=len(tx_stats),
+                        nb_rx=len(rx_stats),
+                        stats=tx_stats + rx_stats))
+
+    def _handle_rates(self, msg):
+        """Handle RATES_REQUEST."""
+
+        rates = [[rate, Container(mcs=0), random.randint(0, 18000)]
+                 for rate in (2, 11, 12, 24, 48, 108)]
+
+        self.send(build(RATES_RESPONSE, PT_RATES_RESPONSE,
+                        seq=self.seq,
+                        module_id=msg.module_id,
+                        wtp=self.addr.to_raw(),
+                        nb_entries=len(rates),
+                        rates=rates))
+
+    def _handle_txp_bin_counter(self, msg):
+        """Handle TXP_BIN_COUNTER_REQUEST."""
+
+        tx_stats = [[size, random.randint(0, 1000)]
+                    for size in (64, 512, 1500)]
+
+        self.send(build(TXP_BIN_COUNTER_RESPONSE, PT_TXP_BIN_COUNTER_RESPONSE,
+                        seq=self.seq,
+                        module_id=msg.module_id,
+                        wtp=self.addr.to_raw(),
+                        nb_tx=len(tx_stats),
+                        stats=tx_stats))
+
+    def __add_trigger(self, module_id, callback, period):
+        """Start a periodic trigger."""
+
+        if module_id in self.triggers:
+            self.triggers[module_id].stop()
+
+        trigger = tornado.ioloop.PeriodicCallback(callback, max(period, 100))
+        trigger.start()
+
+        self.triggers[module_id] = trigger
+
+    def _handle_del_trigger(self, msg):
+        """Handle DEL_SUMMARY and DEL_RSSI."""
+
+        if msg.module_id in self.triggers:
+            self.triggers.pop(msg.module_id).stop()
+
+    def _handle_add_summary(self, msg):
+        """Handle ADD_SUMMARY, send SUMMARY every period."""
+
+        def send_summary():
+            """Send SUMMARY with a few synthetic frames."""
+
+            frames = []
+
+            for sta in list(self.stations)[:8]:
+                frames.append([msg.addr, sta.to_raw(),
+                               int(time.time() * 1e6),
+                               Container(mcs=0),
+                               random.randint(0, 4095),
+                               random.randint(-90, -30), 108, 2, 0,
+                               random.randint(64, 1500)])
+
+            self.send(build(SUMMARY_TRIGGER, PT_SUMMARY,
+                            seq=self.seq,
+                            module_id=msg.module_id,
+                            wtp=self.addr.to_raw(),
+                            nb_entries=len(frames),
+                            frames=frames))
+
+        self.__add_trigger(msg.module_id, send_summary, msg.period)
+
+    def _handle_add_rssi(self, msg):
+        """Handle ADD_RSSI, send RSSI every period."""
+
+        sta = EtherAddress(msg.sta)
+
+        def send_rssi():
+            """Send RSSI for the block of the station."""
+
+            if sta not in self.lvaps:
+                return
+
+            lvap = self.lvaps[sta]
+
+            self.send(build(RSSI_TRIGGER, PT_RSSI,
+                            seq=self.seq,
+                            module_id=msg.module_id,
+                            wtp=self.addr.to_raw(),
+                            hwaddr=lvap.hwaddr,
+                            channel=lvap.channel,
+                            band=lvap.band,
+                            current=random.randint(-90, -30)))
+
+        self.__add_trigger(msg.module_id, send_rssi, msg.period)
+
+
+class Emulator(object):
+    """Connects the WTPs and spawns the stations."""
+
+    def __init__(self, args):
+
+        self.args = args
+        self.stats = Stats(args.pid)
+        self.wtps = []
+        self.__spawned = 0
+
+        for index in range(args.wtps):
+            wtp = EmulatedWTP(index, args.host, args.port, args.period,
+                              self.stats)
+            self.wtps.append(wtp)
+
+        for wtp in self.wtps:
+            others = [x for x in self.wtps if x is not wtp]
+            wtp.neighbours = random.sample(others, min(len(others), 4))
+
+        self.__spawner = None
+
+    def start(self):
+        """Connect the WTPs and start spawning stations."""
+
+        for wtp in self.wtps:
+            wtp.connect()
+
+        loop = tornado.ioloop.IOLoop.current()
+
+        if self.args.rate > 0:
+            interval = 1000.0 / self.args.rate
+            self.__spawner = \
+                tornado.ioloop.PeriodicCallback(self.spawn, interval)
+            loop.call_later(self.args.warmup, self.__spawner.start)
+
+        tornado.ioloop.PeriodicCallback(self.stats.report,
+                                        self.args.report * 1000).start()
+
+        if self.args.duration:
+            loop.call_later(self.args.duration, self.stop)
+
+    def spawn(self):
+        """Spawn a new station on a random WTP."""
+
+        total = self.args.stations * len(self.wtps)
+
+        if self.__spawned >= total:
+            self.__spawner.stop()
+            return
+
+        wtp = self.wtps[self.__spawned % len(self.wtps)]
+        hearers = wtp.neighbours[:self.args.hearers - 1]
+        wtp.add_station(self.args.timeout, hearers, self.args.probes)
+
+        self.__spawned += 1
+
+    def stop(self):
+        """Print final report and stop."""
+
+        self.stats.report()
+        tornado.ioloop.IOLoop.current().stop()
+
+
+def provision(args, wtps):
+    """Register the WTPs and add them to the tenant."""
+
+    conn = HTTPConnection(args.rest_host, args.rest_port)
+
+    if args.passwdfile is None:
+        passwd = getpass.getpass("Password: ")
+    else:
+        passwd = open(args.passwdfile, "r").read().strip()
+
+    auth_str = "%s:%s" % (args.user, passwd)
+    auth = base64.b64encode(auth_str.encode('utf-8'))
+    headers = {'Authorization': 'Basic %s' % auth.decode('utf-8')}
+
+    for wtp in wtps:
+
+        body = json.dumps({"version": "1.0",
+                           "addr": str(wtp.addr),
+                           "label": "Emulated WTP %u" % wtp.index})
+
+        conn.request('POST', '/api/v1/wtps', body, headers)
+        conn.getresponse().read()
+
+        url = '/api/v1/tenants/%s/wtps/%s' % (args.tenant_id, wtp.addr)
+        conn.request('POST', url, None, headers)
+        response = conn.getresponse()
+        response.read()
+
+        if response.status not in (200, 201, 204):
+            LOG.error("Unable to add %s to tenant %s: %s %s", wtp.addr,
+                      args.tenant_id, response.status, response.reason)
+
+    conn.close()
+
+
+def main():
+    """Parse the command line and start the emulator."""
+
+    parser = ArgumentParser(description="EmPOWER WTP emulator")
+
+    parser.add_argument("-a", "--host", dest="host", default="127.0.0.1",
+                        help="LVAPP server address; default='127.0.0.1'")
+    parser.add_argument("-o", "--port", dest="port", default=4433, type=int,
+                        help="LVAPP server port; default=4433")
+    parser.add_argument("-w", "--wtps", dest="wtps", default=10, type=int,
+                        help="Number of WTPs; default=10")
+    parser.add_argument("-s", "--stations", dest="stations", default=10,
+                        type=int, help="Stations per WTP; default=10")
+    parser.add_argument("-R", "--rate", dest="rate", default=10.0,
+                        type=float,
+                        help="Station arrival rate (per second); default=10")
+    parser.add_argument("-H", "--hearers", dest="hearers", default=1,
+                        type=int, help="WTPs reporting the probe requests "
+                        "of each station (max 5); default=1")
+    parser.add_argument("-n", "--probes", dest="probes", default=1,
+                        type=int, help="Probe requests sent by each station "
+                        "through each hearer; default=1")
+    parser.add_argument("-P", "--period", dest="period", default=2000,
+                        type=int, help="Hello period in ms; default=2000")
+    parser.add_argument("-T", "--timeout", dest="timeout", default=5.0,
+                        type=float,
+                        help="Station handshake timeout in s; default=5")
+    parser.add_argument("-W", "--warmup", dest="warmup", default=2.0,
+                        type=float,
+                        help="Delay before spawning stations in s; default=2")
+    parser.add_argument("-d", "--duration", dest="duration", default=0,
+                        type=float, help="Test duration in s; default=forever")
+    parser.add_argument("-i", "--report", dest="report", default=5.0,
+                        type=float, help="Report interval in s; default=5")
+    parser.add_argument("-c", "--controller-pid", dest="pid", default=None,
+                        type=int, help="Controller pid, used to report the "
+                        "controller cpu usage; default=none")
+    parser.add_argument("-t", "--tenant-id", dest="tenant_id", default=None,
+                        help="Register the WTPs and add them to this tenant; "
+                        "default=none")
+    parser.add_argument("-r", "--rest-host", dest="rest_host",
+                        default="127.0.0.1",
+                        help="REST server address; default='127.0.0.1'")
+    parser.add_argument("-p", "--rest-port", dest="rest_port", default="8888",
+                        help="REST server port; default=8888")
+    parser.add_argument("-u", "--user", dest="user", default="root",
+                        help="EmPOWER admin user; default='root'")
+    parser.add_argument("-f", "--passwd-file", dest="passwdfile",
+                        default=None, help="Password file; default=none")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        dest="verbose", default=False,
+                        help="Verbose output; default=false")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(message)s")
+
+    emulator = Emulator(args)
+
+    if args.tenant_id:
+        provision(args, emulator.wtps)
+
+    emulator.start()
+
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
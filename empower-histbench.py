@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Packet size histogram microbenchmark.
+
+Bins synthetic counters responses with the histogram engine used by the
+counters and txp_bin_counter modules and with the previous implementation
+(sort the samples, then scan the bins for every sample), checks that the
+results match and reports the responses binned per second.
+"""
+
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+
+from empower.core.histogram import fill_samples
+
+DEFAULT_BINS = "64,128,256,512,1024,1514,8192"
+
+
+def legacy_fill_samples(bins, data):
+    """Previous implementation, bytes and packets computed separately."""
+
+    def fill(weight):
+
+        samples = sorted(data, key=lambda entry: entry[0])
+        out = [0] * len(bins)
+
+        for entry in samples:
+            if len(entry) == 0:
+                continue
+            size = entry[0]
+            count = entry[1]
+            for i in range(0, len(bins)):
+                if size <= bins[i]:
+                    out[i] = out[i] + weight(size, count)
+                    break
+
+        return out
+
+    return fill(lambda s, c: s * c), fill(lambda s, c: c)
+
+
+def run(func, bins, responses):
+    """Bin all the responses, return the elapsed time and the results."""
+
+    start = time.perf_counter()
+    results = [func(bins, x) for x in responses]
+
+    return time.perf_counter() - start, results
+
+
+def main():
+    """Parse the command line and run the benchmark."""
+
+    parser = ArgumentParser(description="Histogram microbenchmark")
+
+    parser.add_argument("-n", "--responses", dest="responses", default=10000,
+                        type=int, help="Number of responses; default=10000")
+    parser.add_argument("-s", "--samples", dest="samples", default=40,
+                        type=int, help="Samples per response; default=40")
+    parser.add_argument("-b", "--bins", dest="bins", default=DEFAULT_BINS,
+                        help="Bins; default=%s" % DEFAULT_BINS)
+
+    args = parser.parse_args()
+
+    bins = [int(x) for x in args.bins.split(",")]
+
+    rnd = random.Random(0)
+    responses = [[[rnd.randint(60, bins[-1] + 100), rnd.randint(0, 1000)]
+                  for _ in range(args.samples)]
+                 for _ in range(args.responses)]
+
+    # warm up the lookup table cache
+    fill_samples(bins, responses[0])
+
+    legacy, expected = run(legacy_fill_samples, bins, responses)
+    engine, results = run(fill_samples, bins, responses)
+
+    if [list(x) for x in results] != [list(x) for x in expected]:
+        print("Results do not match")
+        sys.exit(1)
+
+    print("%u responses, %u samples, %u bins" %
+          (args.responses, args.samples, len(bins)))
+    print("legacy: %.0f responses/s" % (args.responses / legacy))
+    print("engine: %.0f responses/s" % (args.responses / engine))
+    print("speedup: %.1fx" % (legacy / engine))
+
+
+if __name__ == "__main__":
+    main()
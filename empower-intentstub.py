@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""EmPOWER intent interface stub.
+
+Implements the intent rules REST interface used by the intent server
+(GET/POST/PUT/DELETE on /intent/rules) keeping the rules in memory. The
+response delay and a failure rate can be configured in order to exercise
+the controller retry logic. Periodically reports the request counters and
+the number of connections opened by the controller.
+"""
+
+import json
+import uuid
+import random
+import logging
+import tornado.web
+import tornado.gen
+import tornado.ioloop
+import tornado.httpserver
+
+from argparse import ArgumentParser
+
+LOG = logging.getLogger("intentstub")
+
+URL = "/intent/rules"
+
+
+class RulesHandler(tornado.web.RequestHandler):
+    """Intent rules handler."""
+
+    def initialize(self, stub):
+        self.stub = stub
+
+    @tornado.gen.coroutine
+    def prepare(self):
+
+        self.stub.requests[self.request.method] += 1
+
+        if self.stub.delay:
+            yield tornado.gen.sleep(self.stub.delay / 1000)
+
+        if random.random() < self.stub.fail:
+            self.stub.requests['failed'] += 1
+            self.send_error(503)
+
+    def get(self, rule_id=None):
+
+        if not rule_id:
+            self.write(json.dumps(self.stub.rules))
+            return
+
+        if rule_id not in self.stub.rules:
+            self.send_error(404)
+            return
+
+        self.write(json.dumps(self.stub.rules[rule_id]))
+
+    def post(self, rule_id=None):
+
+        if rule_id:
+            self.send_error(400)
+            return
+
+        rule_id = str(uuid.uuid4())
+        self.stub.rules[rule_id] = json.loads(self.request.body.decode())
+
+        self.set_header("Location", "%s/%s" % (URL, rule_id))
+        self.set_status(201)
+
+    def put(self, rule_id=None):
+
+        if rule_id not in self.stub.rules:
+            self.send_error(404)
+            return
+
+        self.stub.rules[rule_id] = json.loads(self.request.body.decode())
+        self.set_status(204)
+
+    def delete(self, rule_id=None):
+
+        if not rule_id:
+            self.stub.rules.clear()
+        elif rule_id in self.stub.rules:
+            del self.stub.rules[rule_id]
+        else:
+            self.send_error(404)
+            return
+
+        self.set_status(204)
+
+
+class IntentStub(object):
+    """Intent interface stub.
+
+    Attributes:
+        delay: response delay in ms
+        fail: fraction of requests answered with 503
+        rules: the intent rules, rule_id -> rule
+    """
+
+    def __init__(self, port, delay, fail):
+
+        self.delay = delay
+        self.fail = fail
+        self.rules = {}
+        self.connections = 0
+        self.requests = {'GET': 0, 'POST': 0, 'PUT': 0, 'DELETE': 0,
+                         'failed': 0}
+
+        handlers = [(URL + "/?", RulesHandler, dict(stub=self)),
+                    (URL + "/([a-zA-Z0-9-]*)/?", RulesHandler,
+                     dict(stub=self))]
+
+        app = tornado.web.Application(handlers)
+
+        server = tornado.httpserver.HTTPServer(app)
+        server.listen(port)
+
+        # count the TCP connections opened by the clients
+        handle_stream = server.handle_stream
+
+        def on_connection(stream, address):
+            self.connections += 1
+            handle_stream(stream, address)
+
+        server.handle_stream = on_connection
+
+    def report(self):
+        """Log the counters."""
+
+        LOG.info("rules=%u connections=%u %s", len(self.rules),
+                 self.connections,
+                 " ".join("%s=%u" % x for x in sorted(self.requests.items())))
+
+
+def main():
+    """Parse the command line and start the stub."""
+
+    parser = ArgumentParser(description="EmPOWER intent interface stub")
+
+    parser.add_argument("-o", "--port", dest="port", default=8080, type=int,
+                        help="Listening port; default=8080")
+    parser.add_argument("-d", "--delay", dest="delay", default=0,
+                        type=float, help="Response delay in ms; default=0")
+    parser.add_argument("-x", "--fail", dest="fail", default=0.0,
+                        type=float, help="Fraction of requests failing with "
+                        "503; default=0")
+    parser.add_argument("-i", "--report", dest="report", default=5.0,
+                        type=float, help="Report interval in s; default=5")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    stub = IntentStub(args.port, args.delay, args.fail)
+
+    tornado.ioloop.PeriodicCallback(stub.report, args.report * 1000).start()
+
+    LOG.info("Intent stub available at %u", args.port)
+
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""JSON serialization microbenchmark.
+
+Serializes a list of synthetic LVAPs (as returned by GET /api/v1/lvaps)
+scheduled on synthetic WTPs with the previous implementation (json.dumps
+with EmpowerEncoder, sorted keys and indentation) and with JSONSerializer
+(with an empty cache and then with the to_dict() outputs of the LVAPs
+cached), checks that the documents match and reports the time taken.
+
+Every block embeds the tx policies of all the LVAPs scheduled on it, so
+the documents grow with the LVAPs per WTP as well as with the LVAPs. The
+defaults (10 LVAPs per WTP) keep 10000 LVAPs within about 1.2 GB.
+"""
+
+import sys
+import json
+import time
+
+from argparse import ArgumentParser
+
+import empower.main
+
+from empower.datatypes.etheraddress import EtherAddress
+from empower.core.cqm import ChannelQualityMatrix
+from empower.core.jsonserializer import EmpowerEncoder
+from empower.core.jsonserializer import JSONSerializer
+
+
+class Runtime(object):
+    """The parts of the runtime used by LVAPs and blocks."""
+
+    def __init__(self):
+
+        self.ucqm = ChannelQualityMatrix()
+        self.ncqm = ChannelQualityMatrix()
+
+    def add_lvap_block(self, lvap, block, downlink):
+        """Do not index LVAPs."""
+
+        pass
+
+
+def build(nb_wtps, nb_lvaps):
+    """Return nb_lvaps LVAPs scheduled on nb_wtps WTPs."""
+
+    # these modules bind the runtime when imported
+    from empower.core.resourcepool import ResourceBlock
+    from empower.core.resourcepool import TxPolicy
+    from empower.core.resourcepool import BT_L20
+    from empower.core.radioport import RadioPort
+    from empower.core.wtp import WTP
+    from empower.core.lvap import LVAP
+
+    blocks = []
+
+    for index in range(nb_wtps):
+        addr = EtherAddress((0x02CA00000000 + index).to_bytes(6, 'big'))
+        wtp = WTP(addr, "WTP %u" % index)
+        block = ResourceBlock(wtp, addr, 6, BT_L20)
+        wtp.supports.add(block)
+        blocks.append(block)
+
+    lvaps = []
+
+    for index in range(nb_lvaps):
+        addr = EtherAddress((0x02CB00000000 + index).to_bytes(6, 'big'))
+        lvap = LVAP(addr, addr, addr)
+        block = blocks[index % nb_wtps]
+        lvap.supports.add(ResourceBlock(lvap, addr, 6, BT_L20))
+        # create the default tx policy (created on first access otherwise)
+        block.tx_policies[addr] = TxPolicy(addr, block)
+        lvap._downlink.setitem(block, RadioPort(lvap, block))
+        lvaps.append(lvap)
+
+    return lvaps
+
+
+def main():
+    """Parse the command line and run the benchmark."""
+
+    parser = ArgumentParser(description="JSON serialization microbenchmark")
+
+    parser.add_argument("-l", "--lvaps", dest="lvaps", default=10000,
+                        type=int, help="Number of LVAPs; default=10000")
+    parser.add_argument("-w", "--wtps", dest="wtps", default=1000,
+                        type=int, help="Number of WTPs; default=1000")
+
+    args = parser.parse_args()
+
+    empower.main.RUNTIME = Runtime()
+
+    lvaps = build(args.wtps, args.lvaps)
+    serializer = JSONSerializer()
+
+    start = time.perf_counter()
+    expected = json.dumps(lvaps, sort_keys=True, indent=4,
+                          cls=EmpowerEncoder)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cold_doc = serializer.dumps(lvaps)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warm_doc = serializer.dumps(lvaps)
+    warm = time.perf_counter() - start
+
+    if json.loads(cold_doc) != json.loads(expected) or \
+       json.loads(warm_doc) != json.loads(expected):
+        print("Documents do not match")
+        sys.exit(1)
+
+    print("%u LVAPs, %u WTPs" % (args.lvaps, args.wtps))
+    print("legacy: %.3fs, %u bytes" % (legacy, len(expected)))
+    print("compact: %.3fs (%.1fx), %u bytes" %
+          (cold, legacy / cold, len(cold_doc)))
+    print("compact, cached: %.3fs (%.1fx)" % (warm, legacy / warm))
+
+
+if __name__ == "__main__":
+    main()
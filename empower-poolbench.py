@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Resource pool microbenchmark.
+
+Builds a pool of synthetic resource blocks (one per WTP) and matches it
+against single blocks (as in Maps.block and LVAP.wtp) and against smaller
+pools (as in EmpowerApp.blocks) with the indexed ResourcePool and with the
+previous implementation (compare the channel and the band of every pair
+of blocks), checks that the results match and reports the operations per
+second.
+"""
+
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+
+from empower.datatypes.etheraddress import EtherAddress
+from empower.core.resourcepool import ResourceBlock
+from empower.core.resourcepool import ResourcePool
+from empower.core.resourcepool import BT_L20
+from empower.core.resourcepool import BT_HT20
+
+CHANNELS = [1, 6, 11, 36, 40, 44, 48, 149, 153, 157, 161, 165]
+
+
+class Radio(object):
+    """A synthetic WTP."""
+
+    def __init__(self, addr):
+        self.addr = addr
+
+
+def legacy_and(pool, other):
+    """Previous implementation of ResourcePool.__and__."""
+
+    result = set()
+    for rblock in pool:
+        for rblock_other in other:
+            if rblock.channel == rblock_other.channel and \
+               rblock.band == rblock_other.band:
+
+                result.add(rblock)
+
+    return result
+
+
+def random_block(rnd, index):
+    """Return a block on a random channel and band."""
+
+    radio = Radio(EtherAddress(index.to_bytes(6, 'big')))
+
+    return ResourceBlock(radio, radio.addr, rnd.choice(CHANNELS),
+                         rnd.choice([BT_L20, BT_HT20]))
+
+
+def run(func, pool, others):
+    """Match pool against all others, return the elapsed time and the
+    results."""
+
+    start = time.perf_counter()
+    results = [func(pool, x) for x in others]
+
+    return time.perf_counter() - start, results
+
+
+def main():
+    """Parse the command line and run the benchmark."""
+
+    parser = ArgumentParser(description="Resource pool microbenchmark")
+
+    parser.add_argument("-b", "--blocks", dest="blocks", default=10000,
+                        type=int, help="Blocks in the pool; default=10000")
+    parser.add_argument("-o", "--other", dest="other", default=20,
+                        type=int, help="Blocks in the other pools; "
+                        "default=20")
+    parser.add_argument("-n", "--lookups", dest="lookups", default=100,
+                        type=int, help="Lookups per test; default=100")
+
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+
+    start = time.perf_counter()
+    pool = ResourcePool(random_block(rnd, x) for x in range(args.blocks))
+    build = time.perf_counter() - start
+
+    blocks = [ResourcePool([random_block(rnd, args.blocks + x)])
+              for x in range(args.lookups)]
+    pools = [ResourcePool(random_block(rnd, args.blocks + x)
+                          for x in range(args.other))
+             for _ in range(args.lookups)]
+
+    print("%u blocks (pool built in %.3fs), %u lookups" %
+          (args.blocks, build, args.lookups))
+
+    for name, others in (("single block", blocks),
+                         ("pools of %u blocks" % args.other, pools)):
+
+        legacy, expected = run(legacy_and, pool, others)
+        indexed, results = run(lambda x, y: x & y, pool, others)
+
+        if [set(x) for x in results] != expected:
+            print("Results do not match")
+            sys.exit(1)
+
+        print("%s:" % name)
+        print("  legacy: %.0f lookups/s" % (args.lookups / legacy))
+        print("  indexed: %.0f lookups/s" % (args.lookups / indexed))
+        print("  speedup: %.1fx" % (legacy / indexed))
+
+
+if __name__ == "__main__":
+    main()
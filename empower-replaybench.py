@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""LVAPP framing replay benchmark.
+
+Builds a synthetic capture of the byte streams sent by a set of WTPs
+(hello messages, probe requests and UCQM poller responses, split in TCP
+segments) and replays it at a target rate (messages per second) through
+the LVAPPConnection framing and through the previous implementation (read
+the header, then the rest of the message, concatenating the buffers). The
+same parsers and handlers are used in both cases. Checks that the same
+messages are dispatched and reports the CPU load at the target rate and
+the max rate sustainable by one core.
+"""
+
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+
+from construct import Container
+
+from empower.lvapp import HEADER
+from empower.lvapp import HELLO
+from empower.lvapp import PROBE_REQUEST
+from empower.lvapp import PT_VERSION
+from empower.lvapp import PT_HELLO
+from empower.lvapp import PT_PROBE_REQUEST
+from empower.maps.maps import POLLER_RESPONSE
+from empower.maps.ucqm import PT_POLLER_RESPONSE
+from empower.lvapp.lvappconnection import LVAPPConnection
+
+# Replay granularity in seconds
+TICK = 0.01
+
+
+class Stream(object):
+    """The part of IOStream used by the framing code. Data fed to the
+    stream is delivered to the pending read (if any) like IOStream does,
+    i.e. copying it out of the read buffer."""
+
+    def __init__(self):
+
+        self.buffer = bytearray()
+        self.read = None
+
+    def set_nodelay(self, value):
+        """Nothing to do."""
+
+        pass
+
+    def set_close_callback(self, callback):
+        """Nothing to do."""
+
+        pass
+
+    @classmethod
+    def closed(cls):
+        """The stream is never closed."""
+
+        return False
+
+    def close(self):
+        """Framing errors are fatal."""
+
+        raise ValueError("Stream closed by the framing code")
+
+    def read_bytes(self, num_bytes, callback, partial=False):
+        """Register the pending read."""
+
+        self.read = (num_bytes, callback, partial)
+
+    def feed(self, data):
+        """Complete the pending reads with data."""
+
+        self.buffer.extend(data)
+
+        while self.read and self.buffer:
+
+            num_bytes, callback, partial = self.read
+
+            if not partial and len(self.buffer) < num_bytes:
+                break
+
+            self.read = None
+
+            chunk = bytes(self.buffer[:num_bytes])
+            del self.buffer[:num_bytes]
+
+            callback(chunk)
+
+
+class Codec(object):
+    """Wraps a message codec so that LVAPPConnection finds no handler
+    method for it and only calls the registered handlers."""
+
+    def __init__(self, codec):
+
+        self.name = "replay_%s" % codec.name
+        self.parse = codec.parse
+
+
+class Server(object):
+    """The part of LVAPPServer used by the framing code."""
+
+    def __init__(self):
+
+        self.dispatched = []
+
+        codecs = {PT_HELLO: HELLO,
+                  PT_PROBE_REQUEST: PROBE_REQUEST,
+                  PT_POLLER_RESPONSE: POLLER_RESPONSE}
+
+        self.pt_types = {k: Codec(v) for k, v in codecs.items()}
+        self.pt_types_handlers = {k: [self.handle] for k in codecs}
+
+    def handle(self, msg):
+        """Record the dispatched message."""
+
+        self.dispatched.append((msg.type, msg.seq))
+
+
+class LegacyConnection(object):
+    """Previous implementation of LVAPPConnection framing."""
+
+    def __init__(self, stream, server):
+
+        self.stream = stream
+        self.server = server
+        self.header = getattr(HEADER, 'construct', HEADER)
+        self.buffer = b''
+        self._wait()
+
+    def _wait(self):
+        """Read the next header."""
+
+        self.buffer = b''
+        self.stream.read_bytes(4, self._on_read)
+
+    def _on_read(self, line):
+        """Append line to the buffer, dispatch the message if complete."""
+
+        self.buffer = self.buffer + line
+        hdr = self.header.parse(self.buffer)
+
+        if len(self.buffer) < hdr.length:
+            remaining = hdr.length - len(self.buffer)
+            self.stream.read_bytes(remaining, self._on_read)
+            return
+
+        msg = self.server.pt_types[hdr.type].parse(self.buffer)
+
+        for handler in self.server.pt_types_handlers[hdr.type]:
+            handler(msg)
+
+        self._wait()
+
+
+def build_message(rnd, wtp, seq, entries):
+    """Return a random message sent by wtp."""
+
+    kind = rnd.random()
+
+    if kind < 0.25:
+
+        return HELLO.build(Container(version=PT_VERSION,
+                                     type=PT_HELLO,
+                                     length=18,
+                                     seq=seq,
+                                     wtp=wtp,
+                                     period=5000))
+
+    if kind < 0.85:
+
+        ssid = b'EmPOWER' if rnd.random() < 0.5 else b''
+
+        return PROBE_REQUEST.build(Container(version=PT_VERSION,
+                                             type=PT_PROBE_REQUEST,
+                                             length=28 + len(ssid),
+                                             seq=seq,
+                                             wtp=wtp,
+                                             sta=rnd.randbytes(6),
+                                             hwaddr=wtp,
+                                             channel=6,
+                                             band=0,
+                                             ssid=ssid))
+
+    items = [[rnd.randbytes(6), rnd.randint(0, 255), rnd.randint(-90, -30),
+              rnd.randint(0, 1000), rnd.randint(0, 100000),
+              rnd.randint(-90, -30)] for _ in range(entries)]
+
+    return POLLER_RESPONSE.build(Container(version=PT_VERSION,
+                                           type=PT_POLLER_RESPONSE,
+                                           length=20 + 17 * entries,
+                                           seq=seq,
+                                           module_id=1,
+                                           wtp=wtp,
+                                           nb_entries=entries,
+                                           img_entries=items))
+
+
+def build_capture(nb_wtps, nb_messages, segment, entries):
+    """Return the capture as a list of (wtp index, segment) in arrival
+    order and the expected (type, seq) of every WTP."""
+
+    rnd = random.Random(0)
+    streams = [bytearray() for _ in range(nb_wtps)]
+    expected = [[] for _ in range(nb_wtps)]
+
+    for seq in range(nb_messages):
+        index = seq % nb_wtps
+        wtp = (0x02CA00000000 + index).to_bytes(6, 'big')
+        msg = build_message(rnd, wtp, seq, entries)
+        streams[index].extend(msg)
+        expected[index].append((msg[1], seq))
+
+    segments = []
+
+    for index, stream in enumerate(streams):
+        offset = 0
+        while offset < len(stream):
+            size = rnd.randint(1, segment)
+            segments.append((offset / len(stream), index,
+                             bytes(stream[offset:offset + size])))
+            offset += size
+
+    # interleave the streams, preserving the order of every stream
+    segments.sort(key=lambda x: (x[0], x[1]))
+
+    return [(x[1], x[2]) for x in segments], expected
+
+
+def replay(factory, nb_wtps, segments, rate, nb_messages):
+    """Replay the segments at rate messages per second, return the CPU
+    time used, the wall time and the dispatched messages of every WTP."""
+
+    servers = [Server() for _ in range(nb_wtps)]
+    streams = [Stream() for _ in range(nb_wtps)]
+    # the connections are referenced by the callbacks of their streams
+    for stream, server in zip(streams, servers):
+        factory(stream, server)
+
+    # bytes replayed every tick
+    budget = float("inf")
+
+    if rate:
+        budget = sum(len(x[1]) for x in segments) / nb_messages * rate * TICK
+
+    busy = 0
+    start = time.perf_counter()
+    deadline = start
+    index = 0
+
+    while index < len(segments):
+
+        sent = 0
+        cpu = time.process_time()
+
+        while index < len(segments) and sent < budget:
+            wtp, data = segments[index]
+            streams[wtp].feed(data)
+            sent += len(data)
+            index += 1
+
+        busy += time.process_time() - cpu
+
+        deadline += TICK
+        delay = deadline - time.perf_counter()
+
+        if rate and delay > 0:
+            time.sleep(delay)
+
+    return busy, time.perf_counter() - start, \
+        [x.dispatched for x in servers]
+
+
+def main():
+    """Parse the command line and run the benchmark."""
+
+    parser = ArgumentParser(description="LVAPP framing replay benchmark")
+
+    parser.add_argument("-n", "--messages", dest="messages", default=50000,
+                        type=int, help="Number of messages; default=50000")
+    parser.add_argument("-r", "--rate", dest="rate", default=10000,
+                        type=int, help="Replay rate (msgs/s, 0: no pacing); "
+                        "default=10000")
+    parser.add_argument("-w", "--wtps", dest="wtps", default=20,
+                        type=int, help="Number of WTPs; default=20")
+    parser.add_argument("-s", "--segment", dest="segment", default=1448,
+                        type=int, help="Max TCP segment size; default=1448")
+    parser.add_argument("-e", "--entries", dest="entries", default=30,
+                        type=int, help="Entries per poller response; "
+                        "default=30")
+
+    args = parser.parse_args()
+
+    segments, expected = build_capture(args.wtps, args.messages,
+                                       args.segment, args.entries)
+
+    print("%u messages, %u WTPs, %u segments, %u bytes, %u msgs/s" %
+          (args.messages, args.wtps, len(segments),
+           sum(len(x[1]) for x in segments), args.rate))
+
+    for name, factory in (("legacy", LegacyConnection),
+                          ("incremental",
+                           lambda x, y: LVAPPConnection(x, None, y))):
+
+        busy, wall, dispatched = replay(factory, args.wtps, segments,
+                                        args.rate, args.messages)
+
+        if dispatched != expected:
+            print("%s: dispatched messages do not match" % name)
+            sys.exit(1)
+
+        print("%s:" % name)
+        print("  replayed at %.0f msgs/s, cpu load %.1f%%" %
+              (args.messages / wall, 100 * busy / wall))
+        print("  max rate: %.0f msgs/s" % (args.messages / busy))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Tenant indexes microbenchmark.
+
+Builds a set of synthetic tenants (half unique, half shared with one VAP
+on every WTP) over a set of synthetic WTPs and times the lookups done on
+the association path with the previous implementation (scanning all the
+tenants) and with the runtime indexes:
+
+    ssids: the SSIDs served by a WTP (probe requests)
+    tenant: the tenant with a given SSID (hello, status VAP)
+    vap: the shared VAP with a given BSSID on a WTP (auth/assoc requests)
+
+Checks that the results match and reports the time per lookup.
+"""
+
+import sys
+import time
+import uuid
+import random
+
+from argparse import ArgumentParser
+
+import empower.main
+
+from empower.datatypes.etheraddress import EtherAddress
+from empower.core.core import EmpowerRuntime
+from empower.core.tenant import Tenant
+from empower.core.tenant import T_TYPE_SHARED
+from empower.core.tenant import T_TYPE_UNIQUE
+from empower.core.vap import VAP
+
+
+class Runtime(EmpowerRuntime):
+    """The runtime indexes, without the database and the components."""
+
+    def __init__(self):
+
+        self.tenants = {}
+        self.tenant_names = {}
+        self.pnfdev_tenants = {}
+        self.vaps = {}
+        self.wtp_vaps = {}
+        self.block_vaps = {}
+        self.state_listeners = []
+
+
+def build(runtime, nb_tenants, nb_wtps, wtps_per_tenant):
+    """Populate the runtime, return the WTPs."""
+
+    # this module binds the runtime when imported
+    from empower.core.wtp import WTP
+
+    rnd = random.Random(0)
+
+    wtps = []
+
+    for index in range(nb_wtps):
+        addr = EtherAddress((0x02CA00000000 + index).to_bytes(6, 'big'))
+        wtps.append(WTP(addr, "WTP %u" % index))
+
+    for index in range(nb_tenants):
+
+        bssid_type = T_TYPE_SHARED if index % 2 else T_TYPE_UNIQUE
+        tenant = Tenant(uuid.UUID(int=index), "tenant-%u" % index, "foo",
+                        "tenant %u" % index, bssid_type)
+
+        runtime.tenants[tenant.tenant_id] = tenant
+        runtime.tenant_names[tenant.tenant_name] = tenant
+
+        for wtp in rnd.sample(wtps, wtps_per_tenant):
+
+            # Tenant.add_pnfdev also persists the membership
+            tenant.wtps[wtp.addr] = wtp
+            runtime.add_pnfdev_tenant(wtp, tenant)
+
+            if bssid_type == T_TYPE_SHARED:
+                bssid = EtherAddress(rnd.randbytes(6))
+                runtime.add_vap(VAP(bssid, wtp.addr, wtp, tenant))
+
+    return wtps
+
+
+def legacy_ssids(runtime, wtp_addr):
+    """SSIDs served by wtp_addr, scanning all the tenants."""
+
+    ssids = set()
+
+    for tenant in runtime.tenants.values():
+        if tenant.bssid_type == T_TYPE_SHARED:
+            continue
+        for wtp in tenant.wtps.values():
+            if wtp_addr == wtp.addr:
+                ssids.add(tenant.tenant_name)
+
+    return ssids
+
+
+def indexed_ssids(runtime, wtp_addr):
+    """SSIDs served by wtp_addr, from the index."""
+
+    return set(tenant.tenant_name
+               for tenant in runtime.load_tenants(wtp_addr).values()
+               if tenant.bssid_type != T_TYPE_SHARED)
+
+
+def legacy_tenant(runtime, tenant_name):
+    """Tenant with the given name, scanning all the tenants."""
+
+    for tenant in runtime.tenants.values():
+        if tenant.tenant_name == tenant_name:
+            return tenant
+
+    return None
+
+
+def indexed_tenant(runtime, tenant_name):
+    """Tenant with the given name, from the index."""
+
+    return runtime.load_tenant(tenant_name)
+
+
+def legacy_vap(runtime, bssid, wtp):
+    """Shared VAP with the given bssid on wtp, scanning all the shared
+    tenants."""
+
+    shared_tenants = [x for x in runtime.tenants.values()
+                      if x.bssid_type == T_TYPE_SHARED]
+
+    for tenant in shared_tenants:
+        if bssid in tenant.vaps and tenant.vaps[bssid].wtp == wtp:
+            return tenant.vaps[bssid]
+
+    return None
+
+
+def indexed_vap(runtime, bssid, wtp):
+    """Shared VAP with the given bssid on wtp, from the index."""
+
+    vap = runtime.vaps.get(bssid)
+
+    if vap and vap.wtp == wtp:
+        return vap
+
+    return None
+
+
+def run(func, runtime, queries):
+    """Run all the queries, return the time per lookup and the results."""
+
+    start = time.perf_counter()
+    results = [func(runtime, *x) for x in queries]
+
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main():
+    """Parse the command line and run the benchmark."""
+
+    parser = ArgumentParser(description="Tenant indexes microbenchmark")
+
+    parser.add_argument("-t", "--tenants", dest="tenants", default=500,
+                        type=int, help="Number of tenants; default=500")
+    parser.add_argument("-w", "--wtps", dest="wtps", default=100,
+                        type=int, help="Number of WTPs; default=100")
+    parser.add_argument("-m", "--members", dest="members", default=10,
+                        type=int, help="WTPs per tenant; default=10")
+    parser.add_argument("-n", "--lookups", dest="lookups", default=10000,
+                        type=int, help="Lookups per type; default=10000")
+
+    args = parser.parse_args()
+
+    runtime = Runtime()
+    empower.main.RUNTIME = runtime
+
+    wtps = build(runtime, args.tenants, args.wtps, args.members)
+
+    rnd = random.Random(1)
+    vaps = list(runtime.vaps.values())
+    names = [x.tenant_name for x in runtime.tenants.values()]
+
+    queries = {
+        'ssids': [(rnd.choice(wtps).addr,) for _ in range(args.lookups)],
+        'tenant': [(rnd.choice(names),) for _ in range(args.lookups)],
+        'vap': [(x.net_bssid, x.wtp) if rnd.random() < 0.5 else
+                (x.net_bssid, rnd.choice(wtps))
+                for x in (rnd.choice(vaps) for _ in range(args.lookups))]
+    }
+
+    lookups = [('ssids', legacy_ssids, indexed_ssids),
+               ('tenant', legacy_tenant, indexed_tenant),
+               ('vap', legacy_vap, indexed_vap)]
+
+    print("%u tenants, %u WTPs, %u WTPs per tenant, %u VAPs" %
+          (args.tenants, args.wtps, args.members, len(vaps)))
+    print("%-8s %12s %12s %10s" % ("lookup", "legacy", "indexed", ""))
+
+    for name, legacy_func, indexed_func in lookups:
+
+        legacy, expected = run(legacy_func, runtime, queries[name])
+        indexed, results = run(indexed_func, runtime, queries[name])
+
+        if results != expected:
+            print("%s: results do not match" % name)
+            sys.exit(1)
+
+        print("%-8s %10.2fus %10.2fus %9.1fx" %
+              (name, legacy * 1e6, indexed * 1e6, legacy / indexed))
+
+
+if __name__ == "__main__":
+    main()
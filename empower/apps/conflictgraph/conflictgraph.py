@@ -19,27 +19,84 @@
 
 from empower.core.app import EmpowerApp
 from empower.core.app import DEFAULT_PERIOD
+from empower.apps.conflictgraph.graph import ConflictGraph as Graph
+
+
+DEFAULT_THRESHOLD = None
+DEFAULT_HYSTERESIS = 0
 
 
 class ConflictGraph(EmpowerApp):
     """Channel Quality and Conflict Maps visulization app.
 
+    The conflict graph is updated with the stations entering or leaving
+    the maps at every UCQM/NCQM response and with the LVAPs joining,
+    leaving or moving at every period.
+
     Command Line Parameters:
 
         tenant_id: tenant id
         every: loop period in ms (optional, default 5000ms)
+        threshold: min mov_rssi in dBm of a station entering a map
+            (optional, default every reported station)
+        hysteresis: margin in dB below threshold before a station
+            leaves a map (optional, default 0)
 
     Example:
 
-        ./empower-runtime.py apps.pollers.linkstatspoller \
+        ./empower-runtime.py apps.conflictgraph.conflictgraph \
             --tenant_id=52313ecb-9d00-4b7d-b873-b55d3d9ada26D
     """
 
     def __init__(self, **kwargs):
+        self.graph = Graph(DEFAULT_THRESHOLD, DEFAULT_HYSTERESIS)
         EmpowerApp.__init__(self, **kwargs)
-        self.conflicts = {'networks': [], 'stations': []}
         self.wtpup(callback=self.wtp_up_callback)
 
+    @property
+    def threshold(self):
+        """Return threshold."""
+
+        return self.graph.threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        """Set threshold."""
+
+        if value is None or value == "":
+            self.graph.threshold = None
+            return
+
+        threshold = int(value)
+
+        if threshold > 0 or threshold < -128:
+            raise ValueError("Invalid value for threshold")
+
+        self.graph.threshold = threshold
+
+    @property
+    def hysteresis(self):
+        """Return hysteresis."""
+
+        return self.graph.hysteresis
+
+    @hysteresis.setter
+    def hysteresis(self, value):
+        """Set hysteresis."""
+
+        hysteresis = int(value)
+
+        if hysteresis < 0:
+            raise ValueError("Invalid value for hysteresis")
+
+        self.graph.hysteresis = hysteresis
+
+    @property
+    def conflicts(self):
+        """Return the conflicts as lists of (src, dst) LVAPs."""
+
+        return self.graph.to_dict()
+
     def to_dict(self):
         """Return json-serializable representation of the object."""
 
@@ -54,46 +111,28 @@ class ConflictGraph(EmpowerApp):
             self.ucqm(block=block, every=self.every, callback=self.update_cm)
             self.ncqm(block=block, every=self.every, callback=self.update_cm)
 
-    def update_cm(self, _):
+    def loop(self):
         """Periodic job."""
 
-        # Initialize conflict map
-        self.conflicts = {'networks': [], 'stations': []}
-
-        # Interate over all the (directed) LVAPs
-        # pairs in the network
-        for src in self.lvaps():
-            for dst in self.lvaps():
-
-                # Ignore links to self
-                if src == dst:
-                    continue
-
-                # If the receiver of this link is within
-                # interference range of the transmitter
-                # of the other link, then add an entry
-                # in the conflict map (for both clients
-                # and access points)
+        lvaps = self.lvaps()
 
-                for blk in dst.scheduled_on:
+        if lvaps is None:
+            return
 
-                    if src.addr in blk.ucqm:
+        self.graph.sync(lvaps)
 
-                        self.log.info("(%s, %s) -> (%s, %s)",
-                                      src.addr, src.wtp,
-                                      dst.addr, dst.wtp)
-                        self.conflicts['stations'].append((src, dst))
+    def update_cm(self, poller):
+        """Called when a UCQM/NCQM response is received from a WTP."""
 
-                    if src.lvap_bssid in blk.ncqm or \
-                       src.wtp == dst.wtp:
+        values = [(addr, value['mov_rssi'])
+                  for addr, value in poller.maps.items()]
 
-                        self.log.info("(%s, %s) -> (%s, %s)",
-                                      src.addr, src.wtp,
-                                      dst.addr, dst.wtp)
-                        self.conflicts['networks'].append((src, dst))
+        self.graph.update_map(poller.MODULE_NAME, poller.block, values)
 
 
-def launch(tenant_id, every=DEFAULT_PERIOD):
+def launch(tenant_id, every=DEFAULT_PERIOD, threshold=DEFAULT_THRESHOLD,
+           hysteresis=DEFAULT_HYSTERESIS):
     """ Initialize the module. """
 
-    return ConflictGraph(tenant_id=tenant_id, every=every)
+    return ConflictGraph(tenant_id=tenant_id, every=every,
+                         threshold=threshold, hysteresis=hysteresis)
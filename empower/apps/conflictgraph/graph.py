@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Incremental conflict graph.
+
+A directed (src, dst) LVAP pair is a station conflict if src is heard (in
+the UCQM) by a block dst is scheduled on, and a network conflict if the
+BSSID of src is heard (in the NCQM) by a block dst is scheduled on or if
+src and dst are on the same WTP. Every edge counts the reasons it exists
+(its support) and is removed when the count drops to zero, so that the
+graph is updated with the changes only: the stations entering or leaving
+a map and the LVAPs joining, leaving or moving.
+
+A station enters a map when its mov_rssi is at least threshold and leaves
+it when its mov_rssi drops below threshold - hysteresis (or when it is no
+longer reported). If threshold is None every reported station is in the
+map.
+"""
+
+UCQM = 'ucqm'
+NCQM = 'ncqm'
+
+
+class Edges(object):
+    """Directed edges with their support.
+
+    Attributes:
+        support: the number of reasons of every edge, by (src, dst)
+        adjacency: the destinations of every source
+    """
+
+    def __init__(self):
+
+        self.support = {}
+        self.adjacency = {}
+
+    def __len__(self):
+        return len(self.support)
+
+    def __contains__(self, edge):
+        return edge in self.support
+
+    def add(self, src, dst):
+        """Add a reason for the (src, dst) edge."""
+
+        if src == dst:
+            return
+
+        count = self.support.get((src, dst), 0)
+        self.support[(src, dst)] = count + 1
+
+        if not count:
+            self.adjacency.setdefault(src, set()).add(dst)
+
+    def remove(self, src, dst):
+        """Remove a reason for the (src, dst) edge."""
+
+        if src == dst:
+            return
+
+        count = self.support.get((src, dst), 0)
+
+        if count > 1:
+            self.support[(src, dst)] = count - 1
+            return
+
+        self.support.pop((src, dst), None)
+
+        dsts = self.adjacency.get(src)
+
+        if dsts is not None:
+            dsts.discard(dst)
+            if not dsts:
+                del self.adjacency[src]
+
+    def neighbours(self, src):
+        """Return the destinations of src."""
+
+        return self.adjacency.get(src, set())
+
+
+class ConflictGraph(object):
+    """Conflict graph of a set of LVAPs, updated incrementally.
+
+    Attributes:
+        threshold: the min mov_rssi of a station entering a map (dBm)
+        hysteresis: the margin below threshold before a station leaves a
+          map (dB)
+        lvaps: the LVAPs, by address
+        stations: the station conflicts (by LVAP address)
+        networks: the network conflicts (by LVAP address)
+    """
+
+    def __init__(self, threshold=None, hysteresis=0):
+
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.lvaps = {}
+        self.stations = Edges()
+        self.networks = Edges()
+
+        # map kind -> block -> addresses heard by the block
+        self.__heard = {UCQM: {}, NCQM: {}}
+
+        # map kind -> address -> blocks hearing the address
+        self.__hearers = {UCQM: {}, NCQM: {}}
+
+        # lvap addr -> (blocks, wtp addr, bssid) as last seen
+        self.__state = {}
+
+        # block -> lvap addrs, bssid -> lvap addrs, wtp -> lvap addrs
+        self.__dsts = {}
+        self.__bssids = {}
+        self.__members = {}
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {'networks': [(self.lvaps[x], self.lvaps[y])
+                             for x, y in self.networks.support],
+                'stations': [(self.lvaps[x], self.lvaps[y])
+                             for x, y in self.stations.support]}
+
+    def update_map(self, kind, block, values):
+        """Update the addresses heard by block.
+
+        Args:
+            kind: UCQM or NCQM
+            block: the block reporting the map
+            values: the reported (addr, mov_rssi)
+        """
+
+        old = self.__heard[kind].get(block, set())
+        new = set()
+
+        for addr, mov_rssi in values:
+
+            if self.threshold is None:
+                new.add(addr)
+                continue
+
+            if addr in old:
+                limit = self.threshold - self.hysteresis
+            else:
+                limit = self.threshold
+
+            if mov_rssi >= limit:
+                new.add(addr)
+
+        for addr in old - new:
+            self.__unhear(kind, block, addr)
+
+        for addr in new - old:
+            self.__hear(kind, block, addr)
+
+    def __sources(self, kind, addr):
+        """Return the LVAPs (addresses) heard as addr in a map."""
+
+        if kind == UCQM:
+            return [addr] if addr in self.lvaps else []
+
+        return self.__bssids.get(addr, ())
+
+    def __hear(self, kind, block, addr):
+        """Add addr to the addresses heard by block."""
+
+        self.__heard[kind].setdefault(block, set()).add(addr)
+        self.__hearers[kind].setdefault(addr, set()).add(block)
+
+        edges = self.stations if kind == UCQM else self.networks
+
+        for src in self.__sources(kind, addr):
+            for dst in self.__dsts.get(block, ()):
+                edges.add(src, dst)
+
+    def __unhear(self, kind, block, addr):
+        """Remove addr from the addresses heard by block."""
+
+        edges = self.stations if kind == UCQM else self.networks
+
+        for src in self.__sources(kind, addr):
+            for dst in self.__dsts.get(block, ()):
+                edges.remove(src, dst)
+
+        discard(self.__heard[kind], block, addr)
+        discard(self.__hearers[kind], addr, block)
+
+    def sync(self, lvaps):
+        """Update the graph with the LVAPs joining, leaving or moving."""
+
+        current = {}
+
+        for lvap in lvaps:
+            wtp = lvap.wtp.addr if lvap.wtp else None
+            current[lvap.addr] = (lvap, (frozenset(lvap.scheduled_on), wtp,
+                                         lvap.lvap_bssid))
+
+        for addr in [x for x in self.__state if x not in current]:
+            self.remove_lvap(addr)
+
+        for addr, (lvap, state) in current.items():
+
+            if addr in self.__state:
+
+                if self.__state[addr] == state:
+                    self.lvaps[addr] = lvap
+                    continue
+
+                self.remove_lvap(addr)
+
+            self.__add_lvap(lvap, state)
+
+    def add_lvap(self, lvap):
+        """Add an LVAP."""
+
+        wtp = lvap.wtp.addr if lvap.wtp else None
+        state = (frozenset(lvap.scheduled_on), wtp, lvap.lvap_bssid)
+
+        if lvap.addr in self.__state:
+            self.remove_lvap(lvap.addr)
+
+        self.__add_lvap(lvap, state)
+
+    def __add_lvap(self, lvap, state):
+        """Add an LVAP and the edges it is an endpoint of."""
+
+        addr = lvap.addr
+        blocks, wtp, bssid = state
+
+        self.lvaps[addr] = lvap
+        self.__state[addr] = state
+
+        if wtp is not None:
+            members = self.__members.setdefault(wtp, set())
+            for other in members:
+                self.networks.add(addr, other)
+                self.networks.add(other, addr)
+            members.add(addr)
+
+        self.__bssids.setdefault(bssid, set()).add(addr)
+
+        # as a source
+        for block in self.__hearers[UCQM].get(addr, ()):
+            for dst in self.__dsts.get(block, ()):
+                self.stations.add(addr, dst)
+
+        for block in self.__hearers[NCQM].get(bssid, ()):
+            for dst in self.__dsts.get(block, ()):
+                self.networks.add(addr, dst)
+
+        # as a destination
+        for block in blocks:
+
+            self.__dsts.setdefault(block, set()).add(addr)
+
+            for src in self.__heard[UCQM].get(block, ()):
+                if src in self.lvaps:
+                    self.stations.add(src, addr)
+
+            for heard in self.__heard[NCQM].get(block, ()):
+                for src in self.__bssids.get(heard, ()):
+                    self.networks.add(src, addr)
+
+    def remove_lvap(self, addr):
+        """Remove an LVAP and the edges it is an endpoint of."""
+
+        if addr not in self.__state:
+            return
+
+        blocks, wtp, bssid = self.__state[addr]
+
+        # as a destination
+        for block in blocks:
+
+            for src in self.__heard[UCQM].get(block, ()):
+                if src in self.lvaps:
+                    self.stations.remove(src, addr)
+
+            for heard in self.__heard[NCQM].get(block, ()):
+                for src in self.__bssids.get(heard, ()):
+                    self.networks.remove(src, addr)
+
+            discard(self.__dsts, block, addr)
+
+        # as a source
+        for block in self.__hearers[UCQM].get(addr, ()):
+            for dst in self.__dsts.get(block, ()):
+                self.stations.remove(addr, dst)
+
+        for block in self.__hearers[NCQM].get(bssid, ()):
+            for dst in self.__dsts.get(block, ()):
+                self.networks.remove(addr, dst)
+
+        discard(self.__bssids, bssid, addr)
+
+        if wtp is not None:
+            discard(self.__members, wtp, addr)
+            for other in self.__members.get(wtp, ()):
+                self.networks.remove(addr, other)
+                self.networks.remove(other, addr)
+
+        del self.lvaps[addr]
+        del self.__state[addr]
+
+
+def discard(index, key, value):
+    """Remove value from the set index[key], dropping empty sets."""
+
+    values = index.get(key)
+
+    if values is None:
+        return
+
+    values.discard(value)
+
+    if not values:
+        del index[key]
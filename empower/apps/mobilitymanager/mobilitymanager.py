@@ -17,21 +17,41 @@
 
 """Basic mobility manager."""
 
+import time
+
 from empower.core.app import EmpowerApp
 from empower.core.app import DEFAULT_PERIOD
 
+from empower.main import RUNTIME
+
 
 DEFAULT_LIMIT = -30
+DEFAULT_HYSTERESIS = 0
+DEFAULT_MAX_LOAD = 0
+DEFAULT_MAX_MOVES = 0
 
 
 class MobilityManager(EmpowerApp):
     """Basic mobility manager.
 
+    At every period the handovers of all the LVAPs are decided in a single
+    pass over the UCQM and are then applied together, so that the messages
+    to every WTP are coalesced. An LVAP is moved to the block with the
+    highest mov_rssi (at least limit) only if it improves on the current
+    block by more than hysteresis. Moves are applied by decreasing gain,
+    skipping the ones towards WTPs which are congested or already serve
+    max_load LVAPs (of any tenant), up to max_moves per period.
+
     Command Line Parameters:
 
         tenant_id: tenant id
-        limit: handover limit in dBm (optional, default -80)
+        limit: handover limit in dBm (optional, default -30)
         every: loop period in ms (optional, default 5000ms)
+        hysteresis: min improvement in dB (optional, default 0)
+        max_load: max LVAPs per WTP (of any tenant), 0 for no limit
+            (optional, default 0)
+        max_moves: max handovers per period, 0 for no limit (optional,
+            default 0)
 
     Example:
 
@@ -41,6 +61,15 @@ class MobilityManager(EmpowerApp):
 
     def __init__(self, **kwargs):
         self.__limit = DEFAULT_LIMIT
+        self.__hysteresis = DEFAULT_HYSTERESIS
+        self.__max_load = DEFAULT_MAX_LOAD
+        self.__max_moves = DEFAULT_MAX_MOVES
+        self.stats = {'cycles': 0,
+                      'decision_time': 0.0,
+                      'decision_time_max': 0.0,
+                      'handovers': 0,
+                      'handovers_total': 0,
+                      'deferred': 0}
         EmpowerApp.__init__(self, **kwargs)
 
         # Register an wtp up event
@@ -72,7 +101,7 @@ class MobilityManager(EmpowerApp):
         if not valid:
             return
 
-        new_block = max(valid, key=lambda x: x.ucqm[lvap.addr]['mov_rssi'])
+        new_block = RUNTIME.ucqm.best_block(lvap.addr, valid)
         self.log.info("LVAP %s setting new block %s" % (lvap.addr, new_block))
 
         lvap.scheduled_on = new_block
@@ -95,6 +124,64 @@ class MobilityManager(EmpowerApp):
         self.log.info("Setting limit %u dB" % value)
         self.__limit = limit
 
+    @property
+    def hysteresis(self):
+        """Return hysteresis."""
+
+        return self.__hysteresis
+
+    @hysteresis.setter
+    def hysteresis(self, value):
+        """Set hysteresis."""
+
+        hysteresis = int(value)
+
+        if hysteresis < 0:
+            raise ValueError("Invalid value for hysteresis")
+
+        self.__hysteresis = hysteresis
+
+    @property
+    def max_load(self):
+        """Return max_load."""
+
+        return self.__max_load
+
+    @max_load.setter
+    def max_load(self, value):
+        """Set max_load."""
+
+        max_load = int(value)
+
+        if max_load < 0:
+            raise ValueError("Invalid value for max_load")
+
+        self.__max_load = max_load
+
+    @property
+    def max_moves(self):
+        """Return max_moves."""
+
+        return self.__max_moves
+
+    @max_moves.setter
+    def max_moves(self, value):
+        """Set max_moves."""
+
+        max_moves = int(value)
+
+        if max_moves < 0:
+            raise ValueError("Invalid value for max_moves")
+
+        self.__max_moves = max_moves
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        out = super().to_dict()
+        out['stats'] = self.stats
+        return out
+
     def low_rssi(self, trigger):
         """ Perform handover if an LVAP's rssi is
         going below the threshold. """
@@ -110,16 +197,130 @@ class MobilityManager(EmpowerApp):
 
         self.handover(lvap)
 
+    def plan(self, lvaps):
+        """Return the handovers of lvaps as a list of (lvap, block) and the
+        number of handovers deferred."""
+
+        groups = self.tenant.block_index.by_channel
+        addrs = [x.addr for x in lvaps]
+
+        # the best block of every LVAP, by channel and band
+        best = {key: RUNTIME.ucqm.best_blocks(self.limit, blocks,
+                                              addrs=addrs)
+                for key, blocks in groups.items()}
+
+        # LVAPs of every tenant per WTP, with the moves staged so far
+        load = {}
+
+        candidates = []
+
+        for lvap in lvaps:
+
+            current = lvap.default_block
+
+            if not current:
+                continue
+
+            choice = None
+
+            for key in {(x.channel, x.band) for x in lvap.scheduled_on}:
+
+                entry = best.get(key, {}).get(lvap.addr)
+
+                if entry and (not choice or entry[1] > choice[1]):
+                    choice = entry
+
+            if not choice or choice[0] == current:
+                continue
+
+            value = RUNTIME.ucqm.get(current, lvap.addr, 'mov_rssi')
+
+            if value is None:
+                gain = float("inf")
+            else:
+                gain = choice[1] - value
+
+            if gain <= self.hysteresis:
+                continue
+
+            candidates.append((gain, lvap, choice[0]))
+
+        candidates.sort(key=lambda x: x[0], reverse=True)
+
+        moves = []
+        deferred = 0
+
+        for _, lvap, block in candidates:
+
+            wtp = block.radio
+
+            if self.max_moves and len(moves) >= self.max_moves:
+                deferred += 1
+                continue
+
+            if self.max_load and \
+               self.__load(load, wtp) >= self.max_load:
+                deferred += 1
+                continue
+
+            if not wtp.connection or wtp.connection.congested:
+                deferred += 1
+                continue
+
+            load[wtp.addr] = self.__load(load, wtp) + 1
+
+            if lvap.wtp:
+                load[lvap.wtp.addr] = self.__load(load, lvap.wtp) - 1
+
+            moves.append((lvap, block))
+
+        return moves, deferred
+
+    @classmethod
+    def __load(cls, load, wtp):
+        """Return the LVAPs on wtp, reading them from the runtime the first
+        time wtp is seen."""
+
+        if wtp.addr not in load:
+            load[wtp.addr] = len(RUNTIME.load_wtp_lvaps(wtp))
+
+        return load[wtp.addr]
+
     def loop(self):
         """ Periodic job. """
 
-        # Handover every active LVAP to
-        # the best WTP
-        for lvap in self.lvaps():
-            self.handover(lvap)
+        lvaps = self.lvaps()
+
+        if not lvaps:
+            return
+
+        # Decide the handovers of every active LVAP
+        start = time.time()
+        moves, deferred = self.plan(list(lvaps))
+        elapsed = time.time() - start
+
+        # Apply them together
+        for lvap, block in moves:
+            self.log.info("LVAP %s setting new block %s", lvap.addr, block)
+            lvap.scheduled_on = block
+
+        self.stats['cycles'] += 1
+        self.stats['decision_time'] = elapsed
+        self.stats['decision_time_max'] = \
+            max(self.stats['decision_time_max'], elapsed)
+        self.stats['handovers'] = len(moves)
+        self.stats['handovers_total'] += len(moves)
+        self.stats['deferred'] += deferred
+
+        self.log.info("Handovers: %u (deferred %u), decided in %.3fms",
+                      len(moves), deferred, elapsed * 1000)
 
 
-def launch(tenant_id, limit=DEFAULT_LIMIT, every=DEFAULT_PERIOD):
+def launch(tenant_id, limit=DEFAULT_LIMIT, every=DEFAULT_PERIOD,
+           hysteresis=DEFAULT_HYSTERESIS, max_load=DEFAULT_MAX_LOAD,
+           max_moves=DEFAULT_MAX_MOVES):
     """ Initialize the module. """
 
-    return MobilityManager(tenant_id=tenant_id, limit=limit, every=every)
+    return MobilityManager(tenant_id=tenant_id, limit=limit, every=every,
+                           hysteresis=hysteresis, max_load=max_load,
+                           max_moves=max_moves)
@@ -22,6 +22,8 @@ import time
 from empower.core.app import EmpowerApp
 from empower.core.app import DEFAULT_PERIOD
 
+from empower.main import RUNTIME
+
 
 class PowerTracker(EmpowerApp):
     """Application tracking pool-wide power consumption.
@@ -38,8 +40,24 @@ class PowerTracker(EmpowerApp):
     """
 
     def __init__(self, **kwargs):
-        EmpowerApp.__init__(self, **kwargs)
         self.filename = "./powertracker.csv"
+        self.trace = None
+        EmpowerApp.__init__(self, **kwargs)
+
+    def start(self):
+        """Open the trace file and start control loop."""
+
+        self.trace = RUNTIME.trace_sink.open(self.filename)
+        super().start()
+
+    def stop(self):
+        """Stop control loop and close the trace file."""
+
+        super().stop()
+
+        if self.trace:
+            self.trace.close()
+            self.trace = None
 
     def loop(self):
         """ Periodic job. """
@@ -53,10 +71,7 @@ class PowerTracker(EmpowerApp):
                 if datastream['id'] == 'power':
                     power += datastream['current_value']
 
-        line = "%u %f\n" % (time.time(), power)
-
-        with open(self.filename, 'a') as file_d:
-            file_d.write(line)
+        self.trace.write("%u %f\n" % (time.time(), power))
 
 
 def launch(tenant_id, filename="./powertracker.csv", every=DEFAULT_PERIOD):
@@ -22,8 +22,13 @@ from empower.core.app import DEFAULT_PERIOD
 from empower.core.resourcepool import BANDS
 from empower.datatypes.etheraddress import EtherAddress
 
+from empower.main import RUNTIME
+
 DEFAULT_ADDRESS = "ff:ff:ff:ff:ff:ff"
 
+# Trace files are rotated (and compressed) when larger than this
+TRACE_MAX_BYTES = 64 * 1024 * 1024
+
 
 class Survey(EmpowerApp):
     """Survey App.
@@ -44,6 +49,7 @@ class Survey(EmpowerApp):
         self.__addr = None
         EmpowerApp.__init__(self, **kwargs)
         self.links = {}
+        self.traces = {}
         self.wtpup(callback=self.wtp_up_callback)
 
     @property
@@ -74,51 +80,65 @@ class Survey(EmpowerApp):
 
         return out
 
+    def stop(self):
+        """Stop control loop and close the trace files."""
+
+        super().stop()
+
+        for trace in self.traces.values():
+            trace.close()
+
+        self.traces = {}
+
+    def trace(self, filename):
+        """Return the trace writer of filename."""
+
+        if filename not in self.traces:
+            self.traces[filename] = \
+                RUNTIME.trace_sink.open(filename, max_bytes=TRACE_MAX_BYTES,
+                                        compress=True)
+
+        return self.traces[filename]
+
     def summary_callback(self, summary):
         """ New stats available. """
 
+        frames = summary.frames
+
         self.log.info("New summary from %s addr %s frames %u", summary.block,
-                      summary.addr, len(summary.frames))
+                      summary.addr, len(frames))
 
-        # per block log
-        filename = "survey_%s_%u_%s.csv" % (summary.block.addr,
-                                            summary.block.channel,
-                                            BANDS[summary.block.band])
+        block = "%s_%u_%s" % (summary.block.addr, summary.block.channel,
+                              BANDS[summary.block.band])
 
-        for frame in summary.frames:
+        columns = [frames.column(x) for x in ('tsft', 'rate', 'rtype', 'rssi',
+                                               'length', 'type', 'subtype',
+                                               'ra', 'ta', 'seq')]
 
-            line = "%u,%g,%s,%d,%u,%s,%s,%s,%s,%s\n" % \
-                (frame['tsft'], frame['rate'], frame['rtype'], frame['rssi'],
-                 frame['length'], frame['type'], frame['subtype'],
-                 frame['ra'], frame['ta'], frame['seq'])
+        lines = ["%u,%g,%s,%d,%u,%s,%s,%s,%s,%s\n" % x for x in zip(*columns)]
 
-            with open(filename, 'a') as file_d:
-                file_d.write(line)
+        # per block log
+        self.trace("survey_%s.csv" % block).write("".join(lines))
 
         # per link log
-        for frame in summary.frames:
+        link_lines = {}
 
-            link = "%s_%s_%u_%s" % (frame['ta'], summary.block.addr,
-                                    summary.block.channel,
-                                    BANDS[summary.block.band])
+        for line, rssi, ta in zip(lines, frames.rssi, columns[8]):
 
-            filename = "link_%s.csv" % link
+            link = "%s_%s" % (ta, block)
 
             if link not in self.links:
                 self.links[link] = {}
 
-            if frame['rssi'] not in self.links[link]:
-                self.links[link][frame['rssi']] = 0
+            if rssi not in self.links[link]:
+                self.links[link][rssi] = 0
 
-            self.links[link][frame['rssi']] += 1
+            self.links[link][rssi] += 1
 
-            line = "%u,%g,%s,%d,%u,%s,%s,%s,%s,%s\n" % \
-                (frame['tsft'], frame['rate'], frame['rtype'], frame['rssi'],
-                 frame['length'], frame['type'], frame['subtype'],
-                 frame['ra'], frame['ta'], frame['seq'])
+            link_lines.setdefault(link, []).append(line)
 
-            with open(filename, 'a') as file_d:
-                file_d.write(line)
+        for link, lines in link_lines.items():
+            self.trace("link_%s.csv" % link).write("".join(lines))
 
 
 def launch(tenant_id, addr=DEFAULT_ADDRESS, every=DEFAULT_PERIOD):
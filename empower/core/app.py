@@ -139,30 +139,47 @@ class EmpowerApp(object):
 
         return RUNTIME.tenants[self.tenant_id].lvaps[addr]
 
+    def wtp_lvaps(self, wtp):
+        """Return the LVAPs in this tenant whose downlink is on wtp."""
+
+        return [lvap for lvap in RUNTIME.load_wtp_lvaps(wtp).values()
+                if lvap.tenant and lvap.tenant.tenant_id == self.tenant_id]
+
+    def block_lvaps(self, block):
+        """Return the LVAPs in this tenant scheduled on block."""
+
+        return [lvap for lvap in RUNTIME.load_block_lvaps(block).values()
+                if lvap.tenant and lvap.tenant.tenant_id == self.tenant_id]
+
+    def wtp_vaps(self, wtp):
+        """Return the VAPs in this tenant hosted by wtp."""
+
+        return [vap for vap in RUNTIME.load_wtp_vaps(wtp).values()
+                if vap.tenant_id == self.tenant_id]
+
+    def block_vaps(self, block):
+        """Return the VAPs in this tenant hosted by block."""
+
+        return [vap for vap in RUNTIME.load_block_vaps(block).values()
+                if vap.tenant_id == self.tenant_id]
+
     def blocks(self, lvap=None, limit=None):
         """Return all blocks in this Tenant."""
 
-        # Initialize the Resource Pool
-        pool = ResourcePool()
-
-        # Update the Resource Pool with all
-        # the available Resourse Blocks
-        for wtp in self.wtps():
-            pool = pool | wtp.supports
+        index = self.tenant.block_index
 
         if lvap:
 
             # Select matching Resource Blocks
-            matches = pool & lvap.scheduled_on
+            matches = index.matching(lvap.scheduled_on)
 
             if limit:
                 # Filter Resource Blocks by RSSI
-                return [block for block in matches
-                        if block.ucqm[lvap.addr]['mov_rssi'] >= self.limit]
+                return RUNTIME.ucqm.blocks_above(lvap.addr, limit, matches)
 
             return matches
 
-        return pool
+        return ResourcePool(index.pool)
 
     def wtps(self):
         """Return WTPs in this tenant."""
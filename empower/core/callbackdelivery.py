@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Remote callback delivery.
+
+Module callbacks can be either local functions or remote XML-RPC methods
+given as [url, method]. Remote callbacks are queued per destination and
+delivered by a fixed pool of threads:
+
+  - module results are serialized only when the batch is about to be
+    sent, a module queuing its own results several times before they are
+    sent is delivered once, with its latest state;
+  - every other object (e.g. the WTP/LVAP of an event) is serialized
+    when queued, so that it is delivered with the state it had when the
+    event happened;
+  - every destination has a bounded queue, when full the oldest entry is
+    dropped;
+  - up to max_batch entries are delivered in a single request using
+    XML-RPC multicall (falling back to one call per entry if the remote
+    server does not support it);
+  - a destination has at most one request in flight and reuses its
+    XML-RPC proxy, and thus its HTTP connection;
+  - batches failing because of a connection error are retried with
+    exponential backoff, then dropped. Retries send one entry per call
+    and resume after the last entry delivered.
+
+Delivery is at least once: the remote side may have applied the entries
+of a request failing with a connection error (the whole batch for a
+multicall request, the entry being sent otherwise), those entries are
+delivered again by the retry.
+"""
+
+import json
+import time
+import xmlrpc.client
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
+from tornado.ioloop import IOLoop
+
+from empower.core.jsonserializer import EmpowerEncoder
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+# Number of delivery threads
+DEFAULT_THREADS = 4
+
+# Max entries queued per destination
+DEFAULT_MAX_QUEUE = 1000
+
+# Max entries delivered in a single request
+DEFAULT_MAX_BATCH = 32
+
+# Max number of retries, delay before the first retry in ms
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 500
+
+
+class Destination(object):
+    """A remote callback destination.
+
+    Attributes:
+        url: the XML-RPC server url
+        method: the remote method
+        queue: the queued (key, serializable or JSON snapshot, timestamp)
+            entries, key is None for snapshots
+    """
+
+    def __init__(self, url, method):
+
+        self.url = url
+        self.method = method
+        self.queue = deque()
+        self.keys = set()
+        self.busy = False
+        self.multicall = True
+        self.proxy = xmlrpc.client.ServerProxy(url)
+
+        self.stats = {'queued': 0,
+                      'coalesced': 0,
+                      'dropped': 0,
+                      'delivered': 0,
+                      'requests': 0,
+                      'retries': 0,
+                      'failed': 0,
+                      'latency_avg': 0.0,
+                      'latency_max': 0.0}
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        out = dict(self.stats)
+
+        out['url'] = self.url
+        out['method'] = self.method
+        out['depth'] = len(self.queue)
+        out['multicall'] = self.multicall
+
+        return out
+
+    def call(self, payloads, batch=True):
+        """Deliver payloads (run by the worker threads), with a single
+        multicall request if batch is True. Connection errors raised while
+        sending one entry per call report the entries delivered so far in
+        their delivered attribute."""
+
+        if batch and len(payloads) > 1 and self.multicall:
+
+            multicall = xmlrpc.client.MultiCall(self.proxy)
+
+            for payload in payloads:
+                getattr(multicall, self.method)(payload)
+
+            try:
+                # results are iterated in order to raise remote faults
+                list(multicall())
+                return
+            except xmlrpc.client.Fault as ex:
+                if "system.multicall" not in ex.faultString:
+                    raise
+                LOG.info("Multicall not supported by %s", self.url)
+                self.multicall = False
+
+        func = getattr(self.proxy, self.method)
+
+        for index, payload in enumerate(payloads):
+            try:
+                func(payload)
+            except OSError as ex:
+                ex.delivered = index
+                raise
+
+
+class CallbackDelivery(object):
+    """Remote callback delivery.
+
+    Attributes:
+        max_queue: max entries queued per destination
+        max_batch: max entries delivered in a single request
+        retries: max number of retries
+        backoff: delay before the first retry in ms
+    """
+
+    def __init__(self, threads=DEFAULT_THREADS, max_queue=DEFAULT_MAX_QUEUE,
+                 max_batch=DEFAULT_MAX_BATCH, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF):
+
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        self.destinations = {}
+        self.__pool = ThreadPool(threads)
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {'max_queue': self.max_queue,
+                'max_batch': self.max_batch,
+                'destinations': [x.to_dict()
+                                 for x in self.destinations.values()]}
+
+    def stats(self, callback):
+        """Return the metrics of the destination of callback."""
+
+        destination = self.destinations.get(tuple(callback))
+
+        if not destination:
+            return None
+
+        return destination.to_dict()
+
+    def deliver(self, callback, serializable, coalesce=False):
+        """Queue serializable for delivery to callback ([url, method]).
+
+        If coalesce is True and serializable is already queued for the
+        same destination, the queued entry is kept (it will be serialized
+        with the latest state when sent). Otherwise serializable is
+        serialized and queued.
+        """
+
+        key = tuple(callback)
+
+        if key not in self.destinations:
+            self.destinations[key] = Destination(*key)
+
+        destination = self.destinations[key]
+
+        if coalesce and id(serializable) in destination.keys:
+            destination.stats['coalesced'] += 1
+            return
+
+        if coalesce:
+            entry = (id(serializable), serializable, time.time())
+        else:
+            entry = (None, json.dumps(serializable.to_dict(),
+                                      cls=EmpowerEncoder), time.time())
+
+        if len(destination.queue) >= self.max_queue:
+            dropped = destination.queue.popleft()
+            destination.keys.discard(dropped[0])
+            destination.stats['dropped'] += 1
+
+        destination.queue.append(entry)
+        destination.keys.add(entry[0])
+        destination.stats['queued'] += 1
+
+        if not destination.busy:
+            IOLoop.current().add_callback(self.__flush, destination)
+
+    def __flush(self, destination):
+        """Serialize and send the next batch of destination."""
+
+        if destination.busy or not destination.queue:
+            return
+
+        batch = []
+
+        while destination.queue and len(batch) < self.max_batch:
+            entry_key, serializable, timestamp = destination.queue.popleft()
+            destination.keys.discard(entry_key)
+            batch.append((entry_key, serializable, timestamp))
+
+        payloads = []
+        timestamps = []
+
+        for entry_key, serializable, timestamp in batch:
+
+            # snapshots are serialized when queued
+            if entry_key is None:
+                payloads.append(serializable)
+                timestamps.append(timestamp)
+                continue
+
+            try:
+                payloads.append(json.dumps(serializable.to_dict(),
+                                           cls=EmpowerEncoder))
+                timestamps.append(timestamp)
+            except Exception as ex:
+                LOG.exception(ex)
+
+        if not payloads:
+            self.__flush(destination)
+            return
+
+        destination.busy = True
+
+        self.__send(destination, payloads, timestamps, 0)
+
+    def __send(self, destination, payloads, timestamps, attempt):
+        """Hand the batch to the worker threads."""
+
+        LOG.info("Calling %s:%s (%u entries)", destination.url,
+                 destination.method, len(payloads))
+
+        # the callbacks run in the pool threads
+        io_loop = IOLoop.current()
+
+        def _callback(_):
+            io_loop.add_callback(self.__on_delivered, destination,
+                                 timestamps)
+
+        def _error_callback(ex):
+            io_loop.add_callback(self.__on_error, destination, payloads,
+                                 timestamps, attempt, ex)
+
+        destination.stats['requests'] += 1
+
+        # retries send one entry per call
+        self.__pool.apply_async(destination.call, (payloads, not attempt),
+                                {}, _callback, _error_callback)
+
+    def __on_delivered(self, destination, timestamps):
+        """Update the metrics and send the next batch."""
+
+        self.__account(destination, timestamps)
+
+        destination.busy = False
+        self.__flush(destination)
+
+    @classmethod
+    def __account(cls, destination, timestamps):
+        """Update the metrics of the entries delivered."""
+
+        now = time.time()
+        stats = destination.stats
+
+        for timestamp in timestamps:
+
+            latency = (now - timestamp) * 1000
+            stats['delivered'] += 1
+            stats['latency_avg'] += \
+                (latency - stats['latency_avg']) / stats['delivered']
+            stats['latency_max'] = max(stats['latency_max'], latency)
+
+    def __on_error(self, destination, payloads, timestamps, attempt, ex):
+        """Retry the entries not delivered on connection errors, drop them
+        otherwise."""
+
+        delivered = getattr(ex, 'delivered', 0)
+
+        if delivered:
+            self.__account(destination, timestamps[:delivered])
+            payloads = payloads[delivered:]
+            timestamps = timestamps[delivered:]
+
+        if isinstance(ex, OSError) and attempt < self.retries:
+
+            delay = self.backoff * 2 ** attempt / 1000
+            destination.stats['retries'] += 1
+
+            IOLoop.current().call_later(delay, self.__send, destination,
+                                        payloads, timestamps, attempt + 1)
+            return
+
+        LOG.error("Unable to call %s:%s: %s", destination.url,
+                  destination.method, ex)
+
+        destination.stats['failed'] += len(payloads)
+        destination.busy = False
+        self.__flush(destination)
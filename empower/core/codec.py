@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Precompiled message codecs.
+
+Translates construct Struct definitions into parsers and builders based on
+the struct module. Consecutive fixed size fields are merged into a single
+struct.Struct, variable length fields and arrays are resolved at runtime
+using the same length/count functions of the original definition. Parsed
+messages are Containers with the same field names produced by construct.
+
+Definitions using constructs that cannot be compiled (e.g. Range) are left
+to the construct interpreter.
+"""
+
+import struct
+
+from construct import Container
+from construct import ListContainer
+from construct import Struct
+from construct import Sequence
+from construct import StaticField
+from construct import FormatField
+from construct import MetaField
+from construct import MetaArray
+from construct import Buffered
+from construct.adapters import PaddingAdapter
+from construct.adapters import BitIntegerAdapter
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+
+class CompileError(Exception):
+    """Raised when a construct cannot be compiled."""
+
+    pass
+
+
+class BitFlags(object):
+    """A bit structure (e.g. flags) packed in a fixed number of bytes."""
+
+    def __init__(self, bitstruct):
+
+        if not isinstance(bitstruct.subcon, Struct):
+            raise CompileError("Unsupported bit structure")
+
+        self.size = bitstruct.sizeof()
+        self.fields = []
+
+        offset = self.size * 8
+
+        for field in bitstruct.subcon.subcons:
+
+            if isinstance(field, PaddingAdapter):
+                offset -= field.sizeof()
+                continue
+
+            if not isinstance(field, BitIntegerAdapter) or \
+               field.swapped or field.signed or callable(field.width):
+                raise CompileError("Unsupported bit field %s" % field.name)
+
+            offset -= field.width
+            mask = (1 << field.width) - 1
+            self.fields.append((field.name, offset, mask))
+
+    def decode(self, data):
+        """Decode raw bytes into a Container of bit fields."""
+
+        value = int.from_bytes(data, 'big')
+        out = Container()
+
+        for name, shift, mask in self.fields:
+            out[name] = (value >> shift) & mask
+
+        return out
+
+    def encode(self, obj):
+        """Encode a Container of bit fields into raw bytes."""
+
+        value = 0
+
+        for name, shift, mask in self.fields:
+            value |= (int(getattr(obj, name)) & mask) << shift
+
+        return value.to_bytes(self.size, 'big')
+
+
+class Record(object):
+    """A run of consecutive fixed size fields packed by one struct.Struct.
+
+    Every named field is described by a (name, bitflags) tuple where
+    bitflags is not None for bit structures. Padding bytes are skipped.
+    """
+
+    def __init__(self, subcons):
+
+        fmt = ">"
+        self.fields = []
+
+        for field in subcons:
+
+            if isinstance(field, FormatField):
+
+                if field.packer.format[0] not in ">!":
+                    raise CompileError("Unsupported endianness")
+
+                fmt += field.packer.format[1:]
+                self.fields.append((field.name, None))
+
+            elif isinstance(field, PaddingAdapter) and \
+                    type(field.subcon) is StaticField:
+
+                fmt += "%ux" % field.subcon.length
+
+            elif type(field) is StaticField:
+
+                fmt += "%us" % field.length
+                self.fields.append((field.name, None))
+
+            elif isinstance(field, Buffered):
+
+                flags = BitFlags(field)
+                fmt += "%us" % flags.size
+                self.fields.append((field.name, flags))
+
+            else:
+
+                raise CompileError("Unsupported field %s" % field.name)
+
+        self.packer = struct.Struct(fmt)
+        self.size = self.packer.size
+        self.plain = not any(flags for _, flags in self.fields)
+
+    def decode(self, values):
+        """Return a list of (name, value) from a tuple of unpacked values."""
+
+        return [(name, flags.decode(value) if flags else value)
+                for (name, flags), value in zip(self.fields, values)]
+
+    def encode(self, values):
+        """Return a tuple of values ready to be packed."""
+
+        out = []
+
+        for (_, flags), value in zip(self.fields, values):
+            out.append(flags.encode(value) if flags else value)
+
+        return out
+
+
+class Field(object):
+    """A variable length bytes field."""
+
+    def __init__(self, field):
+
+        self.name = field.name
+        self.lengthfunc = field.lengthfunc
+
+    def parse(self, data, offset, ctx):
+        """Parse field, return new offset."""
+
+        length = self.lengthfunc(ctx)
+        end = offset + length
+
+        if length < 0 or end > len(data):
+            raise struct.error("expected %d bytes" % length)
+
+        ctx[self.name] = bytes(data[offset:end])
+
+        return end
+
+    def build(self, obj, chunks):
+        """Append field to the chunks list."""
+
+        value = getattr(obj, self.name)
+
+        if len(value) != self.lengthfunc(obj):
+            raise struct.error("expected %d bytes, found %d" %
+                               (self.lengthfunc(obj), len(value)))
+
+        chunks.append(value)
+
+
+class Array(object):
+    """An array of fixed size elements."""
+
+    def __init__(self, field):
+
+        subcon = field.subcon
+
+        self.name = field.name
+        self.countfunc = field.countfunc
+
+        if isinstance(subcon, FormatField):
+            self.kind = FormatField
+            self.record = Record([subcon])
+        elif type(subcon) is Sequence:
+            self.kind = Sequence
+            self.record = Record(subcon.subcons)
+        elif type(subcon) is Struct:
+            self.kind = Struct
+            self.record = Record(subcon.subcons)
+        else:
+            raise CompileError("Unsupported array element %s" % field.name)
+
+    def parse(self, data, offset, ctx):
+        """Parse array, return new offset."""
+
+        count = self.countfunc(ctx)
+        end = offset + count * self.record.size
+
+        if count < 0 or end > len(data):
+            raise struct.error("expected %d elements" % count)
+
+        out = ListContainer()
+        record = self.record
+        entries = record.packer.iter_unpack(data[offset:end])
+
+        if self.kind is FormatField:
+            out.extend(values[0] for values in entries)
+        elif self.kind is Sequence and record.plain:
+            out.extend(ListContainer(values) for values in entries)
+        elif self.kind is Sequence:
+            out.extend(ListContainer(v for _, v in record.decode(values))
+                       for values in entries)
+        else:
+            out.extend(Container(**dict(record.decode(values)))
+                       for values in entries)
+
+        ctx[self.name] = out
+
+        return end
+
+    def build(self, obj, chunks):
+        """Append array to the chunks list."""
+
+        items = getattr(obj, self.name)
+
+        if len(items) != self.countfunc(obj):
+            raise struct.error("expected %d elements, found %d" %
+                               (self.countfunc(obj), len(items)))
+
+        record = self.record
+
+        for item in items:
+
+            if self.kind is FormatField:
+                values = [item]
+            elif self.kind is Sequence:
+                values = item
+            else:
+                values = [getattr(item, name) for name, _ in record.fields]
+
+            chunks.append(record.packer.pack(*record.encode(values)))
+
+
+class CompiledStruct(object):
+    """A construct Struct compiled to struct.Struct based codecs.
+
+    Exposes the parse() and build() methods of the original definition.
+    Any other attribute is looked up in the original construct.
+    """
+
+    def __init__(self, construct):
+
+        self.construct = construct
+        self.name = construct.name
+        self.steps = []
+
+        fixed = []
+
+        for field in construct.subcons:
+
+            if isinstance(field, MetaField):
+                step = Field(field)
+            elif isinstance(field, MetaArray):
+                step = Array(field)
+            else:
+                fixed.append(field)
+                continue
+
+            if fixed:
+                self.steps.append(Record(fixed))
+                fixed = []
+
+            self.steps.append(step)
+
+        if fixed:
+            self.steps.append(Record(fixed))
+
+    def __getattr__(self, name):
+        return getattr(self.construct, name)
+
+    def parse(self, data):
+        """Parse a message from a bytes-like object."""
+
+        out = Container()
+        offset = 0
+
+        for step in self.steps:
+
+            if isinstance(step, Record):
+
+                values = step.packer.unpack_from(data, offset)
+                offset += step.size
+
+                for name, value in step.decode(values):
+                    if name is not None:
+                        out[name] = value
+
+            else:
+
+                offset = step.parse(data, offset, out)
+
+        return out
+
+    def build(self, obj):
+        """Build a message from a Container."""
+
+        chunks = []
+
+        for step in self.steps:
+
+            if isinstance(step, Record):
+                values = [getattr(obj, name) for name, _ in step.fields]
+                chunks.append(step.packer.pack(*step.encode(values)))
+            else:
+                step.build(obj, chunks)
+
+        return b''.join(chunks)
+
+
+def compile_struct(construct):
+    """Compile a construct Struct.
+
+    Returns a CompiledStruct or the original construct if the definition
+    cannot be compiled.
+    """
+
+    if type(construct) is not Struct:
+        return construct
+
+    try:
+        return CompiledStruct(construct)
+    except CompileError as ex:
+        LOG.info("Using construct for %s: %s", construct.name, ex)
+        return construct
+
+
+def random_value(rnd, field):
+    """Return a random value of a fixed size field."""
+
+    if isinstance(field, FormatField):
+
+        fmt = field.packer.format
+        bits = 8 * struct.calcsize(fmt)
+
+        # element counts are kept small
+        if field.name and field.name.startswith("nb_"):
+            return rnd.randint(0, 8)
+
+        if fmt[-1].islower():
+            return rnd.randint(-(1 << (bits - 1)), (1 << (bits - 1)) - 1)
+
+        return rnd.randint(0, (1 << bits) - 1)
+
+    if type(field) is StaticField:
+        return bytes(rnd.getrandbits(8) for _ in range(field.length))
+
+    if isinstance(field, Buffered):
+
+        out = Container()
+
+        for bit in field.subcon.subcons:
+            if isinstance(bit, BitIntegerAdapter):
+                out[bit.name] = rnd.getrandbits(bit.width)
+
+        return out
+
+    if type(field) is Sequence:
+        return ListContainer(random_value(rnd, x) for x in field.subcons
+                             if not isinstance(x, PaddingAdapter))
+
+    if type(field) is Struct:
+        return Container(**{x.name: random_value(rnd, x)
+                            for x in field.subcons
+                            if not isinstance(x, PaddingAdapter)})
+
+    raise CompileError("Unsupported field %s" % field.name)
+
+
+def random_message(rnd, construct, max_length=32):
+    """Return a random Container that can be built with construct (a
+    Struct or a CompiledStruct), used by the tests and the benchmarks.
+
+    Variable length fields get up to max_length random bytes and the
+    length field is set accordingly, arrays get up to 8 elements.
+    """
+
+    construct = getattr(construct, 'construct', construct)
+
+    out = Container()
+    variable = False
+
+    for field in construct.subcons:
+
+        if isinstance(field, PaddingAdapter):
+            continue
+
+        if isinstance(field, MetaField):
+
+            # lengths are relative to the message length
+            length = rnd.randint(0, max_length)
+            out.length += length - field.lengthfunc(out)
+            out[field.name] = bytes(rnd.getrandbits(8)
+                                    for _ in range(length))
+            variable = True
+
+        elif isinstance(field, MetaArray):
+
+            out[field.name] = ListContainer(random_value(rnd, field.subcon)
+                                            for _ in
+                                            range(field.countfunc(out)))
+
+        else:
+
+            out[field.name] = random_value(rnd, field)
+
+            if field.name == "length":
+                out.length = 0
+
+    if not variable and "length" in out:
+        out.length = len(construct.build(out))
+
+    return out
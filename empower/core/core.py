@@ -38,6 +38,13 @@ from empower.persistence.persistence import TblPendingTenant
 from empower.core.account import Account
 from empower.core.tenant import Tenant
 from empower.core.acl import ACL
+from empower.core.timerwheel import TimerWheel
+from empower.core.pollscheduler import PollScheduler
+from empower.core.callbackdelivery import CallbackDelivery
+from empower.core.timeseries import TimeSeriesStore
+from empower.core.tracesink import TraceSink
+from empower.core.cqm import ChannelQualityMatrix
+from empower.core.jsonserializer import JSONSerializer
 from empower.persistence.persistence import TblAllow
 from empower.persistence.persistence import TblDeny
 
@@ -102,8 +109,50 @@ class EmpowerRuntime(object):
         self.allowed = {}
         self.denied = {}
 
+        # reverse indexes, kept up to date as tenants, pnfdevs membership
+        # and vaps change: tenant_name -> Tenant, pnfdev addr ->
+        # {tenant_id: Tenant}, net_bssid -> VAP
+        self.tenant_names = {}
+        self.pnfdev_tenants = {}
+        self.vaps = {}
+
+        # lvaps/vaps indexes: wtp addr -> {addr: LVAP/VAP}, ResourceBlock
+        # -> {addr: LVAP/VAP}. An LVAP is indexed under the WTP of its
+        # downlink block and under all its downlink and uplink blocks
+        self.wtp_lvaps = {}
+        self.block_lvaps = {}
+        self.wtp_vaps = {}
+        self.block_vaps = {}
+
+        # callbacks notified as callback(key, addr) when addr is added to or
+        # removed from the state replicated to the LVAPP workers, key is
+        # one of "allowed", "denied", "lvaps" and "wtps"
+        self.state_listeners = []
+
         LOG.info("Starting EmPOWER Runtime")
 
+        # shared timer wheel tracking the PNFDevs heartbeats
+        self.timer_wheel = TimerWheel()
+
+        # shared scheduler running the modules periodic tasks
+        self.poll_scheduler = PollScheduler()
+
+        # shared queues delivering the remote module callbacks
+        self.callback_delivery = CallbackDelivery()
+
+        # bounded history of the modules results
+        self.timeseries = TimeSeriesStore()
+
+        # buffered trace files written by the apps
+        self.trace_sink = TraceSink()
+
+        # channel quality matrices reported by the WTPs
+        self.ucqm = ChannelQualityMatrix(max_age=options.cqm_max_age)
+        self.ncqm = ChannelQualityMatrix(max_age=options.cqm_max_age)
+
+        # JSON serializer of the REST responses
+        self.json_serializer = JSONSerializer()
+
         # generate default users if database is empty
         generate_default_accounts()
 
@@ -177,6 +226,9 @@ class EmpowerRuntime(object):
                        tenant.desc,
                        tenant.bssid_type)
 
+            self.tenant_names[tenant.tenant_name] = \
+                self.tenants[tenant.tenant_id]
+
     def __load_acl(self):
         """ Load ACL list. """
 
@@ -209,6 +261,8 @@ class EmpowerRuntime(object):
         acl = ACL(sta_addr, label)
         self.allowed[sta_addr] = acl
 
+        self.notify_state("allowed", sta_addr)
+
         return acl
 
     def remove_allowed(self, sta_addr):
@@ -226,6 +280,8 @@ class EmpowerRuntime(object):
 
         del self.allowed[sta_addr]
 
+        self.notify_state("allowed", sta_addr)
+
     def add_denied(self, sta_addr, label):
         """ Add entry to ACL. """
 
@@ -242,6 +298,8 @@ class EmpowerRuntime(object):
         acl = ACL(sta_addr, label)
         self.denied[sta_addr] = acl
 
+        self.notify_state("denied", sta_addr)
+
         return acl
 
     def remove_denied(self, sta_addr):
@@ -259,6 +317,15 @@ class EmpowerRuntime(object):
 
         del self.denied[sta_addr]
 
+        self.notify_state("denied", sta_addr)
+
+    def notify_state(self, key, addr):
+        """Notify the state listeners that addr has been added to or
+        removed from key."""
+
+        for listener in self.state_listeners:
+            listener(key, addr)
+
     def is_allowed(self, src):
         """ Check if station is allowed. """
 
@@ -453,6 +520,9 @@ class EmpowerRuntime(object):
                    desc,
                    request.bssid_type)
 
+        self.tenant_names[request.tenant_name] = \
+            self.tenants[request.tenant_id]
+
         return request.tenant_id
 
     @classmethod
@@ -543,6 +613,14 @@ class EmpowerRuntime(object):
 
         # remove tenant
         del self.tenants[tenant_id]
+        del self.tenant_names[tenant.tenant_name]
+
+        for pnfdevs in (tenant.wtps, tenant.cpps, tenant.vbses):
+            for pnfdev in pnfdevs.values():
+                self.remove_pnfdev_tenant(pnfdev, tenant)
+
+        for vap in list(tenant.vaps.values()):
+            self.remove_vap(vap)
 
         tenant = Session().query(TblTenant) \
                           .filter(TblTenant.tenant_id == tenant_id) \
@@ -570,8 +648,157 @@ class EmpowerRuntime(object):
     def load_tenant(self, tenant_name):
         """Load tenant from network name."""
 
-        for tenant in self.tenants.values():
-            if tenant.tenant_name == tenant_name:
-                return tenant
+        return self.tenant_names.get(tenant_name)
+
+    def load_tenants(self, addr):
+        """Return the tenants the PNFDev with the given address belongs to,
+        as a tenant_id -> Tenant dictionary."""
+
+        return self.pnfdev_tenants.get(addr, {})
+
+    def add_pnfdev_tenant(self, pnfdev, tenant):
+        """Index the membership of pnfdev to tenant."""
+
+        if pnfdev.addr not in self.pnfdev_tenants:
+            self.pnfdev_tenants[pnfdev.addr] = {}
+
+        self.pnfdev_tenants[pnfdev.addr][tenant.tenant_id] = tenant
+
+        tenant.invalidate_blocks()
+
+        self.notify_state("wtps", pnfdev.addr)
+
+    def remove_pnfdev_tenant(self, pnfdev, tenant):
+        """Remove the membership of pnfdev to tenant from the index."""
+
+        tenants = self.pnfdev_tenants.get(pnfdev.addr, {})
+        tenants.pop(tenant.tenant_id, None)
+
+        if not tenants:
+            self.pnfdev_tenants.pop(pnfdev.addr, None)
+
+        tenant.invalidate_blocks()
+
+        self.notify_state("wtps", pnfdev.addr)
+
+    def invalidate_blocks(self, wtp):
+        """Drop the block index of the tenants wtp belongs to."""
+
+        for tenant in self.pnfdev_tenants.get(wtp.addr, {}).values():
+            tenant.invalidate_blocks()
+
+    def remove_maps(self, wtp):
+        """Drop the UCQM/NCQM rows of the blocks of wtp."""
+
+        for block in wtp.supports:
+            self.ucqm.remove(block)
+            self.ncqm.remove(block)
+
+    def add_vap(self, vap):
+        """Add a VAP to its tenant."""
+
+        self.tenants[vap.tenant_id].vaps[vap.net_bssid] = vap
+        self.vaps[vap.net_bssid] = vap
+
+        if vap.wtp.addr not in self.wtp_vaps:
+            self.wtp_vaps[vap.wtp.addr] = {}
+
+        self.wtp_vaps[vap.wtp.addr][vap.net_bssid] = vap
+
+        if vap.block not in self.block_vaps:
+            self.block_vaps[vap.block] = {}
+
+        self.block_vaps[vap.block][vap.net_bssid] = vap
+
+    def remove_vap(self, vap):
+        """Remove a VAP from its tenant."""
+
+        tenant = self.tenants.get(vap.tenant_id)
+
+        if tenant:
+            tenant.vaps.pop(vap.net_bssid, None)
+
+        self.vaps.pop(vap.net_bssid, None)
+
+        self.__unindex(self.wtp_vaps, vap.wtp.addr, vap.net_bssid)
+        self.__unindex(self.block_vaps, vap.block, vap.net_bssid)
+
+    def load_wtp_vaps(self, wtp):
+        """Return the VAPs hosted by wtp as a net_bssid -> VAP
+        dictionary."""
+
+        return self.wtp_vaps.get(wtp.addr, {})
+
+    def load_block_vaps(self, block):
+        """Return the VAPs hosted by block as a net_bssid -> VAP
+        dictionary."""
+
+        return self.block_vaps.get(block, {})
+
+    def load_wtp_lvaps(self, wtp):
+        """Return the LVAPs whose downlink block is on wtp as an
+        addr -> LVAP dictionary."""
+
+        return self.wtp_lvaps.get(wtp.addr, {})
+
+    def load_block_lvaps(self, block):
+        """Return the LVAPs scheduled (downlink or uplink) on block as an
+        addr -> LVAP dictionary."""
+
+        return self.block_lvaps.get(block, {})
+
+    def add_lvap_block(self, lvap, block, downlink):
+        """Index lvap as scheduled on block. Called by the LVAP downlink
+        and uplink ports every time a block is assigned."""
+
+        if block not in self.block_lvaps:
+            self.block_lvaps[block] = {}
+
+        self.block_lvaps[block][lvap.addr] = lvap
+
+        if not downlink:
+            return
+
+        if block.radio.addr not in self.wtp_lvaps:
+            self.wtp_lvaps[block.radio.addr] = {}
+
+        self.wtp_lvaps[block.radio.addr][lvap.addr] = lvap
+
+    def remove_lvap_block(self, lvap, block, downlink):
+        """Remove lvap from the block (and wtp if downlink) indexes."""
+
+        self.__unindex(self.block_lvaps, block, lvap.addr)
+
+        if downlink:
+            self.__unindex(self.wtp_lvaps, block.radio.addr, lvap.addr)
+
+    def add_lvap(self, lvap):
+        """Add lvap to the runtime, no message is sent to the WTPs."""
+
+        self.lvaps[lvap.addr] = lvap
+
+        self.notify_state("lvaps", lvap.addr)
+
+    def remove_lvap(self, lvap):
+        """Remove lvap from the runtime and from the indexes, no message
+        is sent to the WTPs."""
+
+        self.lvaps.pop(lvap.addr, None)
+
+        self.notify_state("lvaps", lvap.addr)
+
+        for block in lvap.downlink.keys():
+            self.remove_lvap_block(lvap, block, True)
+
+        for block in lvap.uplink.keys():
+            self.remove_lvap_block(lvap, block, False)
+
+    @classmethod
+    def __unindex(cls, index, key, addr):
+        """Remove addr from index[key], drop the key if empty."""
+
+        entries = index.get(key, {})
+        entries.pop(addr, None)
 
-        return None
+        if not entries:
+            index.pop(key, None)
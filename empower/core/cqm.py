@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Channel quality matrices.
+
+The UCQM (RSSI of the stations) and NCQM (RSSI of the WTPs) reported by
+the WTPs are stored in dense (block, station) matrices, one per metric.
+Every block is a row, every station is a column, every row is a typed
+array updated in place when a new report for its block is received. A
+station is reported by a block if its flag in the row valid mask is set,
+the columns set are also kept in a list per row, so that a row is read
+in time proportional to the stations it reports.
+
+Rows and columns are allocated the first time a block or a station is
+seen. The row of a block is released when the WTP of the block
+disconnects or reports its capabilities again and when the block has not
+sent a report for a while (max_age seconds or AGE_PERIODS poll periods of
+the slowest module polling the block, whichever is longer). A column is
+released when no row reports its station. Released rows and columns are
+reused.
+
+block.ucqm and block.ncqm are read-only views of a row supporting the
+same accesses as the dicts used before, that is block.ucqm[addr] returns
+a dict with the metrics of addr (-inf if addr is not reported).
+"""
+
+import time
+
+from array import array
+
+# Metrics, in the order they appear in a poller response entry
+METRICS = ['last_rssi_std', 'last_rssi_avg', 'last_packets',
+           'hist_packets', 'mov_rssi']
+
+# Array type codes of the metrics
+TYPECODES = {'last_rssi_std': 'h',
+             'last_rssi_avg': 'h',
+             'last_packets': 'L',
+             'hist_packets': 'L',
+             'mov_rssi': 'h'}
+
+# Initial number of columns
+DEFAULT_CAPACITY = 64
+
+# Rows not updated for this long are expired (s, 0: never)
+DEFAULT_MAX_AGE = 120
+
+# Rows not updated for this many poll periods are expired
+AGE_PERIODS = 3
+
+# How often the rows are checked for expiration (s)
+EXPIRE_INTERVAL = 10
+
+
+def missing(addr):
+    """Return the metrics of a station not reported by a block."""
+
+    return {'addr': addr,
+            'last_rssi_std': -float("inf"),
+            'last_rssi_avg': -float("inf"),
+            'last_packets': 0,
+            'hist_packets': 0,
+            'mov_rssi': -float("inf")}
+
+
+class CQMView(object):
+    """A read-only view of the row of a block in a ChannelQualityMatrix."""
+
+    __slots__ = ('matrix', 'block')
+
+    def __init__(self, matrix, block):
+
+        self.matrix = matrix
+        self.block = block
+
+    def __getitem__(self, addr):
+
+        value = self.matrix.get(self.block, addr)
+
+        if value is None:
+            return missing(addr)
+
+        return value
+
+    def __contains__(self, addr):
+        return self.matrix.get(self.block, addr, 'mov_rssi') is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, addr, default=None):
+        """Return the metrics of addr, default if addr is not reported."""
+
+        value = self.matrix.get(self.block, addr)
+
+        if value is None:
+            return default
+
+        return value
+
+    def keys(self):
+        """Return the stations reported by the block."""
+
+        return [x[0] for x in self.matrix.row(self.block)]
+
+    def values(self):
+        """Return the metrics of the stations reported by the block."""
+
+        return [x[1] for x in self.matrix.row(self.block)]
+
+    def items(self):
+        """Return the (station, metrics) reported by the block."""
+
+        return self.matrix.row(self.block)
+
+
+class ChannelQualityMatrix(object):
+    """Dense (block, station) channel quality matrix.
+
+    Attributes:
+        blocks: the blocks, by row (None if the row is free)
+        stations: the stations, by column (None if the column is free)
+        capacity: the number of columns allocated per row
+        max_age: rows not updated for max_age seconds (or AGE_PERIODS poll
+            periods if longer) are expired, 0 to never expire rows
+        valid: the rows valid masks (1 if the station is reported)
+        reported: the columns set in the valid mask, by row
+        values: the rows of every metric, by metric
+        expired: the number of rows expired so far
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, max_age=DEFAULT_MAX_AGE):
+
+        self.blocks = []
+        self.stations = []
+        self.capacity = capacity
+        self.max_age = max_age
+        self.valid = []
+        self.reported = []
+        self.values = {x: [] for x in METRICS}
+        self.expired = 0
+        self.__rows = {}
+        self.__cols = {}
+        self.__updated = []
+        self.__max_ages = []
+        self.__refs = []
+        self.__free_rows = []
+        self.__free_cols = []
+        self.__last_expire = 0.0
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        nbytes = sum(len(x) for x in self.valid) + \
+            sum(x.itemsize * len(x)
+                for rows in self.values.values() for x in rows)
+
+        return {'blocks': len(self.__rows),
+                'stations': len(self.__cols),
+                'capacity': self.capacity,
+                'free_rows': len(self.__free_rows),
+                'free_columns': len(self.__free_cols),
+                'max_age': self.max_age,
+                'expired': self.expired,
+                'bytes': nbytes}
+
+    def view(self, block):
+        """Return a view of the row of block."""
+
+        return CQMView(self, block)
+
+    def __row(self, block):
+        """Return the row of block, allocating it if needed."""
+
+        if block in self.__rows:
+            return self.__rows[block]
+
+        if self.__free_rows:
+            row = self.__free_rows.pop()
+            self.blocks[row] = block
+            self.__rows[block] = row
+            return row
+
+        row = len(self.blocks)
+
+        self.__rows[block] = row
+        self.blocks.append(block)
+        self.valid.append(bytearray(self.capacity))
+        self.reported.append([])
+        self.__updated.append(0.0)
+        self.__max_ages.append(0.0)
+
+        for metric in METRICS:
+            self.values[metric].append(array(TYPECODES[metric],
+                                             [0]) * self.capacity)
+
+        return row
+
+    def __col(self, addr):
+        """Return the column of addr, allocating it if needed."""
+
+        if addr in self.__cols:
+            return self.__cols[addr]
+
+        if self.__free_cols:
+            col = self.__free_cols.pop()
+            self.stations[col] = addr
+            self.__cols[addr] = col
+            return col
+
+        col = len(self.stations)
+
+        if col == self.capacity:
+            self.__grow()
+
+        self.__cols[addr] = col
+        self.stations.append(addr)
+        self.__refs.append(0)
+
+        return col
+
+    def __grow(self):
+        """Double the number of columns of every row (in place)."""
+
+        extra = self.capacity
+
+        for valid in self.valid:
+            valid.extend(bytes(extra))
+
+        for metric in METRICS:
+            for values in self.values[metric]:
+                values.extend(array(TYPECODES[metric], [0]) * extra)
+
+        self.capacity += extra
+
+    def __clear(self, row):
+        """Clear the valid mask of row, release the columns no longer
+        reported by any row."""
+
+        valid = self.valid[row]
+
+        for col in self.reported[row]:
+
+            valid[col] = 0
+            self.__refs[col] -= 1
+
+            if not self.__refs[col]:
+                del self.__cols[self.stations[col]]
+                self.stations[col] = None
+                self.__free_cols.append(col)
+
+        self.reported[row] = []
+
+    def update(self, block, entries, now=None, period=0):
+        """Replace the row of block with entries.
+
+        Args:
+            block: the block reporting the entries
+            entries: the reported stations as (addr, last_rssi_std,
+              last_rssi_avg, last_packets, hist_packets, mov_rssi)
+            now: the time of the report (default: current time)
+            period: the poll period of the slowest module polling the
+              block in seconds
+        """
+
+        if now is None:
+            now = time.time()
+
+        if now - self.__last_expire >= EXPIRE_INTERVAL:
+            self.expire(now)
+
+        row = self.__row(block)
+        valid = self.valid[row]
+        rows = [self.values[x][row] for x in METRICS]
+
+        # taking the new references first keeps the columns still
+        # reported from being released
+        reported = []
+        seen = set()
+
+        for entry in entries:
+
+            col = self.__col(entry[0])
+
+            if col not in seen:
+                seen.add(col)
+                reported.append(col)
+                self.__refs[col] += 1
+
+            for index, values in enumerate(rows, 1):
+                values[col] = entry[index]
+
+        self.__clear(row)
+
+        for col in reported:
+            valid[col] = 1
+
+        self.reported[row] = reported
+        self.__updated[row] = now
+        self.__max_ages[row] = max(self.max_age, AGE_PERIODS * period)
+
+    def remove(self, block):
+        """Drop the row of block."""
+
+        row = self.__rows.pop(block, None)
+
+        if row is None:
+            return
+
+        self.__clear(row)
+        self.blocks[row] = None
+        self.__free_rows.append(row)
+
+    def expire(self, now=None):
+        """Drop the rows not updated for their max age."""
+
+        if now is None:
+            now = time.time()
+
+        self.__last_expire = now
+
+        if not self.max_age:
+            return
+
+        for block, row in list(self.__rows.items()):
+            if now - self.__updated[row] > self.__max_ages[row]:
+                self.remove(block)
+                self.expired += 1
+
+    def get(self, block, addr, metric=None):
+        """Return the metrics of addr reported by block (only metric if
+        not None), None if addr is not reported."""
+
+        row = self.__rows.get(block)
+        col = self.__cols.get(addr)
+
+        if row is None or col is None or not self.valid[row][col]:
+            return None
+
+        if metric:
+            return self.values[metric][row][col]
+
+        value = {x: self.values[x][row][col] for x in METRICS}
+        value['addr'] = addr
+
+        return value
+
+    def row(self, block):
+        """Return the (station, metrics) reported by block."""
+
+        row = self.__rows.get(block)
+
+        if row is None:
+            return []
+
+        out = []
+
+        for col in self.reported[row]:
+
+            addr = self.stations[col]
+
+            value = {x: self.values[x][row][col] for x in METRICS}
+            value['addr'] = addr
+
+            out.append((addr, value))
+
+        return out
+
+    def blocks_above(self, addr, threshold, blocks=None, metric='mov_rssi'):
+        """Return the blocks (among blocks if not None) reporting addr
+        with metric greater than or equal to threshold."""
+
+        col = self.__cols.get(addr)
+
+        if col is None:
+            return []
+
+        if blocks is None:
+            blocks = list(self.__rows)
+
+        out = []
+
+        for block in blocks:
+
+            row = self.__rows.get(block)
+
+            if row is None or not self.valid[row][col]:
+                continue
+
+            if self.values[metric][row][col] >= threshold:
+                out.append(block)
+
+        return out
+
+    def best_block(self, addr, blocks=None, threshold=None,
+                   metric='mov_rssi'):
+        """Return the block (among blocks if not None) reporting addr with
+        the highest metric (at least threshold if not None), None if no
+        block qualifies. Ties are resolved in favour of the first block."""
+
+        col = self.__cols.get(addr)
+
+        if col is None:
+            return None
+
+        if blocks is None:
+            blocks = list(self.__rows)
+
+        best = None
+        best_value = None
+
+        for block in blocks:
+
+            row = self.__rows.get(block)
+
+            if row is None or not self.valid[row][col]:
+                continue
+
+            value = self.values[metric][row][col]
+
+            if threshold is not None and value < threshold:
+                continue
+
+            if best is None or value > best_value:
+                best = block
+                best_value = value
+
+        return best
+
+    def best_blocks(self, threshold=None, blocks=None, metric='mov_rssi',
+                    addrs=None):
+        """Return the best block (among blocks if not None) of every
+        station (among addrs if not None), as a {station: (block, value)}
+        dict. Stations with no block reporting them with metric at least
+        threshold (if not None) are not included."""
+
+        if blocks is None:
+            blocks = list(self.__rows)
+
+        cols = None
+
+        if addrs is not None:
+            cols = [self.__cols[x] for x in set(addrs) if x in self.__cols]
+
+        # column -> (block, value)
+        best = {}
+
+        for block in blocks:
+
+            row = self.__rows.get(block)
+
+            if row is None:
+                continue
+
+            values = self.values[metric][row]
+
+            if cols is None:
+                reported = self.reported[row]
+            else:
+                valid = self.valid[row]
+                reported = [x for x in cols if valid[x]]
+
+            for col in reported:
+
+                value = values[col]
+
+                if threshold is not None and value < threshold:
+                    continue
+
+                if col not in best or value > best[col][1]:
+                    best[col] = (block, value)
+
+        return {self.stations[col]: x for col, x in best.items()}
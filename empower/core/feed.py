@@ -17,15 +17,31 @@
 
 """EmPOWER Feed Class."""
 
+import time
+
 from datetime import datetime, timedelta
-from tornado.httpclient import HTTPClient
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpclient import HTTPRequest
 
 from empower.persistence import Session
 from empower.persistence.persistence import TblFeed
 
+import empower.logger
+LOG = empower.logger.get_logger()
+
 FEED_STATUS_ON = "on"
 FEED_STATUS_OFF = "off"
 
+SWITCH_URL = 'http://%s/arduino/datastreams/switch/%u'
+
+# Switch request timeouts in seconds
+SWITCH_CONNECT_TIMEOUT = 2
+SWITCH_REQUEST_TIMEOUT = 5
+
+# A switch command not confirmed by the datastreams within this interval
+# (in seconds) can be sent again
+SWITCH_CONFIRM_TIMEOUT = 30
+
 
 class Feed(object):
     """Power consumption feed originating from an Energino."""
@@ -40,6 +56,13 @@ class Feed(object):
         self.mngt = None
         self.datastreams = {}
 
+        # switch commands: the value being sent, the next value to be sent
+        # and the last value sent but not yet confirmed by the datastreams
+        self.__sending = None
+        self.__next = None
+        self.__target = None
+        self.__target_ts = 0
+
     @property
     def pnfdev(self):
         """Return the PNFDev."""
@@ -75,20 +98,62 @@ class Feed(object):
 
     @is_on.setter
     def is_on(self, value):
-        """Set the switch."""
+        """Set the switch.
+
+        The command is sent asynchronously, is_on changes only when the
+        new switch state is reported by the datastreams. Commands issued
+        while a request is in progress are coalesced, the last one wins.
+        """
 
         if not self.mngt:
             return
 
-        if self.is_on == value:
+        value = bool(value)
+
+        # already requested, waiting for the datastreams to confirm
+        if self.__target == value and \
+                time.time() - self.__target_ts < SWITCH_CONFIRM_TIMEOUT:
+            return
+
+        if self.__target is None and self.is_on == value:
             return
 
-        if value:
-            url = 'http://%s/arduino/datastreams/switch/%u' % (self.mngt[0], 0)
-        else:
-            url = 'http://%s/arduino/datastreams/switch/%u' % (self.mngt[0], 1)
+        self.__target = value
+        self.__target_ts = time.time()
 
-        HTTPClient().fetch(url)
+        if self.__sending is not None:
+            self.__next = value
+            return
+
+        self.__send(value)
+
+    def __send(self, value):
+        """Send the switch command to the Energino."""
+
+        self.__sending = value
+
+        # the switch is on when set to 0
+        url = SWITCH_URL % (self.mngt[0], 0 if value else 1)
+
+        request = HTTPRequest(url, connect_timeout=SWITCH_CONNECT_TIMEOUT,
+                              request_timeout=SWITCH_REQUEST_TIMEOUT)
+
+        AsyncHTTPClient().fetch(request, callback=self.__on_switch)
+
+    def __on_switch(self, response):
+        """Handle the switch command response, send the next command."""
+
+        if response.error:
+            LOG.error("Unable to switch feed %u: %s", self.feed_id,
+                      response.error)
+            if self.__target == self.__sending:
+                self.__target = None
+
+        sent, self.__sending = self.__sending, None
+        value, self.__next = self.__next, None
+
+        if value is not None and value != sent:
+            self.__send(value)
 
     def to_dict(self):
         """Return a JSON-serializable dictionary representing the Feed."""
@@ -152,6 +217,10 @@ class Feed(object):
                      'id': incoming['id'],
                      'current_value': incoming['current_value']}
 
+        # the switch command has been applied
+        if self.__target is not None and self.is_on == self.__target:
+            self.__target = None
+
     def __str__(self):
         return str(self.feed_id)
 
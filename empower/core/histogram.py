@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Packet size histograms.
+
+The WTPs report the frames sent/received by an LVAP as a list of
+[size, count] samples. Samples are assigned to the first bin whose upper
+bound is greater than or equal to their size, samples larger than the last
+bin are ignored. The bin of every possible size is computed once per set
+of bins (a lookup table built with bisect), so that binning a response is
+a single pass over the samples with no sorting.
+"""
+
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+# Frame sizes are reported as 16 bits integers
+MAX_SIZE = 65535
+
+CUMULATIVE = "cumulative"
+DELTA = "delta"
+
+MODES = [CUMULATIVE, DELTA]
+
+
+@lru_cache(maxsize=64)
+def lookup_table(bins):
+    """Return the bin index of every size in [0, min(bins[-1], MAX_SIZE)].
+
+    Args:
+        bins: the bins upper bounds, as a sorted tuple
+    """
+
+    last = min(bins[-1], MAX_SIZE)
+
+    return array('H', [bisect_left(bins, x) for x in range(last + 1)])
+
+
+def fill_samples(bins, samples):
+    """Bin samples.
+
+    Args:
+        bins: the bins upper bounds (sorted)
+        samples: a list of [size, count] samples
+
+    Returns:
+        the bytes and packets per bin as two lists
+    """
+
+    out_bytes = [0] * len(bins)
+    out_packets = [0] * len(bins)
+
+    if not bins:
+        return out_bytes, out_packets
+
+    bins = tuple(bins)
+    table = lookup_table(bins)
+    limit = len(table)
+
+    for sample in samples:
+
+        if not sample:
+            continue
+
+        size, count = sample[0], sample[1]
+
+        if size < limit:
+            index = table[size]
+        elif size <= bins[-1]:
+            index = bisect_left(bins, size)
+        else:
+            continue
+
+        out_bytes[index] += size * count
+        out_packets[index] += count
+
+    return out_bytes, out_packets
+
+
+class Histogram(object):
+    """Bytes and packets per bin of a stream of cumulative samples.
+
+    In cumulative mode bytes and packets are the values reported by the
+    WTP, in delta mode they are the difference with the previous report (a
+    counter going backwards, e.g. after a WTP restart, is taken as is).
+
+    Attributes:
+        bins: the bins upper bounds
+        mode: cumulative or delta
+        bytes: the bytes per bin
+        packets: the packets per bin
+    """
+
+    def __init__(self, bins, mode=CUMULATIVE):
+
+        if mode not in MODES:
+            raise ValueError("Invalid mode %s" % mode)
+
+        self.bins = bins
+        self.mode = mode
+        self.bytes = []
+        self.packets = []
+        self.__last = None
+
+    def update(self, samples):
+        """Bin samples and update bytes and packets."""
+
+        curr_bytes, curr_packets = fill_samples(self.bins, samples)
+
+        if self.mode == CUMULATIVE:
+            self.bytes, self.packets = curr_bytes, curr_packets
+            return
+
+        if self.__last:
+            last_bytes, last_packets = self.__last
+            self.bytes = delta(curr_bytes, last_bytes)
+            self.packets = delta(curr_packets, last_packets)
+        else:
+            self.bytes = [0] * len(curr_bytes)
+            self.packets = [0] * len(curr_packets)
+
+        self.__last = (curr_bytes, curr_packets)
+
+
+def delta(curr, last):
+    """Return curr - last per bin, curr where the counter was reset."""
+
+    return [c - l if c >= l else c for c, l in zip(curr, last)]
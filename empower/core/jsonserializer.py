@@ -15,11 +15,26 @@
 # specific language governing permissions and limitations
 # under the License.
 
-"""EmPOWER Runtime JSON Serializer."""
+"""EmPOWER Runtime JSON Serializer.
+
+EmpowerEncoder extends the standard JSON encoder with the EmPOWER
+datatypes. JSONSerializer produces the same documents in compact form
+(no indentation, keys in insertion order) with a dispatch table by type,
+which is resolved once per type along the MRO with the same precedence of
+json.dumps plus EmpowerEncoder. Objects with a to_dict() method appearing
+more than once in a document (e.g. the WTP of many LVAPs) are encoded only
+once, and the to_dict() output of objects exposing a version attribute is
+cached until the version changes.
+"""
 
 import json
+import math
 import uuid
 import types
+import weakref
+
+from collections import OrderedDict
+from json.encoder import encode_basestring_ascii
 
 import empower.datatypes.etheraddress
 import empower.datatypes.ssid
@@ -57,3 +72,311 @@ class EmpowerEncoder(IterEncoder):
             return obj.to_dict()
 
         return super().default(obj)
+
+
+# Size of the chunks produced by JSONSerializer.iterencode
+CHUNK_SIZE = 65536
+
+# Max number of to_dict() outputs cached
+DEFAULT_MAX_CACHE = 100000
+
+
+def encode_float(value):
+    """Encode a float like json.dumps."""
+
+    if math.isnan(value):
+        return 'NaN'
+
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+
+    return float.__repr__(value)
+
+
+def encode_key(key):
+    """Encode a dict key like json.dumps."""
+
+    if isinstance(key, str):
+        return encode_basestring_ascii(key)
+
+    if key is True:
+        return '"true"'
+
+    if key is False:
+        return '"false"'
+
+    if key is None:
+        return '"null"'
+
+    if isinstance(key, int):
+        return '"%s"' % int.__repr__(key)
+
+    if isinstance(key, float):
+        return '"%s"' % encode_float(key)
+
+    raise TypeError("keys must be str, int, float, bool or None, not %s" %
+                    type(key).__name__)
+
+
+class JSONSerializer(object):
+    """Compact JSON serializer.
+
+    Attributes:
+        max_cache: the max number of to_dict() outputs cached
+        hits: the number of cached to_dict() outputs used
+        misses: the number of to_dict() outputs cached
+    """
+
+    def __init__(self, max_cache=DEFAULT_MAX_CACHE):
+
+        self.max_cache = max_cache
+        self.hits = 0
+        self.misses = 0
+
+        self.__cache = OrderedDict()
+        self.__resolved = {}
+
+        self.__dispatch = {
+            str: self.__encode_str,
+            int: self.__encode_int,
+            bool: self.__encode_bool,
+            float: self.__encode_float,
+            type(None): self.__encode_none,
+            dict: self.__encode_dict,
+            list: self.__encode_list,
+            tuple: self.__encode_list,
+            types.FunctionType: self.__encode_name,
+            types.MethodType: self.__encode_name,
+            uuid.UUID: self.__encode_as_str,
+            empower.datatypes.ssid.SSID: self.__encode_as_str,
+            empower.datatypes.etheraddress.EtherAddress:
+                self.__encode_as_str,
+        }
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {'max_cache': self.max_cache,
+                'cached': len(self.__cache),
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def dumps(self, value):
+        """Return value as a compact JSON document."""
+
+        return ''.join(self.iterencode(value))
+
+    def iterencode(self, value, chunk_size=CHUNK_SIZE):
+        """Return value as a compact JSON document, in chunks of about
+        chunk_size characters (a list or a dict is split between its
+        items)."""
+
+        memo = {}
+        out = []
+        size = 0
+
+        for piece in self.__pieces(value, memo):
+
+            out.append(piece)
+            size += len(piece)
+
+            if size >= chunk_size:
+                yield ''.join(out)
+                out = []
+                size = 0
+
+        if out:
+            yield ''.join(out)
+
+    def __pieces(self, value, memo):
+        """Yield the encoded items of a top-level list or dict one at a
+        time."""
+
+        handler = self.__handler(type(value))
+
+        if handler == self.__encode_object:
+            value = self.__to_dict(value)
+            handler = self.__handler(type(value))
+
+        if handler == self.__encode_iterable:
+            value = list(value)
+            handler = self.__encode_list
+
+        if handler == self.__encode_list:
+
+            yield '['
+
+            for index, item in enumerate(value):
+                out = [','] if index else []
+                self.__encode(item, out, memo)
+                yield ''.join(out)
+
+            yield ']'
+
+        elif handler == self.__encode_dict:
+
+            yield '{'
+
+            for index, (key, item) in enumerate(value.items()):
+                out = [',' if index else '', encode_key(key), ':']
+                self.__encode(item, out, memo)
+                yield ''.join(out)
+
+            yield '}'
+
+        else:
+
+            out = []
+            self.__encode(value, out, memo)
+            yield ''.join(out)
+
+    def __handler(self, cls):
+        """Return the handler of cls, resolved once per type."""
+
+        handler = self.__resolved.get(cls)
+
+        if handler:
+            return handler
+
+        for base in cls.__mro__:
+            if base in self.__dispatch:
+                handler = self.__dispatch[base]
+                break
+        else:
+            if hasattr(cls, 'to_dict'):
+                handler = self.__encode_object
+            elif hasattr(cls, '__iter__'):
+                handler = self.__encode_iterable
+            else:
+                handler = self.__encode_unknown
+
+        self.__resolved[cls] = handler
+
+        return handler
+
+    def __encode(self, value, out, memo):
+        """Append the encoding of value to out."""
+
+        self.__handler(type(value))(value, out, memo)
+
+    @classmethod
+    def __encode_str(cls, value, out, memo):
+        out.append(encode_basestring_ascii(value))
+
+    @classmethod
+    def __encode_int(cls, value, out, memo):
+        out.append(int.__repr__(value))
+
+    @classmethod
+    def __encode_bool(cls, value, out, memo):
+        out.append('true' if value else 'false')
+
+    @classmethod
+    def __encode_float(cls, value, out, memo):
+        out.append(encode_float(value))
+
+    @classmethod
+    def __encode_none(cls, value, out, memo):
+        out.append('null')
+
+    @classmethod
+    def __encode_name(cls, value, out, memo):
+        out.append(encode_basestring_ascii(value.__name__))
+
+    @classmethod
+    def __encode_as_str(cls, value, out, memo):
+        out.append(encode_basestring_ascii(str(value)))
+
+    @classmethod
+    def __encode_unknown(cls, value, out, memo):
+        raise TypeError("%r is not JSON serializable" % value)
+
+    def __encode_dict(self, value, out, memo):
+
+        if not value:
+            out.append('{}')
+            return
+
+        sep = '{'
+
+        for key, item in value.items():
+            out.append(sep)
+            out.append(encode_key(key))
+            out.append(':')
+            self.__encode(item, out, memo)
+            sep = ','
+
+        out.append('}')
+
+    def __encode_list(self, value, out, memo):
+
+        if not value:
+            out.append('[]')
+            return
+
+        sep = '['
+
+        for item in value:
+            out.append(sep)
+            self.__encode(item, out, memo)
+            sep = ','
+
+        out.append(']')
+
+    def __encode_iterable(self, value, out, memo):
+        self.__encode_list(list(value), out, memo)
+
+    def __encode_object(self, value, out, memo):
+        """Encode to_dict(), once per object in every document (the object
+        is kept in memo so that its id is not reused)."""
+
+        key = id(value)
+
+        if key in memo:
+            out.append(memo[key][1])
+            return
+
+        fragment = []
+        self.__encode(self.__to_dict(value), fragment, memo)
+        fragment = ''.join(fragment)
+
+        memo[key] = (value, fragment)
+        out.append(fragment)
+
+    def __to_dict(self, value):
+        """Return value.to_dict(), cached by version if value has one."""
+
+        version = getattr(value, 'version', None)
+
+        if version is None:
+            return value.to_dict()
+
+        key = id(value)
+        entry = self.__cache.get(key)
+
+        if entry and entry[0]() is value and entry[1] == version:
+            self.__cache.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+        out = value.to_dict()
+
+        def drop(ref):
+            """Remove the entry when value is garbage collected."""
+
+            if key in self.__cache and self.__cache[key][0] is ref:
+                del self.__cache[key]
+
+        try:
+            ref = weakref.ref(value, drop)
+        except TypeError:
+            return out
+
+        if entry is None and len(self.__cache) >= self.max_cache:
+            self.__cache.popitem(last=False)
+
+        self.__cache[key] = (ref, version, out)
+        self.__cache.move_to_end(key)
+        self.misses += 1
+
+        return out
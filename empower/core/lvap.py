@@ -131,6 +131,7 @@ class LVAP(object):
         uplink: the resource block assigned to this LVAP on the uplink
           direction.
         scheduled_on: union of the downlink and uplink resource blocks
+        version: incremented at every change of the LVAP
     """
 
     def __init__(self, addr, net_bssid_addr, lvap_bssid_addr):
@@ -178,8 +179,22 @@ class LVAP(object):
         # virtual ports (VNFs)
         self.__ports = {}
 
-        # downlink intent uuid
+        # downlink intent uuid (future returned by the intent server) and
+        # the last intent requested while its creation is pending
         self.dl_intent = None
+        self.__dl_intent_next = None
+
+    def __setattr__(self, name, value):
+
+        super().__setattr__(name, value)
+        self.touch()
+
+    def touch(self):
+        """Bump the version of the LVAP, called at every assignment and
+        every time a block is assigned or removed, so that cached
+        representations are refreshed."""
+
+        self.__dict__['version'] = self.__dict__.get('version', 0) + 1
 
     def set_ports(self):
         """Set virtual ports.
@@ -189,30 +204,71 @@ class LVAP(object):
         property is made.
         """
 
-        # Delete all outgoing virtual link and then remove the entire port
+        # Keep the outgoing rules and remove the entire port
+        rules = None
+
         if self.__ports:
-            self.__ports[0].clear()
+            rules = self.__ports[0].next
             del self.__ports[0]
 
+        # Not scheduled anymore, delete all outgoing virtual links
         if not self.wtp:
+            if rules:
+                for key in list(rules):
+                    del rules[key]
             return
 
         self.__ports[0] = VirtualPortLvap(phy_port=self.wtp.port(),
                                           virtual_port_id=0,
                                           obj=self)
 
+        # Move the rules to the new port, only the virtual links whose
+        # radio blocks changed are updated
+        if rules is not None:
+            self.__ports[0].next = rules
+            rules.reconcile()
+
         # set/update intent
         intent = {'version': '1.0',
                   'ttp_dpid': self.__ports[0].dpid,
                   'ttp_port': self.__ports[0].ovs_port_id,
                   'match': {'dl_dst': self.addr}}
 
+        if not self.dl_intent:
+            self.__send_dl_intent(intent)
+            return
+
+        # sent again if the pending creation fails
+        if not self.dl_intent.done():
+            self.__dl_intent_next = intent
+
         intent_server = RUNTIME.components[IntentServer.__module__]
+        intent_server.update_intent(self.dl_intent, intent)
 
-        if self.dl_intent:
-            intent_server.update_intent(self.dl_intent, intent)
-        else:
-            self.dl_intent = intent_server.send_intent(intent)
+    def __send_dl_intent(self, intent):
+        """Create the downlink intent."""
+
+        intent_server = RUNTIME.components[IntentServer.__module__]
+
+        self.__dl_intent_next = None
+        self.dl_intent = intent_server.send_intent(intent)
+        self.dl_intent.add_done_callback(self.__on_dl_intent)
+
+    def __on_dl_intent(self, future):
+        """Reset the downlink intent if it has not been created, so that
+        the next update creates it. If it has been updated while pending,
+        create it again right away."""
+
+        if future is not self.dl_intent or future.result():
+            return
+
+        intent = self.__dl_intent_next
+
+        self.dl_intent = None
+        self.__dl_intent_next = None
+
+        if intent and self.wtp:
+            self.__send_dl_intent(intent)
 
     @property
     def ports(self):
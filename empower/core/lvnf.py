@@ -20,6 +20,8 @@
 import types
 import time
 
+from empower.core.virtualport import VirtualPortPropLvap
+
 from empower.main import RUNTIME
 
 import empower.logger
@@ -192,15 +194,13 @@ class LVNF(object):
         # look for LVAPs that points to this LVNF
         self.__chains = []
 
-        for lvap in RUNTIME.lvaps.values():
-            for out_port in lvap.ports:
-                for rule in list(lvap.ports[out_port].next):
-                    v_port = lvap.ports[out_port].next[rule]
-                    in_port = v_port.virtual_port_id
-                    if v_port in self.ports.values():
-                        save = (lvap, rule, out_port, in_port)
-                        self.__chains.append(save)
-                        del lvap.ports[0].next[rule]
+        for v_port in self.ports.values():
+            for (_, rule), rules in list(v_port.prev.items()):
+                if not isinstance(rules, VirtualPortPropLvap):
+                    continue
+                save = (rules, rule, v_port.virtual_port_id)
+                self.__chains.append(save)
+                del rules[rule]
 
     def _migrating_stop_migrating_start(self):
 
@@ -223,13 +223,12 @@ class LVNF(object):
 
         LOG.info("Restoring chains")
         for chain in self.__chains:
-            vnf = chain[0]
+            rules = chain[0]
             rule = chain[1]
-            out_port = chain[2]
-            in_port = chain[3]
-            LOG.info("LVAP %s port [%u] next [%s] -> %u", vnf.addr,
-                     out_port, rule, in_port)
-            vnf.ports[out_port].next[rule] = self.ports[in_port]
+            in_port = chain[2]
+            LOG.info("LVAP %s next [%s] -> %u", rules.obj.addr, rule,
+                     in_port)
+            rules[rule] = self.ports[in_port]
 
         self.__chains = []
 
@@ -18,20 +18,15 @@
 """EmPOWER Primitive Base Class."""
 
 import re
-import json
 import types
-import xmlrpc.client
 
 import tornado.web
 import tornado.httpserver
-from tornado.ioloop import IOLoop
 
 from uuid import UUID
-from multiprocessing.pool import ThreadPool
 
 import empower.logger
 
-from empower.core.jsonserializer import EmpowerEncoder
 from empower.restserver.apihandlers import EmpowerAPIHandlerAdminUsers
 from empower.restserver.restserver import RESTServer
 
@@ -40,34 +35,6 @@ from empower.main import RUNTIME
 LOG = empower.logger.get_logger()
 
 
-_WORKERS = ThreadPool(10)
-
-
-def exec_xmlrpc(callback, args=()):
-    """Execute XML-RPC call."""
-
-    LOG.info("Calling %s:%s", callback[0], callback[1])
-
-    proxy = xmlrpc.client.ServerProxy(callback[0])
-    func = getattr(proxy, callback[1])
-    run_background(func, on_complete, args)
-
-
-def run_background(func, callback, args=(), kwds={}):
-    """Run callback in background."""
-
-    def _callback(result):
-        IOLoop.instance().add_callback(lambda: callback(result))
-
-    _WORKERS.apply_async(func, args, kwds, _callback)
-
-
-def on_complete(res):
-    """XML RPC Callback."""
-
-    pass
-
-
 class ModuleHandler(EmpowerAPIHandlerAdminUsers):
     """ModuleHandler. Used to view and manipulate modules."""
 
@@ -185,6 +152,63 @@ class ModuleHandler(EmpowerAPIHandlerAdminUsers):
         self.set_status(204, None)
 
 
+class ModuleHistoryHandler(EmpowerAPIHandlerAdminUsers):
+    """ModuleHistoryHandler. Used to query the results of a module."""
+
+    def get(self, *args, **kwargs):
+        """Query the time-series recorded by a module.
+
+        Args:
+            [0]: tenant_id
+            [1]: module_id
+
+        Query arguments (all optional):
+            key: the series key (e.g. a station address)
+            metric: the series metric (e.g. last_rssi_avg)
+            start: start time in seconds, relative to now if negative
+                   (default -3600)
+            end: end time in seconds (default now)
+            step: bucket size in seconds (default native resolution)
+            aggregate: avg, min, max, sum, count or last (default avg)
+
+        Example URLs:
+
+            GET /api/v1/tenants/52313ecb-9d00-4b7d-b873-b55d3d9ada26/
+              <module>/1/history?metric=last_rssi_avg&start=-600&step=60
+        """
+
+        try:
+
+            if len(args) != 2:
+                raise ValueError("Invalid URL")
+
+            tenant_id = UUID(args[0])
+            module_id = int(args[1])
+
+            module = self.server.modules[module_id]
+
+            if module.tenant_id != tenant_id:
+                raise KeyError("Module %u not in tenant %s" % (module_id,
+                                                               tenant_id))
+
+            start = self.get_argument("start", None)
+            end = self.get_argument("end", None)
+
+            query = {'key': self.get_argument("key", None),
+                     'metric': self.get_argument("metric", None),
+                     'start': float(start) if start else None,
+                     'end': float(end) if end else None,
+                     'step': float(self.get_argument("step", 0)),
+                     'aggregate': self.get_argument("aggregate", "avg")}
+
+            self.write_as_json(module.history(**query))
+
+        except KeyError as ex:
+            self.send_error(404, message=ex)
+        except ValueError as ex:
+            self.send_error(400, message=ex)
+
+
 class Module(object):
     """Module object.
 
@@ -207,7 +231,6 @@ class Module(object):
         self.__tenant_id = None
         self.__every = 5000
         self.__callback = None
-        self.__periodic = None
         self.log = empower.logger.get_logger()
 
     def cleanup(self):
@@ -220,6 +243,22 @@ class Module(object):
 
         self.worker.remove_module(self.module_id)
 
+    def record(self, key, metric, value, timestamp=None):
+        """Record a sample of metric for key in the time-series store."""
+
+        RUNTIME.timeseries.record(self, key, metric, value, timestamp)
+
+    def history(self, key=None, metric=None, **kwargs):
+        """Query the time-series store (see TimeSeriesStore.query)."""
+
+        return RUNTIME.timeseries.query(self, key, metric, **kwargs)
+
+    def window(self, key, metric, seconds):
+        """Return count, avg, std, min, max and last of the samples of
+        metric for key recorded in the last seconds."""
+
+        return RUNTIME.timeseries.window(self, key, metric, seconds)
+
     def handle_callback(self, serializable):
         """Handle an module callback.
 
@@ -238,9 +277,6 @@ class Module(object):
 
         try:
 
-            as_dict = serializable.to_dict()
-            as_json = json.dumps(as_dict, cls=EmpowerEncoder)
-
             if isinstance(callback, types.FunctionType) or \
                isinstance(callback, types.MethodType):
 
@@ -248,7 +284,10 @@ class Module(object):
 
             elif isinstance(callback, list) and len(callback) == 2:
 
-                exec_xmlrpc(callback, (as_json, ))
+                # the module results are sent with their latest state,
+                # every other object (e.g. events) is sent as is
+                RUNTIME.callback_delivery.deliver(
+                    callback, serializable, coalesce=serializable is self)
 
             else:
 
@@ -258,6 +297,13 @@ class Module(object):
 
             LOG.exception(ex)
 
+    @property
+    def __poll_key(self):
+        """Return the id of this module in the poll scheduler (modules
+        may not be hashable)."""
+
+        return (self.module_type, self.module_id)
+
     @property
     def tenant_id(self):
         """Return tenant id."""
@@ -291,6 +337,12 @@ class Module(object):
                'every': self.every,
                'callback': self.callback}
 
+        if self.__poll_key in RUNTIME.poll_scheduler:
+            out['schedule'] = RUNTIME.poll_scheduler.stats(self.__poll_key)
+
+        if isinstance(self.callback, list):
+            out['delivery'] = RUNTIME.callback_delivery.stats(self.callback)
+
         return out
 
     @property
@@ -349,20 +401,26 @@ class Module(object):
         if self.every == -1:
             self.run_once()
         else:
-            self.__periodic = \
-                tornado.ioloop.PeriodicCallback(self.run_once, self.every)
-            self.__periodic.start()
+            RUNTIME.poll_scheduler.add(self.__poll_key, self.every,
+                                       self.run_once)
 
     def stop(self):
         """Stop worker."""
 
-        self.__periodic.stop()
+        RUNTIME.poll_scheduler.remove(self.__poll_key)
 
     def run_once(self):
         """Period task."""
 
         pass
 
+    def process_response(self, response, modules):
+        """Stub process response method, called once per response before
+        the modules (the subscribers of the request, self included) handle
+        it."""
+
+        pass
+
     def handle_response(self, response):
         """Stub handle response method."""
 
@@ -394,6 +452,9 @@ class ModuleTrigger(Module):
                'tenant_id': self.tenant_id,
                'callback': self.callback}
 
+        if isinstance(self.callback, list):
+            out['delivery'] = RUNTIME.callback_delivery.stats(self.callback)
+
         return out
 
     def __eq__(self, other):
@@ -439,6 +500,11 @@ class ModuleWorker(object):
         handler = (url % module_name, ModuleHandler, dict(server=self))
         self.rest_server.add_handler(handler)
 
+        url = r"/api/v1/tenants/([a-zA-Z0-9:-]*)/%s/([0-9]*)/history/?"
+        handler = (url % module_name, ModuleHistoryHandler,
+                   dict(server=self))
+        self.rest_server.add_handler(handler)
+
         self.pnfp_server.register_message(self.pt_type, self.pt_packet,
                                           self.handle_packet)
 
@@ -467,6 +533,13 @@ class ModuleWorker(object):
             handler[1][:] = \
                 [x for x in handler[1] if determine(x, regex, ModuleHandler)]
 
+        url = r"/api/v1/tenants/([a-zA-Z0-9:-]*)/%s/([0-9]*)/history/?$"
+        regex = re.compile(url % module_name)
+        for handler in self.rest_server.handlers:
+            handler[1][:] = \
+                [x for x in handler[1]
+                 if determine(x, regex, ModuleHistoryHandler)]
+
     def handle_packet(self, response):
         """Handle response message."""
 
@@ -569,6 +642,8 @@ class ModuleWorker(object):
 
         module.cleanup()
 
+        RUNTIME.timeseries.remove(module)
+
         del self.modules[module_id]
 
 
@@ -314,6 +314,7 @@ class PNFPServer():
             tenant_pnfdevs = getattr(tenant, self.PNFDEV.ALIAS)
 
             tenant_pnfdevs[pnfdev.addr] = pnfdev
+            RUNTIME.add_pnfdev_tenant(pnfdev, tenant)
 
     def to_dict(self):
         """ Return a dict representation of the object. """
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Poll scheduler."""
+
+import time
+import heapq
+import itertools
+import tornado.ioloop
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+# Scheduler resolution in ms
+DEFAULT_TICK = 10
+
+# Max number of callbacks executed in a single tick
+DEFAULT_MAX_RUNS = 50
+
+
+def radical_inverse(index):
+    """Return the base 2 radical inverse of index (0, 0.5, 0.25, 0.75,
+    0.125, ...), i.e. a point in [0, 1) far from the previous ones."""
+
+    result = 0.0
+    fraction = 0.5
+
+    while index:
+        if index & 1:
+            result += fraction
+        index >>= 1
+        fraction /= 2
+
+    return result
+
+
+class PollEntry(object):
+    """A periodic callback owned by the poll scheduler.
+
+    Attributes:
+        key: the entry id (e.g. a module)
+        period: the period in ms
+        slot: the position of the entry among the ones with the same period
+        offset: the phase offset in ms
+        callback: the function to be called
+        due: the next due time in seconds (as time.time())
+        runs: the number of times the callback has been called
+        late: the number of runs started more than one tick after due
+        max_lateness: the worst lateness in ms
+    """
+
+    def __init__(self, key, period, slot, callback):
+
+        self.key = key
+        self.period = period
+        self.slot = slot
+        self.offset = int(period * radical_inverse(slot))
+        self.callback = callback
+        self.due = 0
+        self.runs = 0
+        self.late = 0
+        self.max_lateness = 0
+        self.cancelled = False
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {'period': self.period,
+                'offset': self.offset,
+                'due': self.due,
+                'runs': self.runs,
+                'late': self.late,
+                'max_lateness': self.max_lateness}
+
+
+class PollScheduler(object):
+    """Poll scheduler.
+
+    Runs all the periodic module callbacks from a single periodic callback.
+    Entries sharing the same period are spread across the period using
+    deterministic phase offsets (0, 1/2, 1/4, 3/4, ... of the period, in
+    order of registration) instead of firing all together. At most
+    max_runs callbacks are executed per tick, the others are deferred to
+    the following ticks.
+
+    Attributes:
+        tick: the scheduler resolution in ms
+        max_runs: the max number of callbacks executed per tick
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, max_runs=DEFAULT_MAX_RUNS):
+
+        self.tick = tick
+        self.max_runs = max_runs
+        self.runs = 0
+        self.throttled = 0
+
+        self.__epoch = time.time()
+        self.__queue = []
+        self.__entries = {}
+        self.__slots = {}
+        self.__seq = itertools.count()
+
+        self.__periodic = \
+            tornado.ioloop.PeriodicCallback(self.__on_tick, self.tick)
+        self.__periodic.start()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        periods = {}
+
+        for entry in self.__entries.values():
+            periods[entry.period] = periods.get(entry.period, 0) + 1
+
+        return {'tick': self.tick,
+                'max_runs': self.max_runs,
+                'entries': len(self.__entries),
+                'periods': periods,
+                'runs': self.runs,
+                'throttled': self.throttled}
+
+    def stats(self, key):
+        """Return the due/late metrics of the entry identified by key."""
+
+        return self.__entries[key].to_dict()
+
+    def add(self, key, period, callback):
+        """Call callback every period ms.
+
+        Args:
+            key: the entry id, adding a key twice replaces the previous entry
+            period: the period in ms
+            callback: the function to be called
+        """
+
+        self.remove(key)
+
+        used = self.__slots.setdefault(period, set())
+        slot = next(x for x in itertools.count() if x not in used)
+        used.add(slot)
+
+        entry = PollEntry(key, period, slot, callback)
+        entry.due = self.__next_due(entry, time.time())
+
+        self.__entries[key] = entry
+        heapq.heappush(self.__queue, (entry.due, next(self.__seq), entry))
+
+    def remove(self, key):
+        """Remove the entry identified by key (if any)."""
+
+        if key not in self.__entries:
+            return
+
+        entry = self.__entries.pop(key)
+
+        # entries are dropped from the queue when they become due
+        entry.cancelled = True
+
+        used = self.__slots[entry.period]
+        used.discard(entry.slot)
+
+        if not used:
+            del self.__slots[entry.period]
+
+    def __next_due(self, entry, now):
+        """Return the first period boundary of entry after now."""
+
+        period = entry.period / 1000
+        base = self.__epoch + entry.offset / 1000
+
+        if now < base:
+            return base
+
+        return base + (int((now - base) / period) + 1) * period
+
+    def __on_tick(self):
+        """Run the callbacks that are due."""
+
+        now = time.time()
+        runs = 0
+
+        while self.__queue and self.__queue[0][0] <= now:
+
+            if runs == self.max_runs:
+                self.throttled += 1
+                break
+
+            due, _, entry = heapq.heappop(self.__queue)
+
+            if entry.cancelled:
+                continue
+
+            lateness = int((now - due) * 1000)
+
+            if lateness > self.tick:
+                entry.late += 1
+
+            entry.max_lateness = max(entry.max_lateness, lateness)
+            entry.runs += 1
+
+            # missed periods are skipped
+            entry.due = self.__next_due(entry, now)
+            heapq.heappush(self.__queue, (entry.due, next(self.__seq), entry))
+
+            runs += 1
+
+            try:
+                entry.callback()
+            except Exception as ex:
+                LOG.exception(ex)
+
+        self.runs += runs
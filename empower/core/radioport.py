@@ -20,6 +20,8 @@
 from empower.core.resourcepool import build_block
 from empower.core.resourcepool import ResourceBlock
 
+from empower.main import RUNTIME
+
 
 class RadioPort():
     """RadioPort class.
@@ -142,7 +144,10 @@ class RadioPort():
 
 
 class RadioPortProp(dict):
-    """PortProp class."""
+    """PortProp class.
+
+    Every change is also reflected in the runtime lvap indexes, ports with
+    SET_MASK (i.e. downlink) also index the LVAP under the block's WTP."""
 
     MAX_PORTS = 1
     SET_MASK = True
@@ -155,8 +160,13 @@ class RadioPortProp(dict):
         if not isinstance(key, ResourceBlock):
             raise KeyError("Expected ResourceBlock, got %s" % type(key))
 
+        port = dict.__getitem__(self, key)
+
         dict.__delitem__(self, key)
 
+        RUNTIME.remove_lvap_block(port.lvap, key, self.SET_MASK)
+        port.lvap.touch()
+
     def __delitem__(self, key):
 
         key = build_block(key)
@@ -173,6 +183,9 @@ class RadioPortProp(dict):
 
         dict.__delitem__(self, key)
 
+        RUNTIME.remove_lvap_block(port.lvap, key, self.SET_MASK)
+        port.lvap.touch()
+
     def setitem(self, key, value):
         """Notice this will set the item without sending out any message."""
 
@@ -201,6 +214,9 @@ class RadioPortProp(dict):
             # update dict
             dict.__setitem__(self, key, value)
 
+        RUNTIME.add_lvap_block(value.lvap, key, self.SET_MASK)
+        value.lvap.touch()
+
     def __setitem__(self, key, value):
 
         key = build_block(key)
@@ -234,6 +250,9 @@ class RadioPortProp(dict):
             # update Port configuration
             key.radio.connection.send_set_port(value.tx_policy)
 
+        RUNTIME.add_lvap_block(value.lvap, key, self.SET_MASK)
+        value.lvap.touch()
+
     def __getitem__(self, key):
 
         key = build_block(key)
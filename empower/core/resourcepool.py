@@ -256,31 +256,181 @@ class ResourcePool(set):
 
     The class Overrides the set object's "and" method for ResourceBlock
     objects by excluding the Resource Block address form the matching.from
+
+    Blocks are also indexed by (channel, band), so that intersections and
+    matching take O(min(n, m)) instead of comparing every pair of blocks.
+    The channel and the band of a block must not change while the block is
+    in a pool.
     """
 
     def __init__(self, *args, **kwds):
         super(ResourcePool, self).__init__(*args, **kwds)
+        self.__reindex()
+
+    def __reindex(self):
+        """Rebuild the (channel, band) index."""
+
+        self.__index = {}
+
+        for block in set.__iter__(self):
+            self.__index_add(block)
+
+    def __index_add(self, block):
+        """Add block to the index."""
+
+        key = (block.channel, block.band)
+
+        if key not in self.__index:
+            self.__index[key] = set()
+
+        self.__index[key].add(block)
+
+    def __index_discard(self, block):
+        """Remove block from the index."""
+
+        key = (block.channel, block.band)
+        blocks = self.__index.get(key)
+
+        if blocks is None:
+            return
+
+        blocks.discard(block)
+
+        if not blocks:
+            del self.__index[key]
+
+    def add(self, block):
+        super(ResourcePool, self).add(block)
+        self.__index_add(block)
+
+    def discard(self, block):
+        super(ResourcePool, self).discard(block)
+        self.__index_discard(block)
+
+    def remove(self, block):
+        super(ResourcePool, self).remove(block)
+        self.__index_discard(block)
+
+    def pop(self):
+        block = super(ResourcePool, self).pop()
+        self.__index_discard(block)
+        return block
+
+    def clear(self):
+        super(ResourcePool, self).clear()
+        self.__index = {}
+
+    def update(self, *others):
+        for other in others:
+            for block in other:
+                self.add(block)
+
+    def difference_update(self, *others):
+        super(ResourcePool, self).difference_update(*others)
+        self.__reindex()
+
+    def intersection_update(self, *others):
+        super(ResourcePool, self).intersection_update(*others)
+        self.__reindex()
+
+    def symmetric_difference_update(self, other):
+        super(ResourcePool, self).symmetric_difference_update(other)
+        self.__reindex()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+    def __add_key(self, key, blocks):
+        """Add blocks, all with the same (channel, band) key, in bulk."""
+
+        set.update(self, blocks)
+
+        if key in self.__index:
+            self.__index[key].update(blocks)
+        else:
+            self.__index[key] = set(blocks)
+
+    def matching(self, block):
+        """Return the blocks with the same channel and band of block."""
+
+        result = ResourcePool()
+        key = (block.channel, block.band)
+
+        if key in self.__index:
+            result.__add_key(key, self.__index[key])
+
+        return result
 
     def __and__(self, other):
         result = ResourcePool()
-        for rblock in self:
-            for rblock_other in other:
-                if rblock.channel == rblock_other.channel and \
-                   rblock.band == rblock_other.band:
 
-                    result.add(rblock)
+        if isinstance(other, ResourcePool):
+            # scan the smaller index
+            if len(other.__index) < len(self.__index):
+                keys = [x for x in other.__index if x in self.__index]
+            else:
+                keys = [x for x in self.__index if x in other.__index]
+        else:
+            keys = {(x.channel, x.band) for x in other}
+            keys = [x for x in keys if x in self.__index]
+
+        for key in keys:
+            result.__add_key(key, self.__index[key])
 
         return result
 
     def __or__(self, other):
-        result = ResourcePool()
-        for rblock in self:
-            result.add(rblock)
-        for rblock in other:
-            result.add(rblock)
+        result = ResourcePool(self)
+        result.update(other)
         return result
 
 
+class BlockIndex(object):
+    """Index of the resource blocks supported by a set of WTPs.
+
+    Attributes:
+        pool: all the blocks, as a ResourcePool
+        by_channel: the blocks, by (channel, band)
+        by_wtp: the blocks, by WTP address
+    """
+
+    def __init__(self, wtps):
+
+        self.pool = ResourcePool()
+        self.by_channel = {}
+        self.by_wtp = {}
+
+        for wtp in wtps:
+
+            self.by_wtp[wtp.addr] = list(wtp.supports)
+
+            for block in wtp.supports:
+                self.pool.add(block)
+
+        for block in self.pool:
+            key = (block.channel, block.band)
+            self.by_channel.setdefault(key, []).append(block)
+
+    def matching(self, blocks):
+        """Return the blocks with the same channel and band of any block in
+        blocks (same result of pool & blocks)."""
+
+        return self.pool & blocks
+
+
 class ResourceBlock(object):
     """ EmPOWER resource block.
 
@@ -300,17 +450,21 @@ class ResourceBlock(object):
           reported by the device, that is if the device is an 11a
           device it will report [6, 12, 18, 36, 54]. If the device is
           an 11n device it will report [0, 1, 2, 3, 4, 5, 6, 7]
+        rssi_to: RSSI of the stations in the last interference map
     """
 
+    __slots__ = ('_radio', '_hwaddr', '_channel', '_band', '_supports',
+                 '_hash', 'tx_policies', 'rssi_to')
+
     def __init__(self, radio, hwaddr, channel, band):
 
         self._radio = radio
         self._hwaddr = hwaddr
         self._channel = channel
         self._band = band
-        self.ucqm = CQM()
-        self.ncqm = CQM()
+        self._hash = None
         self.tx_policies = TxPolicyProp(self)
+        self.rssi_to = {}
 
         if self.band == BT_HT20 or self.band == BT_HT40:
             self._supports = set([0, 1, 2, 3, 4, 5, 6, 7])
@@ -329,6 +483,22 @@ class ResourceBlock(object):
 
         return self._radio.addr
 
+    @property
+    def ucqm(self):
+        """ Return the UCQM view of this block. """
+
+        from empower.main import RUNTIME
+
+        return RUNTIME.ucqm.view(self)
+
+    @property
+    def ncqm(self):
+        """ Return the NCQM view of this block. """
+
+        from empower.main import RUNTIME
+
+        return RUNTIME.ncqm.view(self)
+
     @property
     def radio(self):
         """ Return the radio. """
@@ -340,6 +510,7 @@ class ResourceBlock(object):
         """ Set the band. """
 
         self._radio = radio
+        self._hash = None
 
     @property
     def supports(self):
@@ -365,6 +536,7 @@ class ResourceBlock(object):
         """ Set the hwaddr. """
 
         self._hwaddr = hwaddr
+        self._hash = None
 
     @property
     def band(self):
@@ -380,6 +552,7 @@ class ResourceBlock(object):
             raise ValueError("Invalid band type %s" % band)
 
         self._band = band
+        self._hash = None
 
     @property
     def channel(self):
@@ -395,6 +568,7 @@ class ResourceBlock(object):
             raise ValueError("Invalid channel %u" % channel)
 
         self._channel = channel
+        self._hash = None
 
     def to_dict(self):
         """ Return a JSON-serializable dictionary representing the Resource
@@ -413,8 +587,11 @@ class ResourceBlock(object):
 
     def __hash__(self):
 
-        return hash(self.radio.addr) + hash(self.hwaddr) + \
-            hash(self.channel) + hash(self.band)
+        if self._hash is None:
+            self._hash = hash(self.radio.addr) + hash(self.hwaddr) + \
+                hash(self.channel) + hash(self.band)
+
+        return self._hash
 
     def __eq__(self, other):
 
@@ -20,6 +20,7 @@
 from empower.persistence.persistence import TblBelongs
 from empower.persistence import Session
 from empower.datatypes.etheraddress import EtherAddress
+from empower.core.resourcepool import BlockIndex
 
 T_TYPE_SHARED = "shared"
 T_TYPE_UNIQUE = "unique"
@@ -64,6 +65,7 @@ class Tenant(object):
         self.lvnfs = {}
         self.vaps = {}
         self.components = {}
+        self.__block_index = None
 
     def to_dict(self):
         """ Return a JSON-serializable dictionary representing the Poll """
@@ -79,6 +81,22 @@ class Tenant(object):
 
         return out
 
+    @property
+    def block_index(self):
+        """Return the index of the blocks supported by the WTPs in this
+        tenant, built on first use after every invalidation."""
+
+        if self.__block_index is None:
+            self.__block_index = BlockIndex(self.wtps.values())
+
+        return self.__block_index
+
+    def invalidate_blocks(self):
+        """Drop the block index (on CAPS, WTP membership changes and WTP
+        disconnections)."""
+
+        self.__block_index = None
+
     def get_prefix(self):
         """Return tenant prefix."""
 
@@ -105,6 +123,9 @@ class Tenant(object):
 
         pnfdevs[pnfdev.addr] = pnfdev
 
+        from empower.main import RUNTIME
+        RUNTIME.add_pnfdev_tenant(pnfdev, self)
+
         belongs = TblBelongs(tenant_id=self.tenant_id, addr=pnfdev.addr)
 
         session = Session()
@@ -130,6 +151,9 @@ class Tenant(object):
 
         del pnfdevs[pnfdev.addr]
 
+        from empower.main import RUNTIME
+        RUNTIME.remove_pnfdev_tenant(pnfdev, self)
+
         belongs = Session().query(TblBelongs) \
                            .filter(TblBelongs.tenant_id == self.tenant_id,
                                    TblBelongs.addr == pnfdev.addr) \
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Hierarchical timer wheel."""
+
+import time
+import tornado.ioloop
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+DEFAULT_TICK = 500
+DEFAULT_SLOTS = 64
+DEFAULT_LEVELS = 3
+
+
+class TimerWheel(object):
+    """Hierarchical timer wheel.
+
+    Tracks a large number of deadlines using a single periodic callback.
+    Level 0 has one slot per tick, every slot of level n spans a full turn
+    of level n-1. Timers far in the future sit in the upper levels and are
+    cascaded down as the wheel turns, so each tick only touches the timers
+    that are actually expiring.
+
+    Timers are identified by a key (e.g. a connection object). Scheduling a
+    key that is already scheduled replaces the previous timer.
+
+    Attributes:
+        tick: the wheel resolution in ms
+        slots: the number of slots per level
+        levels: the number of levels
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS,
+                 levels=DEFAULT_LEVELS):
+
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.expired = 0
+
+        self.__now = self.__to_ticks(time.time())
+        self.__wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.__timers = {}
+
+        self.__periodic = \
+            tornado.ioloop.PeriodicCallback(self.__on_tick, self.tick)
+        self.__periodic.start()
+
+    def __to_ticks(self, timestamp):
+        """Convert a timestamp (in seconds) into wheel ticks."""
+
+        return int(timestamp * 1000 / self.tick)
+
+    def __len__(self):
+        return len(self.__timers)
+
+    def __contains__(self, key):
+        return key in self.__timers
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {'tick': self.tick,
+                'slots': self.slots,
+                'levels': self.levels,
+                'timers': len(self.__timers),
+                'expired': self.expired}
+
+    def schedule(self, key, deadline, callback):
+        """Schedule callback to be called at deadline.
+
+        Args:
+            key: the timer id
+            deadline: the expiration timestamp in seconds (as time.time())
+            callback: the function to be called upon expiration
+        """
+
+        self.cancel(key)
+        self.__insert(key, self.__to_ticks(deadline), callback)
+
+    def cancel(self, key):
+        """Cancel the timer identified by key (if any)."""
+
+        if key not in self.__timers:
+            return
+
+        _, _, level, slot = self.__timers.pop(key)
+        self.__wheels[level][slot].discard(key)
+
+    def __insert(self, key, expires, callback):
+        """Insert timer in the right level and slot."""
+
+        # timers already expired fire at the next tick
+        delta = max(expires - self.__now, 1)
+        level = 0
+        span = self.slots
+
+        while delta >= span and level < self.levels - 1:
+            level += 1
+            span *= self.slots
+
+        # beyond the last level, park the timer in the farthest slot, it
+        # will be re-inserted when that slot is cascaded
+        if delta >= span:
+            delta = span - 1
+
+        expires_at = self.__now + delta
+
+        slot = (expires_at // (span // self.slots)) % self.slots
+
+        self.__wheels[level][slot].add(key)
+        self.__timers[key] = (expires, callback, level, slot)
+
+    def __cascade(self, level):
+        """Move the timers of the current slot of level down the wheel."""
+
+        span = self.slots ** level
+        slot = (self.__now // span) % self.slots
+
+        keys = self.__wheels[level][slot]
+        self.__wheels[level][slot] = set()
+
+        for key in keys:
+            expires, callback, _, _ = self.__timers.pop(key)
+            self.__insert(key, expires, callback)
+
+    def __on_tick(self):
+        """Advance the wheel up to the current time."""
+
+        target = self.__to_ticks(time.time())
+
+        while self.__now < target:
+
+            self.__now += 1
+
+            # cascade from the highest level whose slot has changed
+            level = 0
+            while level < self.levels - 1 and \
+                    not self.__now % (self.slots ** (level + 1)):
+                level += 1
+
+            for cascade in range(level, 0, -1):
+                self.__cascade(cascade)
+
+            slot = self.__now % self.slots
+            keys = self.__wheels[0][slot]
+            self.__wheels[0][slot] = set()
+
+            for key in keys:
+
+                expires, callback, _, _ = self.__timers.pop(key)
+
+                # not yet expired, e.g. parked timers
+                if expires > self.__now:
+                    self.__insert(key, expires, callback)
+                    continue
+
+                self.expired += 1
+
+                try:
+                    callback()
+                except Exception as ex:
+                    LOG.exception(ex)
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""In-memory time-series store.
+
+Module results are recorded as (module, key, metric) series, e.g. the
+average RSSI of a station in a UCQM module. Every series keeps the raw
+samples in a bounded ring buffer and downsampled copies (count, sum, min,
+max per bucket) in coarser ring buffers, so that the memory used by a
+series is bounded and old data is still available at a lower resolution.
+Ring buffers grow as samples are added, a series updated rarely or
+recently created only uses the memory its samples need.
+
+Both the number of series and the memory used by the samples are bounded.
+When a bound is hit, the least recently updated series of the module
+using the most memory is evicted, so that a module recording many series
+does not push out the series of the others. Series are indexed by module,
+so that the series of a module are found without scanning the others.
+"""
+
+import math
+import time
+
+from array import array
+from collections import OrderedDict
+
+# Raw samples per series
+DEFAULT_SAMPLES = 360
+
+# Downsampling tiers as (bucket size in seconds, number of buckets)
+DEFAULT_TIERS = [(60, 360), (600, 144)]
+
+# Max memory used by the series (bytes)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Approximate memory used by a series besides its samples (bytes)
+SERIES_OVERHEAD = 3072
+
+# Max number of series (None: as many as max_bytes can hold)
+DEFAULT_MAX_SERIES = None
+
+AGGREGATES = ['avg', 'min', 'max', 'sum', 'count', 'last']
+
+
+class RingBuffer(object):
+    """A bounded ring buffer of rows of floats stored by column. The
+    columns grow until capacity rows are stored, then the oldest rows are
+    overwritten.
+
+    Attributes:
+        capacity: the max number of rows
+        size: the current number of rows
+        columns: the columns as arrays of doubles, by name
+        row_bytes: the memory used by a row
+    """
+
+    def __init__(self, capacity, names):
+
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0
+        self.columns = {x: array('d') for x in names}
+        self.row_bytes = array('d').itemsize * len(names)
+
+    def __len__(self):
+        return self.size
+
+    def nbytes(self):
+        """Return the memory used by the columns."""
+
+        return self.size * self.row_bytes
+
+    def append(self):
+        """Make room for a new row and return its index."""
+
+        index = self.head
+
+        if self.size < self.capacity:
+            for column in self.columns.values():
+                column.append(0.0)
+
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+        return index
+
+    def last(self):
+        """Return the index of the newest row."""
+
+        return (self.head - 1) % self.capacity
+
+    def first(self):
+        """Return the index of the oldest row."""
+
+        return (self.head - self.size) % self.capacity
+
+    def covers(self, start):
+        """Return True if no row newer than start has been overwritten."""
+
+        if self.size < self.capacity:
+            return True
+
+        return self.columns['ts'][self.first()] <= start
+
+    def indexes(self):
+        """Return the row indexes from the oldest to the newest."""
+
+        first = self.first()
+
+        return [(first + x) % self.capacity for x in range(self.size)]
+
+
+class Series(object):
+    """A time series with downsampling tiers.
+
+    Attributes:
+        raw: the raw samples (ts, value)
+        tiers: the downsampled samples as (step, (ts, count, sum, min, max))
+    """
+
+    def __init__(self, samples=DEFAULT_SAMPLES, tiers=DEFAULT_TIERS):
+
+        self.raw = RingBuffer(samples, ('ts', 'value'))
+        self.tiers = [(step, RingBuffer(buckets, ('ts', 'count', 'sum',
+                                                  'min', 'max')))
+                      for step, buckets in tiers]
+
+    def nbytes(self):
+        """Return the memory used by the series."""
+
+        return SERIES_OVERHEAD + self.raw.nbytes() + \
+            sum(x[1].nbytes() for x in self.tiers)
+
+    def add(self, timestamp, value):
+        """Add a sample, return the memory allocated for it."""
+
+        nbytes = 0
+
+        if self.raw.size < self.raw.capacity:
+            nbytes += self.raw.row_bytes
+
+        index = self.raw.append()
+        self.raw.columns['ts'][index] = timestamp
+        self.raw.columns['value'][index] = value
+
+        for step, tier in self.tiers:
+
+            bucket = math.floor(timestamp / step) * step
+            cols = tier.columns
+
+            if tier.size and cols['ts'][tier.last()] == bucket:
+                index = tier.last()
+                cols['count'][index] += 1
+                cols['sum'][index] += value
+                cols['min'][index] = min(cols['min'][index], value)
+                cols['max'][index] = max(cols['max'][index], value)
+                continue
+
+            if tier.size < tier.capacity:
+                nbytes += tier.row_bytes
+
+            index = tier.append()
+            cols['ts'][index] = bucket
+            cols['count'][index] = 1
+            cols['sum'][index] = value
+            cols['min'][index] = value
+            cols['max'][index] = value
+
+        return nbytes
+
+    def rows(self, start, end):
+        """Return the (resolution, rows) covering [start, end] at the
+        highest resolution available, rows are (ts, count, sum, min, max)
+        tuples."""
+
+        raw = self.raw
+        cols = raw.columns
+
+        if raw.covers(start) or not self.tiers:
+
+            return 0, [(cols['ts'][x], 1, cols['value'][x],
+                        cols['value'][x], cols['value'][x])
+                       for x in raw.indexes()
+                       if start <= cols['ts'][x] <= end]
+
+        # the finest tier covering start, the coarsest one otherwise, the
+        # buckets overlapping start are included
+        for step, tier in self.tiers:
+            if tier.covers(start):
+                break
+
+        cols = tier.columns
+
+        return step, [(cols['ts'][x], cols['count'][x], cols['sum'][x],
+                       cols['min'][x], cols['max'][x])
+                      for x in tier.indexes()
+                      if start - step < cols['ts'][x] <= end]
+
+    def query(self, start, end, step=0, aggregate='avg'):
+        """Return the samples in [start, end] as (resolution, points).
+
+        If step is not 0 samples are grouped in step seconds long buckets
+        and reduced with aggregate (one of AGGREGATES).
+        """
+
+        resolution, rows = self.rows(start, end)
+
+        if not step:
+            step = resolution
+
+        if not step:
+            return resolution, [[x[0], reduce_rows([x], aggregate)]
+                                for x in rows]
+
+        buckets = OrderedDict()
+
+        for row in rows:
+            bucket = math.floor(row[0] / step) * step
+            buckets.setdefault(bucket, []).append(row)
+
+        return max(step, resolution), \
+            [[k, reduce_rows(v, aggregate)] for k, v in buckets.items()]
+
+    def window(self, seconds, now=None):
+        """Return count, avg, std, min, max and last of the last seconds."""
+
+        if now is None:
+            now = time.time()
+
+        raw = self.raw
+        cols = raw.columns
+
+        values = [cols['value'][x] for x in raw.indexes()
+                  if cols['ts'][x] >= now - seconds]
+
+        if not values:
+            return {'count': 0}
+
+        avg = sum(values) / len(values)
+        var = sum((x - avg) ** 2 for x in values) / len(values)
+
+        return {'count': len(values),
+                'avg': avg,
+                'std': math.sqrt(var),
+                'min': min(values),
+                'max': max(values),
+                'last': values[-1]}
+
+
+def reduce_rows(rows, aggregate):
+    """Reduce (ts, count, sum, min, max) rows with aggregate."""
+
+    if aggregate == 'avg':
+        return sum(x[2] for x in rows) / sum(x[1] for x in rows)
+
+    if aggregate == 'min':
+        return min(x[3] for x in rows)
+
+    if aggregate == 'max':
+        return max(x[4] for x in rows)
+
+    if aggregate == 'sum':
+        return sum(x[2] for x in rows)
+
+    if aggregate == 'count':
+        return sum(x[1] for x in rows)
+
+    if aggregate == 'last':
+        return rows[-1][2] / rows[-1][1]
+
+    raise ValueError("Invalid aggregate %s" % aggregate)
+
+
+def module_key(module):
+    """Return the series owner id of module (modules may not be
+    hashable)."""
+
+    return (module.module_type, module.module_id)
+
+
+class TimeSeriesStore(object):
+    """Runtime-wide time-series store.
+
+    Attributes:
+        samples: the raw samples kept per series
+        tiers: the downsampling tiers as (bucket size in s, buckets)
+        max_series: the max number of series (default: max_bytes divided
+            by the memory used by an empty series)
+        max_bytes: the max memory used by the series
+        nbytes: the memory currently used by the series
+        evicted: the number of series evicted so far
+        evicted_partial: the number of series evicted before their raw
+            samples buffer was full
+    """
+
+    def __init__(self, samples=DEFAULT_SAMPLES, tiers=DEFAULT_TIERS,
+                 max_series=DEFAULT_MAX_SERIES, max_bytes=DEFAULT_MAX_BYTES):
+
+        if max_series is None:
+            max_series = max(1, max_bytes // SERIES_OVERHEAD)
+
+        self.samples = samples
+        self.tiers = tiers
+        self.max_series = max_series
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evicted = 0
+        self.evicted_partial = 0
+
+        # (owner, key, metric) -> Series
+        self.__series = {}
+
+        # owner -> {(key, metric): Series}, least recently updated first
+        self.__owners = {}
+
+        # owner -> memory used by its series
+        self.__owner_bytes = {}
+
+    def __len__(self):
+        return len(self.__series)
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {'samples': self.samples,
+                'tiers': self.tiers,
+                'max_series': self.max_series,
+                'max_bytes': self.max_bytes,
+                'series': len(self.__series),
+                'modules': len(self.__owners),
+                'evicted': self.evicted,
+                'evicted_partial': self.evicted_partial,
+                'bytes': self.nbytes,
+                'usage': round(self.nbytes / self.max_bytes, 4)}
+
+    def record(self, module, key, metric, value, timestamp=None):
+        """Record a sample of metric for key in the series of module."""
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        owner = module_key(module)
+        series_id = (owner, key, metric)
+
+        if series_id in self.__series:
+
+            series = self.__series[series_id]
+            self.__owners[owner].move_to_end((key, metric))
+
+        else:
+
+            if len(self.__series) >= self.max_series:
+                self.__evict(None)
+
+            series = Series(self.samples, self.tiers)
+            self.__series[series_id] = series
+
+            if owner not in self.__owners:
+                self.__owners[owner] = OrderedDict()
+                self.__owner_bytes[owner] = 0
+
+            self.__owners[owner][(key, metric)] = series
+            self.__account(owner, series.nbytes())
+
+        self.__account(owner, series.add(timestamp, value))
+
+        while self.nbytes > self.max_bytes and len(self.__series) > 1:
+            self.__evict(series_id)
+
+    def __account(self, owner, nbytes):
+        """Add nbytes to the memory used by owner."""
+
+        self.nbytes += nbytes
+        self.__owner_bytes[owner] += nbytes
+
+    def __evict(self, keep):
+        """Evict the least recently updated series of the module using the
+        most memory, never the series keep."""
+
+        candidates = list(self.__owners)
+
+        # keep is the most recently updated series of its module
+        if keep and len(self.__owners[keep[0]]) == 1:
+            candidates.remove(keep[0])
+
+        owner = max(candidates, key=lambda x: self.__owner_bytes[x])
+        entries = self.__owners[owner]
+        (key, metric), series = entries.popitem(last=False)
+
+        del self.__series[(owner, key, metric)]
+        self.__account(owner, -series.nbytes())
+
+        if not entries:
+            del self.__owners[owner]
+            del self.__owner_bytes[owner]
+
+        self.evicted += 1
+
+        if len(series.raw) < series.raw.capacity:
+            self.evicted_partial += 1
+
+    def series(self, module, key=None, metric=None):
+        """Return the (key, metric, series) of module matching key and
+        metric (all if None)."""
+
+        entries = self.__owners.get(module_key(module), {})
+
+        if key is not None and metric is not None and \
+           (key, metric) in entries:
+            return [(key, metric, entries[(key, metric)])]
+
+        return [(k, m, s) for (k, m), s in entries.items()
+                if (key is None or k == key or str(k) == str(key)) and
+                (metric is None or m == metric)]
+
+    def query(self, module, key=None, metric=None, start=None, end=None,
+              step=0, aggregate='avg'):
+        """Query the series of module.
+
+        Args:
+            key: the series key (all if None)
+            metric: the series metric (all if None)
+            start: start time, relative to now if negative (default -3600)
+            end: end time (default now)
+            step: bucket size in seconds (default native resolution)
+            aggregate: one of AGGREGATES (default avg)
+
+        Returns:
+            a list of dicts with key, metric, resolution and the points as
+            [timestamp, value] lists
+        """
+
+        if aggregate not in AGGREGATES:
+            raise ValueError("Invalid aggregate %s" % aggregate)
+
+        now = time.time()
+
+        if start is None:
+            start = -3600
+
+        if start < 0:
+            start = now + start
+
+        if end is None:
+            end = now
+
+        out = []
+
+        for key, metric, series in self.series(module, key, metric):
+
+            resolution, points = series.query(start, end, step, aggregate)
+
+            out.append({'key': key,
+                        'metric': metric,
+                        'resolution': resolution,
+                        'points': points})
+
+        return out
+
+    def window(self, module, key, metric, seconds):
+        """Return the statistics of the last seconds of a series."""
+
+        series_id = (module_key(module), key, metric)
+
+        if series_id not in self.__series:
+            return {'count': 0}
+
+        return self.__series[series_id].window(seconds)
+
+    def remove(self, module):
+        """Remove all the series of module."""
+
+        owner = module_key(module)
+
+        for (key, metric), series in self.__owners.pop(owner, {}).items():
+            del self.__series[(owner, key, metric)]
+            self.nbytes -= series.nbytes()
+
+        self.__owner_bytes.pop(owner, None)
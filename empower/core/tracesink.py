@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Buffered trace files.
+
+Apps logging traces (e.g. CSV files) write strings (one or more lines) to
+a TraceWriter, which only puts them in a bounded queue. A single
+background thread drains the queue and appends them to the files, which
+are kept open (at most max_open at a time) and flushed every
+flush_interval seconds. Writes made while the queue is full are dropped
+and counted. Trace files can be rotated when they exceed a size and/or an
+age, rotated files are named <filename>.1, <filename>.2, ... (the most
+recent first) and can optionally be gzip compressed. Compression is done
+by a separate thread, so that the other traces are not delayed.
+
+Neither writing nor closing a trace blocks the caller. At exit the queued
+writes are completed, the files are flushed and closed and the pending
+compressions are waited for.
+"""
+
+import os
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import threading
+
+from collections import deque
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+# Max number of writes waiting to be completed
+DEFAULT_MAX_QUEUE = 100000
+
+# Max number of files kept open
+DEFAULT_MAX_OPEN = 64
+
+# Flush interval in seconds
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Rotated files kept
+DEFAULT_BACKUPS = 5
+
+# Write buffer size
+BUFFER_SIZE = 65536
+
+
+class TraceWriter(object):
+    """A trace file.
+
+    Attributes:
+        filename: the file name
+        max_bytes: rotate the file when larger than max_bytes (0: never)
+        max_age: rotate the file when older than max_age seconds (0: never)
+        backups: the number of rotated files kept
+        compress: gzip the rotated files
+        written: the number of writes completed
+        dropped: the number of writes dropped
+        rotations: the number of rotations
+    """
+
+    def __init__(self, sink, filename, max_bytes=0, max_age=0,
+                 backups=DEFAULT_BACKUPS, compress=False):
+
+        self.sink = sink
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.compress = compress
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.closed = False
+
+        # only accessed by the background thread
+        self.file_d = None
+        self.size = 0
+        self.created = None
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {'filename': self.filename,
+                'max_bytes': self.max_bytes,
+                'max_age': self.max_age,
+                'backups': self.backups,
+                'compress': self.compress,
+                'written': self.written,
+                'dropped': self.dropped,
+                'rotations': self.rotations}
+
+    def write(self, data):
+        """Queue data (one or more lines), never blocks."""
+
+        if self.closed:
+            raise ValueError("Trace %s is closed" % self.filename)
+
+        self.sink.put(self, data)
+
+    def close(self):
+        """Complete the queued writes and close the file, never blocks."""
+
+        if self.closed:
+            return
+
+        self.closed = True
+        self.sink.put(self, None)
+
+    def _open(self):
+        """Open the file (append mode)."""
+
+        self.file_d = open(self.filename, 'a', buffering=BUFFER_SIZE)
+        self.size = self.file_d.tell()
+
+        if self.created is None:
+            self.created = time.time()
+
+    def _close(self):
+        """Close the file."""
+
+        if self.file_d:
+            self.file_d.close()
+            self.file_d = None
+
+    def _shift(self, ext):
+        """Shift the rotated files."""
+
+        for index in range(self.backups - 1, 0, -1):
+            src = "%s.%u%s" % (self.filename, index, ext)
+            if os.path.exists(src):
+                os.replace(src, "%s.%u%s" % (self.filename, index + 1, ext))
+
+    def _rotate(self):
+        """Close the file and shift the rotated files, the compression
+        (if any) is left to the sink compressor."""
+
+        self._close()
+
+        if self.backups < 1:
+            os.remove(self.filename)
+        elif self.compress:
+            rotated = "%s.%u.rotated" % (self.filename, time.time_ns())
+            os.replace(self.filename, rotated)
+            self.sink.compress(self, rotated)
+        else:
+            self._shift("")
+            os.replace(self.filename, "%s.1" % self.filename)
+
+        self.created = time.time()
+        self.rotations += 1
+
+    def _compress(self, rotated):
+        """Shift the compressed files and compress the rotated file.
+        Called by the sink compressor."""
+
+        try:
+            self._shift(".gz")
+            with open(rotated, 'rb') as f_in, \
+                    gzip.open("%s.1.gz" % self.filename, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(rotated)
+        except OSError as ex:
+            LOG.error("Unable to compress trace %s: %s", rotated, ex)
+
+    def _write(self, chunks, now):
+        """Append chunks, rotating the file if needed."""
+
+        if not self.file_d:
+            self._open()
+
+        for chunk in chunks:
+
+            if (self.max_bytes and self.size >= self.max_bytes) or \
+               (self.max_age and now - self.created >= self.max_age):
+                self._rotate()
+                self._open()
+
+            self.file_d.write(chunk)
+            self.size += len(chunk)
+
+        self.written += len(chunks)
+
+
+class TraceSink(object):
+    """Background writer of the trace files.
+
+    Attributes:
+        max_queue: max number of writes waiting to be completed
+        max_open: max number of files kept open
+        flush_interval: flush interval in seconds
+        writers: the open TraceWriters, by file name
+        compressions: the number of rotated files waiting to be compressed
+    """
+
+    def __init__(self, max_queue=DEFAULT_MAX_QUEUE, max_open=DEFAULT_MAX_OPEN,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+
+        self.max_queue = max_queue
+        self.max_open = max_open
+        self.flush_interval = flush_interval
+        self.writers = {}
+        self.compressions = 0
+
+        self.__queue = queue.Queue(max_queue)
+        self.__open = OrderedDict()
+        self.__thread = None
+        self.__compressor = None
+        self.__lock = threading.Lock()
+        self.__stopping = threading.Event()
+
+        # writers closed while the queue was full
+        self.__closing = deque()
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {'max_queue': self.max_queue,
+                'max_open': self.max_open,
+                'flush_interval': self.flush_interval,
+                'depth': self.__queue.qsize(),
+                'compressions': self.compressions,
+                'writers': [x.to_dict() for x in self.writers.values()]}
+
+    def open(self, filename, **kwargs):
+        """Return the TraceWriter of filename, creating it if needed (see
+        TraceWriter for the keyword arguments)."""
+
+        if filename in self.writers:
+            return self.writers[filename]
+
+        writer = TraceWriter(self, filename, **kwargs)
+        self.writers[filename] = writer
+
+        with self.__lock:
+            if not self.__thread:
+                self.__thread = threading.Thread(target=self.__run,
+                                                 name="tracesink",
+                                                 daemon=True)
+                self.__thread.start()
+                atexit.register(self.stop)
+
+        return writer
+
+    def put(self, writer, data):
+        """Queue data for writer (None closes the writer)."""
+
+        if data is None:
+            self.writers.pop(writer.filename, None)
+            try:
+                self.__queue.put_nowait((writer, None))
+            except queue.Full:
+                self.__closing.append(writer)
+            return
+
+        try:
+            self.__queue.put_nowait((writer, data))
+        except queue.Full:
+            writer.dropped += 1
+
+    def compress(self, writer, rotated):
+        """Compress the rotated file of writer in the compressor thread."""
+
+        with self.__lock:
+            if not self.__compressor:
+                self.__compressor = ThreadPool(1)
+            self.compressions += 1
+
+        self.__compressor.apply_async(self.__compress, (writer, rotated))
+
+    def __compress(self, writer, rotated):
+        """Compress a rotated file."""
+
+        writer._compress(rotated)
+
+        with self.__lock:
+            self.compressions -= 1
+
+    def stop(self, timeout=None):
+        """Complete the queued writes, flush and close the files and wait
+        for the pending compressions. Called at exit."""
+
+        with self.__lock:
+            thread = self.__thread
+
+        if thread:
+            self.__stopping.set()
+            thread.join(timeout)
+
+        with self.__lock:
+            compressor = self.__compressor
+            self.__compressor = None
+
+        if compressor:
+            compressor.close()
+            compressor.join()
+
+    def __run(self):
+        """Complete the queued writes, flush the open files periodically."""
+
+        last_flush = time.time()
+
+        while True:
+
+            # the writers closed before draining the queue
+            closing = []
+            while self.__closing:
+                closing.append(self.__closing.popleft())
+
+            stopping = self.__stopping.is_set()
+
+            if stopping:
+                timeout = 0
+            else:
+                timeout = max(0,
+                              last_flush + self.flush_interval - time.time())
+
+            try:
+                items = [self.__queue.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+
+            # drain the queue
+            while True:
+                try:
+                    items.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self.__write(items)
+            except Exception as ex:
+                LOG.exception(ex)
+
+            for writer in closing:
+                self.__close(writer)
+
+            if stopping:
+                for writer in list(self.__open):
+                    self.__close(writer)
+                return
+
+            if time.time() - last_flush >= self.flush_interval:
+                self.__flush()
+                last_flush = time.time()
+
+    def __write(self, items):
+        """Group the queued data by writer and write it."""
+
+        batches = OrderedDict()
+
+        for writer, data in items:
+
+            if data is not None:
+                batches.setdefault(writer, []).append(data)
+                continue
+
+            # close the writer after completing its pending writes
+            self.__write_batch(writer, batches.pop(writer, []))
+            self.__close(writer)
+
+        for writer, chunks in batches.items():
+            self.__write_batch(writer, chunks)
+
+    def __write_batch(self, writer, chunks):
+        """Write chunks keeping at most max_open files open."""
+
+        if not chunks:
+            return
+
+        if writer in self.__open:
+            self.__open.move_to_end(writer)
+        else:
+            while len(self.__open) >= self.max_open:
+                lru, _ = self.__open.popitem(last=False)
+                lru._close()
+            self.__open[writer] = True
+
+        try:
+            writer._write(chunks, time.time())
+        except OSError as ex:
+            LOG.error("Unable to write trace %s: %s", writer.filename, ex)
+            writer.dropped += len(chunks)
+            self.__close(writer)
+
+    def __close(self, writer):
+        """Close the file of writer."""
+
+        try:
+            writer._close()
+        except OSError as ex:
+            LOG.error("Unable to close trace %s: %s", writer.filename, ex)
+
+        self.__open.pop(writer, None)
+
+    def __flush(self):
+        """Flush the open files."""
+
+        for writer in self.__open:
+            try:
+                writer.file_d.flush()
+            except OSError as ex:
+                LOG.error("Unable to flush trace %s: %s", writer.filename,
+                          ex)
@@ -66,6 +66,9 @@ class VirtualPort(object):
 
         self.next = dict()
 
+        # the rules pointing to this port, (id(prop), match) -> prop
+        self.prev = {}
+
     def clear(self):
         """Clear all outgoing links."""
 
@@ -126,6 +129,12 @@ class VirtualPortProp(dict):
 
     Flows are dictionary keys in the following format:
         dl_src=11:22:33:44:55:66,tp_dst=80
+
+    Every rule is implemented by one or more virtual links (intents). The
+    installed links are reconciled against the rules every time a rule
+    changes (or when reconcile is called, e.g. after a handover): only the
+    links that are not installed yet are sent and only the installed links
+    that are not needed anymore are removed.
     """
 
     def __init__(self, obj):
@@ -133,26 +142,56 @@ class VirtualPortProp(dict):
         self.__uuids__ = {}
         self.obj = obj
 
+    def links(self, key, value):
+        """Return the virtual links implementing the rule key -> value as
+        a dictionary mapping the link endpoints to the intent."""
+
+        return {}
+
+    def reconcile(self, key=None):
+        """Reconcile the installed links of rule key (all rules if None)."""
+
+        intent_server = RUNTIME.components[IntentServer.__module__]
+
+        if key is None:
+            keys = set(self.keys()) | set(self.__uuids__.keys())
+        else:
+            keys = [key]
+
+        for key in keys:
+
+            if dict.__contains__(self, key):
+                desired = self.links(key, dict.__getitem__(self, key))
+            else:
+                desired = {}
+
+            installed = self.__uuids__.pop(key, {})
+
+            # remove stale virtual links
+            for link in [x for x in installed if x not in desired]:
+                intent_server.remove_intent(installed.pop(link))
+
+            # add new virtual links
+            for link in [x for x in desired if x not in installed]:
+                installed[link] = intent_server.send_intent(desired[link])
+
+            if installed:
+                self.__uuids__[key] = installed
+
     def __delitem__(self, key):
         """Clear virtual port configuration.
 
         Remove entry from dictionary and remove flows.
         """
 
-        intent_server = RUNTIME.components[IntentServer.__module__]
-
-        # remove virtual links
-        if key in self.__uuids__:
-            for uuid in self.__uuids__[key]:
-                intent_server.remove_intent(uuid)
-            del self.__uuids__[key]
+        value = dict.__getitem__(self, key)
+        value.prev.pop((id(self), key), None)
 
         # remove old entry
         dict.__delitem__(self, key)
 
-
-class VirtualPortPropLvap(VirtualPortProp):
-    """VirtualPortProp class for LVAPs."""
+        # remove virtual links
+        self.reconcile(key)
 
     def __setitem__(self, key, value):
         """Set virtual port configuration."""
@@ -160,13 +199,25 @@ class VirtualPortPropLvap(VirtualPortProp):
         if value and not isinstance(value, VirtualPort):
             raise KeyError("Expected VirtualPort, got %s" % type(key))
 
-        # remove virtual link
-        if self.__contains__(key):
-            self.__delitem__(key)
+        if dict.__contains__(self, key):
+            old = dict.__getitem__(self, key)
+            old.prev.pop((id(self), key), None)
 
-        self.__uuids__[key] = []
+        # add entry
+        dict.__setitem__(self, key, value)
+        value.prev[(id(self), key)] = self
 
-        intent_server = RUNTIME.components[IntentServer.__module__]
+        # update virtual links
+        self.reconcile(key)
+
+
+class VirtualPortPropLvap(VirtualPortProp):
+    """VirtualPortProp class for LVAPs."""
+
+    def links(self, key, value):
+        """One virtual link from every downlink and uplink radio block."""
+
+        links = {}
 
         # Set downlink and uplink virtual link(s)
         dl_blocks = list(self.obj.downlink.values())
@@ -186,30 +237,19 @@ class VirtualPortPropLvap(VirtualPortProp):
                       'stp_port': n_port.port_id,
                       'match': ofmatch_s2d(key)}
 
-            # add new virtual link
-            uuid = intent_server.send_intent(intent)
-            self.__uuids__[key].append(uuid)
+            link = (n_port.dpid, n_port.port_id, value.dpid,
+                    value.ovs_port_id)
+
+            links[link] = intent
 
-            # add entry
-            dict.__setitem__(self, key, value)
+        return links
 
 
 class VirtualPortPropLvnf(VirtualPortProp):
     """VirtualPortProp class for LVAPs."""
 
-    def __setitem__(self, key, value):
-        """Set virtual port configuration."""
-
-        if value and not isinstance(value, VirtualPort):
-            raise KeyError("Expected VirtualPort, got %s" % type(key))
-
-        # remove virtual link
-        if self.__contains__(key):
-            self.__delitem__(key)
-
-        self.__uuids__[key] = []
-
-        intent_server = RUNTIME.components[IntentServer.__module__]
+    def links(self, key, value):
+        """One virtual link towards the next port."""
 
         # set intent(add stp_dpid and stp_port
         intent = {'version': '1.0',
@@ -217,9 +257,4 @@ class VirtualPortPropLvnf(VirtualPortProp):
                   'ttp_port': value.ovs_port_id,
                   'match': ofmatch_s2d(key)}
 
-        # add new virtual link
-        uuid = intent_server.send_intent(intent)
-        self.__uuids__[key].append(uuid)
-
-        # add entry
-        dict.__setitem__(self, key, value)
+        return {(value.dpid, value.ovs_port_id): intent}
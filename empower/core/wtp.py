@@ -49,4 +49,6 @@ class WTP(BasePNFDev):
 
         out = super().to_dict()
         out['supports'] = self.supports
+        out['tx_stats'] = \
+            self.connection.tx_stats if self.connection else None
         return out
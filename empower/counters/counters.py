@@ -17,6 +17,8 @@
 
 """Common counters module."""
 
+import time
+
 from construct import UBInt8
 from construct import Bytes
 from construct import Sequence
@@ -27,6 +29,10 @@ from construct import UBInt32
 from construct import Array
 
 from empower.datatypes.etheraddress import EtherAddress
+from empower.core.codec import compile_struct
+from empower.core.histogram import Histogram
+from empower.core.histogram import CUMULATIVE
+from empower.core.histogram import MODES
 from empower.lvapp.lvappserver import ModuleLVAPPWorker
 from empower.core.module import Module
 from empower.core.lvap import LVAP
@@ -40,24 +46,25 @@ PT_STATS_RESPONSE = 0x18
 
 STATS = Sequence("stats", UBInt16("bytes"), UBInt32("count"))
 
-STATS_REQUEST = Struct("stats_request", UBInt8("version"),
-                       UBInt8("type"),
-                       UBInt16("length"),
-                       UBInt32("seq"),
-                       UBInt32("module_id"),
-                       Bytes("sta", 6))
+STATS_REQUEST = \
+    compile_struct(Struct("stats_request", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          UBInt32("module_id"),
+                          Bytes("sta", 6)))
 
 STATS_RESPONSE = \
-    Struct("stats_response", UBInt8("version"),
-           UBInt8("type"),
-           UBInt16("length"),
-           UBInt32("seq"),
-           UBInt32("module_id"),
-           Bytes("wtp", 6),
-           Bytes("sta", 6),
-           UBInt16("nb_tx"),
-           UBInt16("nb_rx"),
-           Array(lambda ctx: ctx.nb_tx + ctx.nb_rx, STATS))
+    compile_struct(Struct("stats_response", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          UBInt32("module_id"),
+                          Bytes("wtp", 6),
+                          Bytes("sta", 6),
+                          UBInt16("nb_tx"),
+                          UBInt16("nb_rx"),
+                          Array(lambda ctx: ctx.nb_tx + ctx.nb_rx, STATS)))
 
 
 class Counters(Module):
@@ -73,18 +80,22 @@ class Counters(Module):
         # parameters
         self._lvap = None
         self._bins = [8192]
+        self._mode = CUMULATIVE
 
         # data structures
         self.tx_packets = []
         self.rx_packets = []
         self.tx_bytes = []
         self.rx_bytes = []
+        self._tx_hist = None
+        self._rx_hist = None
 
     def __eq__(self, other):
 
         return super().__eq__(other) and \
             self.lvap == other.lvap and \
-            self.bins == other.bins
+            self.bins == other.bins and \
+            self.mode == other.mode
 
     @property
     def lvap(self):
@@ -124,17 +135,34 @@ class Counters(Module):
 
         self._bins = bins
 
+    @property
+    def mode(self):
+        """Return the counters mode."""
+
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode):
+        """Set the counters mode, either cumulative (default) or delta
+        (difference with the previous report)."""
+
+        if mode not in MODES:
+            raise ValueError("mode must be one of %s" % ", ".join(MODES))
+
+        self._mode = mode
+
     def to_dict(self):
         """ Return a JSON-serializable dictionary representing the Stats """
 
         out = super().to_dict()
 
         out['bins'] = self.bins
+        out['mode'] = self.mode
         out['lvap'] = self.lvap
         out['tx_bytes'] = self.tx_bytes
-        out['rx_bytes'] = self.tx_bytes
+        out['rx_bytes'] = self.rx_bytes
         out['tx_packets'] = self.tx_packets
-        out['rx_packets'] = self.tx_packets
+        out['rx_packets'] = self.rx_packets
 
         return out
 
@@ -158,6 +186,13 @@ class Counters(Module):
             self.log.info("WTP %s not connected", lvap.wtp.addr)
             return
 
+        if lvap.wtp.connection.congested:
+            self.log.info("WTP %s congested", lvap.wtp.addr)
+            return
+
+        if self.worker.share_request(self, (lvap.wtp.addr, lvap.addr)):
+            return
+
         stats_req = Container(version=PT_VERSION,
                               type=PT_STATS_REQUEST,
                               length=18,
@@ -170,61 +205,7 @@ class Counters(Module):
                       self.module_id)
 
         msg = STATS_REQUEST.build(stats_req)
-        lvap.wtp.connection.stream.write(msg)
-
-    def fill_bytes_samples(self, data):
-        """ Compute samples.
-
-        Samples are in the following format (after ordering):
-
-        [[60, 3], [66, 2], [74, 1], [98, 40], [167, 2], [209, 2], [1466, 1762]]
-
-        Each 2-tuple has format [ size, count ] where count is the number of
-        size-long (bytes, including the Ethernet 2 header) TX/RX by the LVAP.
-
-        """
-
-        samples = sorted(data, key=lambda entry: entry[0])
-        out = [0] * len(self.bins)
-
-        for entry in samples:
-            if len(entry) == 0:
-                continue
-            size = entry[0]
-            count = entry[1]
-            for i in range(0, len(self.bins)):
-                if size <= self.bins[i]:
-                    out[i] = out[i] + size * count
-                    break
-
-        return out
-
-    def fill_packets_samples(self, data):
-        """ Compute samples.
-
-        Samples are in the following format (after ordering):
-
-        [[60, 3], [66, 2], [74, 1], [98, 40], [167, 2], [209, 2], [1466, 1762]]
-
-        Each 2-tuple has format [ size, count ] where count is the number of
-        size-long (bytes, including the Ethernet 2 header) TX/RX by the LVAP.
-
-        """
-
-        samples = sorted(data, key=lambda entry: entry[0])
-        out = [0] * len(self.bins)
-
-        for entry in samples:
-            if len(entry) == 0:
-                continue
-            size = entry[0]
-            count = entry[1]
-            for i in range(0, len(self.bins)):
-                if size <= self.bins[i]:
-                    out[i] = out[i] + count
-                    break
-
-        return out
+        lvap.wtp.connection.send_message(msg)
 
     def handle_response(self, response):
         """Handle an incoming STATS_RESPONSE message.
@@ -234,15 +215,26 @@ class Counters(Module):
             None
         """
 
+        if not self._tx_hist:
+            self._tx_hist = Histogram(self.bins, self.mode)
+            self._rx_hist = Histogram(self.bins, self.mode)
+
         # update this object
-        tx_samples = response.stats[0:response.nb_tx]
-        rx_samples = response.stats[response.nb_tx:-1]
+        self._tx_hist.update(response.stats[0:response.nb_tx])
+        self._rx_hist.update(response.stats[response.nb_tx:])
+
+        self.tx_bytes = self._tx_hist.bytes
+        self.rx_bytes = self._rx_hist.bytes
+
+        self.tx_packets = self._tx_hist.packets
+        self.rx_packets = self._rx_hist.packets
 
-        self.tx_bytes = self.fill_bytes_samples(tx_samples)
-        self.rx_bytes = self.fill_bytes_samples(rx_samples)
+        # update history
+        timestamp = time.time()
 
-        self.tx_packets = self.fill_packets_samples(tx_samples)
-        self.rx_packets = self.fill_packets_samples(rx_samples)
+        for metric in ('tx_bytes', 'rx_bytes', 'tx_packets', 'rx_packets'):
+            self.record(self.lvap, metric, sum(getattr(self, metric)),
+                        timestamp)
 
         # call callback
         self.handle_callback(self)
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Asynchronous intent client.
+
+Intent operations are queued and flushed once per IOLoop iteration.
+Before a flush the queue is coalesced: an intent created and removed
+within the same batch is never sent, consecutive updates to the same
+intent only send the last one and an update to an intent whose creation
+is still queued is merged into the creation. Every operation returns a
+Future, the uuid of an intent being created can be passed to the other
+operations before it resolves.
+
+Operations on the same intent are serialized: only one is in flight at a
+time, the following ones wait for it to complete and only the last
+update waiting is kept. Requests failing with a 5xx status are retried
+with exponential backoff, connection errors are not retried (the intent
+interface is most likely down) and are logged once until the interface
+is back.
+
+Requests are sent through a single AsyncHTTPClient instance. When pycurl
+is available the curl based client is used, which keeps the connections
+to the intent interface alive across requests.
+"""
+
+import json
+import tornado.ioloop
+
+from uuid import UUID
+from functools import partial
+from urllib.parse import urlparse
+
+from tornado.concurrent import Future
+from tornado.concurrent import chain_future
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpclient import HTTPRequest
+
+from empower.core.jsonserializer import EmpowerEncoder
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+try:
+    from tornado.curl_httpclient import CurlAsyncHTTPClient
+except ImportError:
+    CurlAsyncHTTPClient = None
+
+# Max number of concurrent requests
+DEFAULT_MAX_CLIENTS = 10
+
+# Max number of retries for requests failing with a 5xx status
+DEFAULT_RETRIES = 5
+
+# Delay before the first retry in ms, doubled at every retry
+DEFAULT_BACKOFF = 100
+
+HEADERS = {'Content-type': 'application/json',
+           'Accept': 'application/json'}
+
+
+class IntentOperation(object):
+    """A queued intent operation.
+
+    Attributes:
+        method: the HTTP method (GET, POST, PUT, DELETE)
+        uuid: the intent uuid, a Future resolving to it or None (all)
+        intent: the intent (POST and PUT only)
+        future: resolved with the result of the operation
+        attempts: the number of retries
+        key: the key serializing the operations on the same intent
+    """
+
+    def __init__(self, method, uuid=None, intent=None):
+
+        self.method = method
+        self.uuid = uuid
+        self.intent = intent
+        self.future = Future()
+        self.attempts = 0
+        self.key = None
+
+
+class IntentClient(object):
+    """Asynchronous intent client.
+
+    Attributes:
+        host: the intent interface host
+        port: the intent interface port
+        url: the intent rules url
+        retries: max number of retries
+        backoff: delay before the first retry in ms
+        inflight: the keys of the intents with an operation in flight
+        queued: key -> operations waiting for the one in flight
+        available: False after a connection error, until a response is
+            received
+    """
+
+    def __init__(self, host, port, url, max_clients=DEFAULT_MAX_CLIENTS,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+
+        self.host = host
+        self.port = port
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.pending = []
+        self.inflight = set()
+        self.queued = {}
+        self.available = True
+
+        self.stats = {'queued': 0,
+                      'sent': 0,
+                      'coalesced': 0,
+                      'retried': 0,
+                      'failed': 0,
+                      'flushes': 0}
+
+        if CurlAsyncHTTPClient:
+            self.http_client = \
+                CurlAsyncHTTPClient(force_instance=True,
+                                    max_clients=max_clients)
+        else:
+            LOG.info("pycurl not found, intent connections are not reused")
+            self.http_client = \
+                AsyncHTTPClient(force_instance=True, max_clients=max_clients)
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        out = dict(self.stats)
+
+        out['pending'] = len(self.pending)
+        out['inflight'] = len(self.inflight)
+        out['waiting'] = sum(len(x) for x in self.queued.values())
+        out['available'] = self.available
+        out['keep_alive'] = bool(CurlAsyncHTTPClient)
+
+        return out
+
+    def get_intent(self, uuid=None):
+        """Fetch intent (all intents if uuid is None)."""
+
+        return self.__enqueue(IntentOperation("GET", uuid))
+
+    def send_intent(self, intent):
+        """Create new intent, the future resolves to its uuid."""
+
+        return self.__enqueue(IntentOperation("POST", intent=intent))
+
+    def update_intent(self, uuid, intent):
+        """Update intent, the future resolves to its uuid."""
+
+        return self.__enqueue(IntentOperation("PUT", uuid, intent))
+
+    def remove_intent(self, uuid=None):
+        """Remove intent (all intents if uuid is None)."""
+
+        return self.__enqueue(IntentOperation("DELETE", uuid))
+
+    def __enqueue(self, operation):
+        """Add operation to the queue, schedule a flush if needed."""
+
+        if not self.pending:
+            tornado.ioloop.IOLoop.current().add_callback(self.__flush)
+
+        self.pending.append(operation)
+        self.stats['queued'] += 1
+
+        return operation.future
+
+    def __flush(self):
+        """Coalesce and send the queued operations."""
+
+        pending, self.pending = self.pending, []
+        self.stats['flushes'] += 1
+
+        batch = []
+
+        # queued creations and last queued update, by future/uuid
+        creates = {}
+        updates = {}
+
+        for operation in pending:
+
+            uuid = operation.uuid
+            key = id(uuid) if isinstance(uuid, Future) else uuid
+
+            if operation.method == "POST":
+
+                creates[id(operation.future)] = operation
+
+            elif operation.method == "PUT" and key in creates:
+
+                # merge into the queued creation
+                creates[key].intent = operation.intent
+                chain_future(creates[key].future, operation.future)
+                self.stats['coalesced'] += 1
+                continue
+
+            elif operation.method == "PUT" and key in updates:
+
+                # drop the previous update
+                previous = updates[key]
+                batch.remove(previous)
+                chain_future(operation.future, previous.future)
+                self.stats['coalesced'] += 1
+
+            elif operation.method == "DELETE" and key in creates:
+
+                # the intent is created and removed in the same batch
+                create = creates.pop(key)
+                batch.remove(create)
+                create.future.set_result(None)
+                operation.future.set_result(None)
+                self.stats['coalesced'] += 2
+                continue
+
+            elif operation.method == "DELETE" and key in updates:
+
+                # the intent is removed, drop the pending update
+                previous = updates.pop(key)
+                batch.remove(previous)
+                previous.future.set_result(None)
+                self.stats['coalesced'] += 1
+
+            if operation.method == "PUT":
+                updates[key] = operation
+
+            batch.append(operation)
+
+        for operation in batch:
+            self.__schedule(operation)
+
+    @classmethod
+    def __key(cls, operation):
+        """Return the key of the intent operation refers to: the intent
+        uuid or, while it is being created, the id of the creation
+        future."""
+
+        if operation.method == "POST":
+            return id(operation.future)
+
+        uuid = operation.uuid
+
+        if isinstance(uuid, Future):
+            return uuid.result() if uuid.done() else id(uuid)
+
+        return uuid
+
+    def __schedule(self, operation):
+        """Send the request unless an operation on the same intent is in
+        flight, queue it otherwise."""
+
+        operation.key = self.__key(operation)
+
+        if operation.key not in self.inflight:
+            self.inflight.add(operation.key)
+            self.__submit(operation)
+            return
+
+        queued = self.queued.setdefault(operation.key, [])
+
+        # only the last update is kept
+        if operation.method in ("PUT", "DELETE") and queued and \
+           queued[-1].method == "PUT":
+
+            previous = queued.pop()
+
+            if operation.method == "PUT":
+                chain_future(operation.future, previous.future)
+            else:
+                previous.future.set_result(None)
+
+            self.stats['coalesced'] += 1
+
+        queued.append(operation)
+
+    def __done(self, operation, result):
+        """Resolve the operation, send the next one on the same intent."""
+
+        operation.future.set_result(result)
+
+        key = operation.key
+        self.inflight.discard(key)
+        waiting = self.queued.pop(key, [])
+
+        # the operations waiting for a creation now refer to the uuid
+        if operation.method == "POST" and result:
+            key = result
+            waiting += self.queued.pop(key, [])
+
+        if not waiting:
+            return
+
+        for queued in waiting:
+            queued.key = key
+
+        if key in self.inflight:
+            self.queued[key] = waiting
+            return
+
+        if len(waiting) > 1:
+            self.queued[key] = waiting[1:]
+
+        self.inflight.add(key)
+        self.__submit(waiting[0])
+
+    def __submit(self, operation):
+        """Send the request, waiting for the uuid if still unknown."""
+
+        if isinstance(operation.uuid, Future):
+
+            if not operation.uuid.done():
+                operation.uuid.add_done_callback(
+                    lambda _: self.__submit(operation))
+                return
+
+            operation.uuid = operation.uuid.result()
+
+            # the intent has not been created
+            if not operation.uuid:
+                self.__done(operation, None)
+                return
+
+        url = "http://%s:%u%s" % (self.host, self.port, self.url)
+
+        if operation.uuid:
+            url += "/%s" % operation.uuid
+
+        body = None
+
+        if operation.method in ("POST", "PUT"):
+            body = json.dumps(operation.intent, cls=EmpowerEncoder)
+
+        LOG.info("%s intent %s", operation.method, url)
+
+        request = HTTPRequest(url, method=operation.method, headers=HEADERS,
+                              body=body)
+
+        self.stats['sent'] += 1
+        self.http_client.fetch(request,
+                               callback=partial(self.__on_response,
+                                                operation))
+
+    def __on_response(self, operation, response):
+        """Resolve the operation future or retry the request."""
+
+        # connection errors are reported with code 599 and not retried
+        if 500 <= response.code < 599 and operation.attempts < self.retries:
+
+            delay = self.backoff * 2 ** operation.attempts / 1000
+            operation.attempts += 1
+            self.stats['retried'] += 1
+
+            tornado.ioloop.IOLoop.current().call_later(delay, self.__submit,
+                                                       operation)
+            return
+
+        if response.code == 599:
+
+            if self.available:
+                LOG.error("Intent interface not found: %s", response.error)
+                self.available = False
+
+            self.stats['failed'] += 1
+            self.__done(operation, None)
+            return
+
+        if not self.available:
+            LOG.info("Intent interface available")
+            self.available = True
+
+        LOG.info("Result: %u %s", response.code, response.reason)
+
+        if operation.method == "POST" and response.code == 201:
+
+            location = response.headers.get("Location")
+            url = urlparse(location)
+            self.__done(operation, UUID(url.path.split("/")[-1]))
+
+        elif operation.method == "PUT" and response.code == 204:
+
+            self.__done(operation, operation.uuid)
+
+        elif operation.method == "GET" and response.code == 200:
+
+            self.__done(operation, response.body)
+
+        elif operation.method == "DELETE" and 200 <= response.code < 300:
+
+            self.__done(operation, operation.uuid)
+
+        else:
+
+            self.stats['failed'] += 1
+            self.__done(operation, None)
@@ -17,14 +17,10 @@
 
 """Intent server module."""
 
-import tornado
-import json
-import http.client
+import tornado.web
+import tornado.httpserver
 
-from uuid import UUID
-from urllib.parse import urlparse
-
-from empower.core.jsonserializer import EmpowerEncoder
+from empower.intentserver.intentclient import IntentClient
 
 import empower.logger
 LOG = empower.logger.get_logger()
@@ -39,7 +35,11 @@ class IntentHandler(tornado.web.RequestHandler):
 
 
 class IntentServer(tornado.web.Application):
-    """Intent Server."""
+    """Intent Server.
+
+    Intents are pushed to the intent interface asynchronously (see
+    intentclient), all the methods return a Future.
+    """
 
     handlers = [IntentHandler]
 
@@ -59,149 +59,47 @@ class IntentServer(tornado.web.Application):
         http_server = tornado.httpserver.HTTPServer(self)
         http_server.listen(self.port)
 
+        self.client = IntentClient(self.intent_host, self.intent_port,
+                                   self.intent_url)
+
         self.get_intent()
         self.remove_intent()
 
     def get_intent(self, uuid=None):
-        """Remove intent."""
+        """Fetch intent."""
 
         if uuid:
             LOG.info("Fetching intent: %s", uuid)
         else:
             LOG.info("Fetching intent: ALL")
 
-        try:
-
-            conn = \
-                http.client.HTTPConnection(self.intent_host, self.intent_port)
-
-            if uuid:
-                conn.request("GET", self.intent_url + "/%s" % uuid)
-            else:
-                conn.request("GET", self.intent_url)
-
-            response = conn.getresponse()
-
-            ret = (response.status, response.reason, response.read())
-
-            LOG.info("Result: %u %s", ret[0], ret[1])
-            conn.close()
-
-        except ConnectionRefusedError:
-            LOG.error("Intent interface not found")
-
-        except Exception as ex:
-            LOG.exception(ex)
+        return self.client.get_intent(uuid)
 
     def send_intent(self, intent):
-        """Create new intent."""
-
-        body = json.dumps(intent, indent=4, cls=EmpowerEncoder)
-
-        LOG.info("Creating intent:\n%s", body)
-
-        headers = {
-            'Content-type': 'application/json',
-            'Accept': 'application/json',
-        }
-
-        try:
-
-            conn = \
-                http.client.HTTPConnection(self.intent_host, self.intent_port)
-
-            conn.request("POST", self.intent_url, body, headers)
-            response = conn.getresponse()
-            conn.close()
-
-            ret = (response.status, response.reason, response.read())
-
-            if ret[0] == 201:
-
-                location = response.getheader("Location", None)
-                url = urlparse(location)
-                uuid = UUID(url.path.split("/")[-1])
-                LOG.info("Result: %u %s (%s)", ret[0], ret[1], uuid)
-
-                return uuid
+        """Create new intent, the future resolves to the intent uuid."""
 
-            LOG.info("Result: %u %s", ret[0], ret[1])
+        LOG.info("Creating intent: %s", intent)
 
-        except ConnectionRefusedError:
-            LOG.error("Intent interface not found")
-
-        except Exception as ex:
-            LOG.exception(ex)
-
-        return None
+        return self.client.send_intent(intent)
 
     def update_intent(self, uuid, intent):
-        """Create new intent."""
-
-        body = json.dumps(intent, indent=4, cls=EmpowerEncoder)
-
-        LOG.info("Updating intent: %s\n%s", uuid, body)
-
-        headers = {
-            'Content-type': 'application/json',
-            'Accept': 'application/json',
-        }
-
-        try:
-
-            conn = \
-                http.client.HTTPConnection(self.intent_host, self.intent_port)
-
-            conn.request("PUT", self.intent_url + "/%s" % uuid, body, headers)
-            response = conn.getresponse()
-            conn.close()
-
-            ret = (response.status, response.reason, response.read())
-
-            if ret[0] == 204:
-                LOG.info("Result: %u %s", ret[0], ret[1])
-                return uuid
+        """Update intent, uuid can also be the future returned by
+        send_intent."""
 
-            LOG.info("Result: %u %s", ret[0], ret[1])
+        LOG.info("Updating intent: %s %s", uuid, intent)
 
-        except ConnectionRefusedError:
-            LOG.error("Intent interface not found")
-
-        except Exception as ex:
-            LOG.exception(ex)
-
-        return None
+        return self.client.update_intent(uuid, intent)
 
     def remove_intent(self, uuid=None):
-        """Remove intent."""
+        """Remove intent, uuid can also be the future returned by
+        send_intent."""
 
         if uuid:
             LOG.info("Removing intent: %s", uuid)
         else:
             LOG.info("Removing intent: ALL")
 
-        try:
-
-            conn = \
-                http.client.HTTPConnection(self.intent_host, self.intent_port)
-
-            if uuid:
-                conn.request("DELETE", self.intent_url + "/%s" % uuid)
-            else:
-                conn.request("DELETE", self.intent_url)
-
-            response = conn.getresponse()
-
-            ret = (response.status, response.reason, response.read())
-
-            LOG.info("Result: %u %s", ret[0], ret[1])
-            conn.close()
-
-        except ConnectionRefusedError:
-            LOG.error("Intent interface not found")
-
-        except Exception as ex:
-            LOG.exception(ex)
+        return self.client.remove_intent(uuid)
 
     def to_dict(self):
         """ Return a dict representation of the object. """
@@ -209,7 +107,8 @@ class IntentServer(tornado.web.Application):
         return {'port': self.port,
                 'intent_host': self.intent_host,
                 'intent_port': self.intent_port,
-                'intent_url': self.intent_url}
+                'intent_url': self.intent_url,
+                'client': self.client.to_dict()}
 
 
 def launch(port=DEFAULT_PORT):
@@ -17,6 +17,8 @@
 
 """LVAP statistics module."""
 
+import time
+
 from construct import UBInt8
 from construct import UBInt16
 from construct import UBInt32
@@ -129,6 +131,13 @@ class LVAPStats(Module):
             self.log.info("WTP %s not connected", lvap.wtp.addr)
             return
 
+        if lvap.wtp.connection.congested:
+            self.log.info("WTP %s congested", lvap.wtp.addr)
+            return
+
+        if self.worker.share_request(self, (lvap.wtp.addr, lvap.addr)):
+            return
+
         rates_req = Container(version=PT_VERSION,
                               type=PT_RATES_REQUEST,
                               length=18,
@@ -140,7 +149,7 @@ class LVAPStats(Module):
                       lvap.addr, lvap.wtp.addr, self.module_id)
 
         msg = RATES_REQUEST.build(rates_req)
-        lvap.wtp.connection.stream.write(msg)
+        lvap.wtp.connection.send_message(msg)
 
     def handle_response(self, response):
         """Handle an incoming RATES_RESPONSE message.
@@ -155,12 +164,15 @@ class LVAPStats(Module):
 
         # update this object
         self.rates = {}
+        timestamp = time.time()
+
         for entry in response.rates:
             if lvap.default_block.band == BT_L20:
                 rate = entry[0] / 2.0
             else:
                 rate = entry[0]
             self.rates[rate] = {'prob': entry[2] / 180.0}
+            self.record(rate, 'prob', self.rates[rate]['prob'], timestamp)
 
         # call callback
         self.handle_callback(self)
@@ -29,6 +29,8 @@ from construct import BitStruct
 from construct import Bit
 from construct import Padding
 
+from empower.core.codec import compile_struct
+
 
 PT_VERSION = 0x00
 
@@ -53,107 +55,119 @@ PT_ADD_VAP = 0x31
 PT_DEL_VAP = 0x32
 PT_STATUS_VAP = 0x33
 
-HEADER = Struct("header", UBInt8("version"), UBInt8("type"), UBInt16("length"))
+HEADER = \
+    compile_struct(Struct("header", UBInt8("version"), UBInt8("type"),
+                          UBInt16("length")))
 
 SSIDS = Range(1, 10, Struct("ssids", UBInt8("length"),
                             Bytes("ssid", lambda ctx: ctx.length)))
 
-HELLO = Struct("hello", UBInt8("version"),
-               UBInt8("type"),
-               UBInt16("length"),
-               UBInt32("seq"),
-               Bytes("wtp", 6),
-               UBInt32("period"))
+HELLO = \
+    compile_struct(Struct("hello", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("wtp", 6),
+                          UBInt32("period")))
 
-PROBE_REQUEST = Struct("probe_request", UBInt8("version"),
-                       UBInt8("type"),
-                       UBInt16("length"),
-                       UBInt32("seq"),
-                       Bytes("wtp", 6),
-                       Bytes("sta", 6),
-                       Bytes("hwaddr", 6),
-                       UBInt8("channel"),
-                       UBInt8("band"),
-                       Bytes("ssid", lambda ctx: ctx.length - 28))
+PROBE_REQUEST = \
+    compile_struct(Struct("probe_request", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("wtp", 6),
+                          Bytes("sta", 6),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band"),
+                          Bytes("ssid", lambda ctx: ctx.length - 28)))
 
-PROBE_RESPONSE = Struct("probe_response", UBInt8("version"),
-                        UBInt8("type"),
-                        UBInt16("length"),
-                        UBInt32("seq"),
-                        Bytes("sta", 6))
+PROBE_RESPONSE = \
+    compile_struct(Struct("probe_response", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("sta", 6)))
 
-AUTH_REQUEST = Struct("auth_request", UBInt8("version"),
-                      UBInt8("type"),
-                      UBInt16("length"),
-                      UBInt32("seq"),
-                      Bytes("wtp", 6),
-                      Bytes("sta", 6),
-                      Bytes("bssid", 6))
+AUTH_REQUEST = \
+    compile_struct(Struct("auth_request", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("wtp", 6),
+                          Bytes("sta", 6),
+                          Bytes("bssid", 6)))
 
-AUTH_RESPONSE = Struct("auth_response", UBInt8("version"),
-                       UBInt8("type"),
-                       UBInt16("length"),
-                       UBInt32("seq"),
-                       Bytes("sta", 6))
+AUTH_RESPONSE = \
+    compile_struct(Struct("auth_response", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("sta", 6),
+                          Bytes("bssid", 6)))
 
 ASSOC_REQUEST = \
-    Struct("assoc_request", UBInt8("version"),
-           UBInt8("type"),
-           UBInt16("length"),
-           UBInt32("seq"),
-           Bytes("wtp", 6),
-           Bytes("sta", 6),
-           Bytes("bssid", 6),
-           Bytes("ssid", lambda ctx: ctx.length - 26))
+    compile_struct(Struct("assoc_request", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("wtp", 6),
+                          Bytes("sta", 6),
+                          Bytes("bssid", 6),
+                          Bytes("ssid", lambda ctx: ctx.length - 26)))
 
-ASSOC_RESPONSE = Struct("assoc_response", UBInt8("version"),
-                        UBInt8("type"),
-                        UBInt16("length"),
-                        UBInt32("seq"),
-                        Bytes("sta", 6))
+ASSOC_RESPONSE = \
+    compile_struct(Struct("assoc_response", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("sta", 6)))
 
-ADD_LVAP = Struct("add_lvap", UBInt8("version"),
-                  UBInt8("type"),
-                  UBInt16("length"),
-                  UBInt32("seq"),
-                  BitStruct("flags", Padding(13),
-                            Bit("set_mask"),
-                            Bit("associated"),
-                            Bit("authenticated")),
-                  UBInt16("assoc_id"),
-                  Bytes("hwaddr", 6),
-                  UBInt8("channel"),
-                  UBInt8("band"),
-                  Bytes("sta", 6),
-                  Bytes("encap", 6),
-                  Bytes("net_bssid", 6),
-                  Bytes("lvap_bssid", 6),
-                  SSIDS)
+ADD_LVAP = \
+    compile_struct(Struct("add_lvap", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          BitStruct("flags", Padding(13),
+                                    Bit("set_mask"),
+                                    Bit("associated"),
+                                    Bit("authenticated")),
+                          UBInt16("assoc_id"),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band"),
+                          Bytes("sta", 6),
+                          Bytes("encap", 6),
+                          Bytes("net_bssid", 6),
+                          Bytes("lvap_bssid", 6),
+                          SSIDS))
 
-DEL_LVAP = Struct("del_lvap", UBInt8("version"),
-                  UBInt8("type"),
-                  UBInt16("length"),
-                  UBInt32("seq"),
-                  Bytes("sta", 6))
+DEL_LVAP = \
+    compile_struct(Struct("del_lvap", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("sta", 6)))
 
-STATUS_LVAP = Struct("status_lvap", UBInt8("version"),
-                     UBInt8("type"),
-                     UBInt16("length"),
-                     UBInt32("seq"),
-                     BitStruct("flags", Padding(13),
-                               Bit("set_mask"),
-                               Bit("associated"),
-                               Bit("authenticated")),
-                     UBInt16("assoc_id"),
-                     Bytes("wtp", 6),
-                     Bytes("sta", 6),
-                     Bytes("encap", 6),
-                     Bytes("hwaddr", 6),
-                     UBInt8("channel"),
-                     UBInt8("band"),
-                     Bytes("net_bssid", 6),
-                     Bytes("lvap_bssid", 6),
-                     SSIDS)
+STATUS_LVAP = \
+    compile_struct(Struct("status_lvap", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          BitStruct("flags", Padding(13),
+                                    Bit("set_mask"),
+                                    Bit("associated"),
+                                    Bit("authenticated")),
+                          UBInt16("assoc_id"),
+                          Bytes("wtp", 6),
+                          Bytes("sta", 6),
+                          Bytes("encap", 6),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band"),
+                          Bytes("net_bssid", 6),
+                          Bytes("lvap_bssid", 6),
+                          SSIDS))
 
 CAPS_R = Sequence("blocks",
                   Bytes("hwaddr", 6),
@@ -164,75 +178,81 @@ CAPS_P = Sequence("ports", Bytes("hwaddr", 6),
                   UBInt16("port_id"),
                   Bytes("iface", 10))
 
-CAPS = Struct("caps", UBInt8("version"),
-              UBInt8("type"),
-              UBInt16("length"),
-              UBInt32("seq"),
-              Bytes("wtp", 6),
-              UBInt8("nb_resources_elements"),
-              UBInt8("nb_ports_elements"),
-              Array(lambda ctx: ctx.nb_resources_elements, CAPS_R),
-              Array(lambda ctx: ctx.nb_ports_elements, CAPS_P))
+CAPS = \
+    compile_struct(Struct("caps", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("wtp", 6),
+                          UBInt8("nb_resources_elements"),
+                          UBInt8("nb_ports_elements"),
+                          Array(lambda ctx: ctx.nb_resources_elements, CAPS_R),
+                          Array(lambda ctx: ctx.nb_ports_elements, CAPS_P)))
 
-SET_PORT = Struct("set_port", UBInt8("version"),
-                  UBInt8("type"),
-                  UBInt16("length"),
-                  UBInt32("seq"),
-                  BitStruct("flags", Padding(15),
-                            Bit("no_ack")),
-                  Bytes("hwaddr", 6),
-                  UBInt8("channel"),
-                  UBInt8("band"),
-                  Bytes("sta", 6),
-                  UBInt16("rts_cts"),
-                  UBInt8("tx_mcast"),
-                  UBInt8("ur_mcast_count"),
-                  UBInt8("nb_mcses"),
-                  Array(lambda ctx: ctx.nb_mcses, UBInt8("mcs")))
+SET_PORT = \
+    compile_struct(Struct("set_port", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          BitStruct("flags", Padding(15),
+                                    Bit("no_ack")),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band"),
+                          Bytes("sta", 6),
+                          UBInt16("rts_cts"),
+                          UBInt8("tx_mcast"),
+                          UBInt8("ur_mcast_count"),
+                          UBInt8("nb_mcses"),
+                          Array(lambda ctx: ctx.nb_mcses, UBInt8("mcs"))))
 
-STATUS_PORT = Struct("status_port", UBInt8("version"),
-                     UBInt8("type"),
-                     UBInt16("length"),
-                     UBInt32("seq"),
-                     BitStruct("flags", Padding(15),
-                               Bit("no_ack")),
-                     Bytes("wtp", 6),
-                     Bytes("sta", 6),
-                     Bytes("hwaddr", 6),
-                     UBInt8("channel"),
-                     UBInt8("band"),
-                     UBInt16("rts_cts"),
-                     UBInt8("tx_mcast"),
-                     UBInt8("ur_mcast_count"),
-                     UBInt8("nb_mcses"),
-                     Array(lambda ctx: ctx.nb_mcses, UBInt8("mcs")))
+STATUS_PORT = \
+    compile_struct(Struct("status_port", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          BitStruct("flags", Padding(15),
+                                    Bit("no_ack")),
+                          Bytes("wtp", 6),
+                          Bytes("sta", 6),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band"),
+                          UBInt16("rts_cts"),
+                          UBInt8("tx_mcast"),
+                          UBInt8("ur_mcast_count"),
+                          UBInt8("nb_mcses"),
+                          Array(lambda ctx: ctx.nb_mcses, UBInt8("mcs"))))
 
-ADD_VAP = Struct("add_vap", UBInt8("version"),
-                 UBInt8("type"),
-                 UBInt16("length"),
-                 UBInt32("seq"),
-                 Bytes("hwaddr", 6),
-                 UBInt8("channel"),
-                 UBInt8("band"),
-                 Bytes("net_bssid", 6),
-                 Bytes("ssid", lambda ctx: ctx.length - 22))
+ADD_VAP = \
+    compile_struct(Struct("add_vap", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band"),
+                          Bytes("net_bssid", 6),
+                          Bytes("ssid", lambda ctx: ctx.length - 22)))
 
-DEL_VAP = Struct("add_vap", UBInt8("version"),
-                 UBInt8("type"),
-                 UBInt16("length"),
-                 UBInt32("seq"),
-                 Bytes("net_bssid", 6))
+DEL_VAP = \
+    compile_struct(Struct("add_vap", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("net_bssid", 6)))
 
-STATUS_VAP = Struct("status_vap", UBInt8("version"),
-                    UBInt8("type"),
-                    UBInt16("length"),
-                    UBInt32("seq"),
-                    Bytes("wtp", 6),
-                    Bytes("hwaddr", 6),
-                    UBInt8("channel"),
-                    UBInt8("band"),
-                    Bytes("net_bssid", 6),
-                    Bytes("ssid", lambda ctx: ctx.length - 28))
+STATUS_VAP = \
+    compile_struct(Struct("status_vap", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          Bytes("wtp", 6),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band"),
+                          Bytes("net_bssid", 6),
+                          Bytes("ssid", lambda ctx: ctx.length - 28)))
 
 PT_TYPES = {PT_BYE: None,
             PT_REGISTER: None,
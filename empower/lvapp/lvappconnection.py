@@ -19,6 +19,7 @@
 
 import tornado.ioloop
 import time
+import struct
 
 from construct import Container
 
@@ -28,7 +29,6 @@ from empower.core.resourcepool import ResourceBlock
 from empower.core.resourcepool import ResourcePool
 from empower.core.resourcepool import BT_L20
 from empower.core.radioport import RadioPort
-from empower.lvapp import HEADER
 from empower.lvapp import PT_VERSION
 from empower.lvapp import PT_BYE
 from empower.lvapp import PT_REGISTER
@@ -62,6 +62,15 @@ LOG = empower.logger.get_logger()
 
 BASE_MAC = EtherAddress("00:1b:b3:00:00:00")
 
+# Fixed LVAPP header (version, type, length), precompiled for framing
+HEADER_FORMAT = struct.Struct("!BBH")
+
+# Max number of bytes requested to the stream for each read
+READ_CHUNK_SIZE = 65536
+
+# Pending outbound bytes above which pollers stop sending requests
+HIGH_WATER_MARK = 262144
+
 
 class LVAPPConnection(object):
     """LVAPP Connection.
@@ -113,11 +122,15 @@ class LVAPPConnection(object):
         self.server = server
         self.wtp = None
         self.stream.set_close_callback(self._on_disconnect)
-        self.__buffer = b''
-        self._hb_interval_ms = 500
-        self._hb_worker = tornado.ioloop.PeriodicCallback(self._heartbeat_cb,
-                                                          self._hb_interval_ms)
-        self._hb_worker.start()
+        self.__buffer = bytearray()
+        self.__outbox = []
+        self.__outbox_bytes = 0
+        self.__inflight_bytes = 0
+        self.__flush_scheduled = False
+        self.tx_stats = {'flushes': 0,
+                         'messages': 0,
+                         'bytes': 0,
+                         'max_pending_bytes': 0}
         self._wait()
 
     def to_dict(self):
@@ -125,38 +138,134 @@ class LVAPPConnection(object):
 
         return self.addr
 
-    def _heartbeat_cb(self):
-        """ Check if wtp connection is still active. Disconnect if no hellos
-        have been received from the wtp for twice the hello period. """
-        if self.wtp and not self.stream.closed():
-            timeout = (self.wtp.period / 1000) * 3
-            if (self.wtp.last_seen_ts + timeout) < time.time():
-                LOG.info('Client inactive %s at %r', self.wtp.addr, self.addr)
-                self.stream.close()
+    @property
+    def pending_bytes(self):
+        """Return the number of bytes queued but not yet on the wire."""
 
-    def _on_read(self, line):
-        """ Appends bytes read from socket to a buffer. Once the full packet
-        has been read the parser is invoked and the buffers is cleared. The
-        parsed packet is then passed to the suitable method or dropped if the
-        packet type in unknown. """
+        return self.__outbox_bytes + self.__inflight_bytes
+
+    @property
+    def congested(self):
+        """Return True if the outbound queue is above the high-water mark
+        or, for connections relayed by a worker process, if the worker is
+        not keeping up (see lvapprelay).
+
+        Pollers should skip their requests while the WTP is congested.
+        """
+
+        if self.pending_bytes >= HIGH_WATER_MARK:
+            return True
 
-        self.__buffer = self.__buffer + line
-        hdr = HEADER.parse(self.__buffer)
+        return getattr(self.stream, 'congested', False)
 
-        if len(self.__buffer) < hdr.length:
-            remaining = hdr.length - len(self.__buffer)
-            self.stream.read_bytes(remaining, self._on_read)
+    def send_message(self, msg):
+        """Queue a message for the WTP.
+
+        Messages produced during the same IOLoop iteration are coalesced and
+        written to the stream with a single write.
+        """
+
+        self.__outbox.append(msg)
+        self.__outbox_bytes += len(msg)
+
+        if self.pending_bytes > self.tx_stats['max_pending_bytes']:
+            self.tx_stats['max_pending_bytes'] = self.pending_bytes
+
+        if self.__flush_scheduled:
             return
 
-        try:
-            self._trigger_message(hdr.type)
-        except:
+        self.__flush_scheduled = True
+        tornado.ioloop.IOLoop.current().add_callback(self._flush)
+
+    def _flush(self):
+        """Write all the queued messages to the stream."""
+
+        self.__flush_scheduled = False
+
+        if not self.__outbox:
+            return
+
+        buffer = b''.join(self.__outbox)
+        nb_messages = len(self.__outbox)
+
+        self.__outbox = []
+        self.__outbox_bytes = 0
+
+        if self.stream.closed():
+            return
+
+        self.tx_stats['flushes'] += 1
+        self.tx_stats['messages'] += nb_messages
+        self.tx_stats['bytes'] += len(buffer)
+
+        self.__inflight_bytes += len(buffer)
+        self.stream.write(buffer, self._on_flushed)
+
+    def _on_flushed(self):
+        """Called when all the buffered data has been written."""
+
+        self.__inflight_bytes = 0
+
+    def _heartbeat_cb(self):
+        """ Check if wtp connection is still active. Disconnect if no hellos
+        have been received from the wtp for three times the hello period,
+        otherwise re-arm the timer with the new deadline. """
+
+        if not self.wtp or self.stream.closed():
+            return
+
+        timeout = (self.wtp.period / 1000) * 3
+        deadline = self.wtp.last_seen_ts + timeout
+
+        if deadline < time.time():
+            LOG.info('Client inactive %s at %r', self.wtp.addr, self.addr)
             self.stream.close()
             return
 
+        RUNTIME.timer_wheel.schedule(self, deadline, self._heartbeat_cb)
+
+    def _on_read(self, line):
+        """ Appends bytes read from socket to a buffer. Every complete
+        message sitting in the buffer is then extracted in a single pass and
+        passed to the suitable method or dropped if the packet type in
+        unknown. Incomplete messages are left in the buffer until the rest of
+        the message is received. """
+
+        self.__buffer.extend(line)
+
+        offset = 0
+
+        with memoryview(self.__buffer) as view:
+
+            while len(view) - offset >= HEADER_FORMAT.size:
+
+                _, msg_type, length = \
+                    HEADER_FORMAT.unpack_from(view, offset)
+
+                if length < HEADER_FORMAT.size:
+                    LOG.error("Invalid message length %u", length)
+                    self.stream.close()
+                    return
+
+                if len(view) - offset < length:
+                    break
+
+                try:
+                    with view[offset:offset + length] as frame:
+                        self._trigger_message(msg_type, frame)
+                except:
+                    self.stream.close()
+                    return
+
+                offset += length
+
+        # deleting from the head of a bytearray does not move the remaining
+        # bytes, so the buffer is reused across reads
+        del self.__buffer[:offset]
+
         self._wait()
 
-    def _trigger_message(self, msg_type):
+    def _trigger_message(self, msg_type, frame):
 
         if msg_type not in self.server.pt_types:
 
@@ -165,7 +274,7 @@ class LVAPPConnection(object):
 
         if self.server.pt_types[msg_type]:
 
-            msg = self.server.pt_types[msg_type].parse(self.__buffer)
+            msg = self.server.pt_types[msg_type].parse(frame)
             handler_name = "_handle_%s" % self.server.pt_types[msg_type].name
 
             if hasattr(self, handler_name):
@@ -207,19 +316,20 @@ class LVAPPConnection(object):
 
         wtp.last_seen_ts = time.time()
 
+        # start tracking the heartbeat of this connection, the timer is then
+        # re-armed on expiration
+        if self not in RUNTIME.timer_wheel:
+            self._heartbeat_cb()
+
         # Upon connection to the controller, the WTP must be provided
         # with the list of shared VAP
 
-        for tenant in RUNTIME.tenants.values():
+        for tenant in RUNTIME.load_tenants(wtp_addr).values():
 
             # tenant does not use shared VAPs
             if tenant.bssid_type == T_TYPE_UNIQUE:
                 continue
 
-            # wtp not in this tenant
-            if wtp_addr not in tenant.wtps:
-                continue
-
             tenant_id = tenant.tenant_id
             tokens = [tenant_id.hex[0:12][i:i + 2] for i in range(0, 12, 2)]
             base_bssid = EtherAddress(':'.join(tokens))
@@ -235,7 +345,7 @@ class LVAPPConnection(object):
                 vap = VAP(net_bssid, block, wtp, tenant)
 
                 self.send_add_vap(vap)
-                RUNTIME.tenants[tenant_id].vaps[net_bssid] = vap
+                RUNTIME.add_vap(vap)
 
     def _handle_probe_request(self, request):
         """Handle an incoming PROBE_REQUEST message.
@@ -268,6 +378,21 @@ class LVAPPConnection(object):
         if RUNTIME.is_denied(sta):
             return
 
+        # duplicates are collapsed by the probe cache which then calls
+        # spawn_lvap on the selected wtp
+        self.server.probe_cache.probe(sta, wtp, self, request)
+
+    def spawn_lvap(self, sta, request):
+        """Spawn a new LVAP for the station on this WTP.
+        Args:
+            sta, the station address
+            request, the PROBE_REQUEST message received by this WTP
+        Returns:
+            None
+        """
+
+        wtp = self.wtp
+        wtp_addr = wtp.addr
         ssid = SSID(request.ssid)
 
         if request.ssid == b'':
@@ -278,12 +403,10 @@ class LVAPPConnection(object):
         # generate list of available SSIDs
         ssids = set()
 
-        for tenant in RUNTIME.tenants.values():
+        for tenant in RUNTIME.load_tenants(wtp_addr).values():
             if tenant.bssid_type == T_TYPE_SHARED:
                 continue
-            for wtp_in_tenant in tenant.wtps.values():
-                if wtp_addr == wtp_in_tenant.addr:
-                    ssids.add(tenant.tenant_name)
+            ssids.add(tenant.tenant_name)
 
         if not ssids:
             LOG.info("No SSIDs available at this WTP")
@@ -295,7 +418,7 @@ class LVAPPConnection(object):
         lvap = LVAP(sta, net_bssid, net_bssid)
         lvap.set_ssids(list(ssids))
 
-        RUNTIME.lvaps[sta] = lvap
+        RUNTIME.add_lvap(lvap)
 
         # TODO: This should be built starting from the probe request
         lvap.supports.add(ResourceBlock(lvap, sta, 1, BT_L20))
@@ -368,19 +491,10 @@ class LVAPPConnection(object):
 
             lvap_bssid = lvap.net_bssid
 
-        # else if is a shared bssid
-        else:
+        # else if is a shared bssid (vaps exist only in shared tenants)
+        elif bssid in RUNTIME.vaps and RUNTIME.vaps[bssid].wtp == wtp:
 
-            shared_tenants = [x for x in RUNTIME.tenants.values()
-                              if x.bssid_type == T_TYPE_SHARED]
-
-            wtp = RUNTIME.wtps[wtp_addr]
-
-            # look for bssid in shared tenants
-            for tenant in shared_tenants:
-                if bssid in tenant.vaps and tenant.vaps[bssid].wtp == wtp:
-                    lvap_bssid = bssid
-                    break
+            lvap_bssid = bssid
 
         # invalid bssid, ignore request
         if not lvap_bssid:
@@ -435,15 +549,8 @@ class LVAPPConnection(object):
         tenant_name = None
 
         # look for ssid in shared tenants
-        for tenant_id in RUNTIME.tenants:
-
-            tenant = RUNTIME.tenants[tenant_id]
-
-            if tenant.bssid_type == T_TYPE_UNIQUE:
-                continue
-
-            if bssid in tenant.vaps and ssid == tenant.tenant_name:
-                tenant_name = tenant.tenant_name
+        if bssid in RUNTIME.vaps and ssid == RUNTIME.vaps[bssid].ssid:
+            tenant_name = ssid
 
         # otherwise this must be the lvap unique bssid
         if lvap.net_bssid == bssid and ssid in lvap.ssids:
@@ -467,12 +574,17 @@ class LVAPPConnection(object):
 
     def _wait(self):
         """ Wait for incoming packets on signalling channel """
-        self.__buffer = b''
-        self.stream.read_bytes(4, self._on_read)
+
+        if self.stream.closed():
+            return
+
+        self.stream.read_bytes(READ_CHUNK_SIZE, self._on_read, partial=True)
 
     def _on_disconnect(self):
         """ Handle WTP disconnection """
 
+        RUNTIME.timer_wheel.cancel(self)
+
         if not self.wtp:
             return
 
@@ -482,24 +594,21 @@ class LVAPPConnection(object):
         self.wtp.last_seen = 0
         self.wtp.connection = None
         self.wtp.ports = {}
+        RUNTIME.remove_maps(self.wtp)
         self.wtp.supports = ResourcePool()
+        RUNTIME.invalidate_blocks(self.wtp)
 
         # remove host lvaps
-        for addr in list(RUNTIME.lvaps.keys()):
-            if RUNTIME.lvaps[addr].wtp == self.wtp:
-                lvap = RUNTIME.lvaps[addr]
-                LOG.info("Deleting LVAP: %s", lvap.addr)
-                for handler in self.server.pt_types_handlers[PT_LVAP_LEAVE]:
-                    handler(lvap)
-                del RUNTIME.lvaps[lvap.addr]
+        for lvap in list(RUNTIME.load_wtp_lvaps(self.wtp).values()):
+            LOG.info("Deleting LVAP: %s", lvap.addr)
+            for handler in self.server.pt_types_handlers[PT_LVAP_LEAVE]:
+                handler(lvap)
+            RUNTIME.remove_lvap(lvap)
 
         # remove hosted vaps
-        for tenant_id in RUNTIME.tenants.keys():
-            for vap_id in list(RUNTIME.tenants[tenant_id].vaps.keys()):
-                vap = RUNTIME.tenants[tenant_id].vaps[vap_id]
-                if vap.wtp == self.wtp:
-                    LOG.info("Deleting VAP: %s", vap.net_bssid)
-                    del RUNTIME.tenants[vap.tenant_id].vaps[vap.net_bssid]
+        for vap in list(RUNTIME.load_wtp_vaps(self.wtp).values()):
+            LOG.info("Deleting VAP: %s", vap.net_bssid)
+            RUNTIME.remove_vap(vap)
 
     def send_bye_message_to_self(self):
         """Send a unsollicited BYE message to senf."""
@@ -564,7 +673,7 @@ class LVAPPConnection(object):
             lvap.supports.add(ResourceBlock(lvap, sta_addr, 36, BT_L20))
             lvap.supports.add(ResourceBlock(lvap, sta_addr, 48, BT_L20))
 
-            RUNTIME.lvaps[sta_addr] = lvap
+            RUNTIME.add_lvap(lvap)
 
         lvap = RUNTIME.lvaps[sta_addr]
 
@@ -709,6 +818,8 @@ class LVAPPConnection(object):
 
         LOG.info("Received caps from %s", wtp_addr)
 
+        RUNTIME.remove_maps(wtp)
+
         for block in caps.blocks:
 
             hwaddr = EtherAddress(block[0])
@@ -716,6 +827,8 @@ class LVAPPConnection(object):
             r_block = ResourceBlock(wtp, hwaddr, block[1], block[2])
             wtp.supports.add(r_block)
 
+        RUNTIME.invalidate_blocks(wtp)
+
         for port in caps.ports:
 
             iface = port[2].decode("utf-8").strip('\0')
@@ -784,19 +897,12 @@ class LVAPPConnection(object):
 
         net_bssid_addr = EtherAddress(status.net_bssid)
         ssid = SSID(status.ssid)
-        tenant_id = None
+        tenant = RUNTIME.load_tenant(ssid)
 
-        for tenant in RUNTIME.tenants.values():
-            if tenant.tenant_name == ssid:
-                tenant_id = tenant.tenant_id
-                break
-
-        if not tenant_id:
+        if not tenant:
             LOG.info("VAP %s from unknown tenant %s", net_bssid_addr, ssid)
             return
 
-        tenant = RUNTIME.tenants[tenant_id]
-
         vap = None
         hwaddr = EtherAddress(status.hwaddr)
         block = ResourceBlock(wtp, hwaddr, status.channel, status.band)
@@ -806,8 +912,7 @@ class LVAPPConnection(object):
 
         # If the VAP does not exists, then create a new one
         if net_bssid_addr not in tenant.vaps:
-            tenant.vaps[net_bssid_addr] = \
-                VAP(net_bssid_addr, block, wtp, tenant)
+            RUNTIME.add_vap(VAP(net_bssid_addr, block, wtp, tenant))
 
         vap = tenant.vaps[net_bssid_addr]
         LOG.info("VAP status %s", vap)
@@ -836,7 +941,7 @@ class LVAPPConnection(object):
         LOG.info("Add vap %s", vap)
 
         msg = ADD_VAP.build(add_vap)
-        self.stream.write(msg)
+        self.send_message(msg)
 
     def send_assoc_response(self, lvap):
         """Send a ASSOC_RESPONSE message.
@@ -855,7 +960,7 @@ class LVAPPConnection(object):
                              sta=lvap.addr.to_raw())
 
         msg = ASSOC_RESPONSE.build(response)
-        self.stream.write(msg)
+        self.send_message(msg)
 
     def send_auth_response(self, lvap):
         """Send a AUTH_RESPONSE message.
@@ -875,7 +980,7 @@ class LVAPPConnection(object):
                              bssid=lvap.lvap_bssid.to_raw())
 
         msg = AUTH_RESPONSE.build(response)
-        self.stream.write(msg)
+        self.send_message(msg)
 
     def send_probe_response(self, lvap):
         """Send a PROBE_RESPONSE message.
@@ -894,7 +999,7 @@ class LVAPPConnection(object):
                              sta=lvap.addr.to_raw())
 
         msg = PROBE_RESPONSE.build(response)
-        self.stream.write(msg)
+        self.send_message(msg)
 
     def send_del_lvap(self, lvap):
         """Send a DEL_LVAP message.
@@ -913,7 +1018,7 @@ class LVAPPConnection(object):
                              sta=lvap.addr.to_raw())
 
         msg = DEL_LVAP.build(del_lvap)
-        self.stream.write(msg)
+        self.send_message(msg)
 
     def send_set_port(self, tx_policy):
         """Send a SET_PORT message.
@@ -946,7 +1051,7 @@ class LVAPPConnection(object):
         LOG.info("Set tx policy %s", tx_policy)
 
         msg = SET_PORT.build(set_port)
-        self.stream.write(msg)
+        self.send_message(msg)
 
     def send_add_lvap(self, lvap, block, set_mask):
         """Send a ADD_LVAP message.
@@ -1000,4 +1105,4 @@ class LVAPPConnection(object):
         LOG.info("Add lvap %s", lvap)
 
         msg = ADD_LVAP.build(add_lvap)
-        self.stream.write(msg)
+        self.send_message(msg)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""LVAPP state coordinator.
+
+The controller RUNTIME is the only owner of the LVAP/WTP/Tenant state.
+The coordinator replicates to the LVAPP workers (see lvapprelay) the part
+of it they need to handle messages locally:
+
+    allowed: the stations in the ACL white list
+    denied: the stations in the ACL black list
+    lvaps: the stations with an LVAP
+    wtps: the WTPs belonging to at least one non-shared tenant, i.e. the
+        WTPs that can spawn LVAPs
+
+A worker gets a snapshot when its channel is attached, then the changes.
+The RUNTIME notifies the changed entries (see EmpowerRuntime.state_listeners),
+the changes are coalesced and sent at the end of the IOLoop iteration or
+before any data is relayed to the workers, whichever comes first.
+
+State messages are JSON objects with a "reset" flag (True for snapshots)
+and a list of [key, address, present] updates.
+"""
+
+import json
+import tornado.ioloop
+
+from empower.core.tenant import T_TYPE_SHARED
+from empower.lvapp.lvapprelay import RELAY_STATE
+
+from empower.main import RUNTIME
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+STATE_KEYS = ["allowed", "denied", "lvaps", "wtps"]
+
+
+class StateCoordinator(object):
+    """LVAPP state coordinator.
+
+    Attributes:
+        channels: the relay channels of the workers
+        stats: the number of snapshots and updates sent
+    """
+
+    def __init__(self):
+
+        self.channels = []
+        self.stats = {'snapshots': 0, 'updates': 0}
+        self.__dirty = set()
+        self.__flush_scheduled = False
+
+        RUNTIME.state_listeners.append(self.changed)
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return dict(self.stats)
+
+    @classmethod
+    def value(cls, key, addr):
+        """Return True if addr is in the replicated set key."""
+
+        if key == "wtps":
+            return any(tenant.bssid_type != T_TYPE_SHARED
+                       for tenant in RUNTIME.load_tenants(addr).values())
+
+        return addr in getattr(RUNTIME, key)
+
+    def snapshot(self):
+        """Return the replicated state as a list of updates."""
+
+        updates = []
+
+        for key in STATE_KEYS:
+
+            if key == "wtps":
+                entries = RUNTIME.pnfdev_tenants
+            else:
+                entries = getattr(RUNTIME, key)
+
+            updates += [[key, str(addr), True] for addr in entries
+                        if self.value(key, addr)]
+
+        return updates
+
+    def attach(self, channel):
+        """Send the snapshot to a new worker channel."""
+
+        self.channels.append(channel)
+        self.stats['snapshots'] += 1
+
+        self.__send(channel, True, self.snapshot())
+
+    def detach(self, channel):
+        """Stop replicating the state to channel."""
+
+        if channel in self.channels:
+            self.channels.remove(channel)
+
+    def changed(self, key, addr):
+        """Called by the RUNTIME when addr is added to/removed from key."""
+
+        self.__dirty.add((key, addr))
+
+        if self.__flush_scheduled:
+            return
+
+        self.__flush_scheduled = True
+        tornado.ioloop.IOLoop.current().add_callback(self.__on_flush)
+
+    def __on_flush(self):
+        """Scheduled flush."""
+
+        self.__flush_scheduled = False
+        self.flush()
+
+    def flush(self):
+        """Send the pending changes to all the workers."""
+
+        if not self.__dirty:
+            return
+
+        updates = [[key, str(addr), self.value(key, addr)]
+                   for key, addr in self.__dirty]
+
+        self.__dirty.clear()
+        self.stats['updates'] += len(updates)
+
+        for channel in self.channels:
+            self.__send(channel, False, updates)
+
+    @classmethod
+    def __send(cls, channel, reset, updates):
+        """Send a state message to channel."""
+
+        payload = json.dumps({'reset': reset, 'updates': updates})
+        channel.send(RELAY_STATE, 0, payload.encode())
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""LVAPP relay.
+
+When the LVAPP server runs in multi-process mode the WTP connections are
+sharded across a pool of worker processes sharing the LVAPP port through
+SO_REUSEPORT (see lvappworker). Every worker owns the connections of its
+WTPs: it frames and decodes the incoming messages and handles locally the
+ones the controller would ignore (probe requests from stations that
+already have an LVAP, that are rejected by the ACL, that are repeated
+within the probe window or that are heard by WTPs serving no SSID, and
+authentication/association requests from unknown or rejected stations).
+Only the remaining messages, which change the LVAP/WTP/Tenant state, are
+forwarded to the controller.
+
+The state the workers need for these decisions is replicated by the
+controller through the StateCoordinator (see lvappcoordinator): a snapshot
+when the worker connects, then the changes as they happen. Changes are
+always sent before any data on the same channel, so that a worker never
+relays to a WTP a message (e.g. an ADD_LVAP) before the state change that
+caused it.
+
+On the controller side every relayed WTP connection is exposed as a
+RelayStream, a minimal IOStream replacement that is handed to the usual
+LVAPPConnection. Worker processes that exit are restarted, their WTPs
+reconnect to the other workers in the meanwhile.
+
+Relay messages are made of a RELAY_HEADER (opcode, connection id, payload
+length) followed by the payload:
+
+    RELAY_OPEN: a new WTP connection, the payload is the JSON encoded
+        remote address
+    RELAY_DATA: complete LVAPP messages received from the WTP or bytes to
+        be sent to the WTP
+    RELAY_CLOSE: the WTP connection has been/must be closed
+    RELAY_PAUSE: the bytes pending on the WTP connection are above the
+        high-water mark
+    RELAY_RESUME: all the bytes pending on the WTP connection have been
+        written
+    RELAY_STATE: the JSON encoded state changes (connection id 0)
+    RELAY_STATS: the JSON encoded worker statistics (connection id 0)
+"""
+
+import os
+import sys
+import json
+import struct
+import atexit
+import subprocess
+import tornado.ioloop
+import tornado.netutil
+
+from tornado.tcpserver import TCPServer
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+RELAY_HEADER = struct.Struct("!BII")
+
+RELAY_OPEN = 0x00
+RELAY_DATA = 0x01
+RELAY_CLOSE = 0x02
+RELAY_PAUSE = 0x03
+RELAY_RESUME = 0x04
+RELAY_STATE = 0x05
+RELAY_STATS = 0x06
+
+# Max number of bytes requested to the stream for each read
+READ_CHUNK_SIZE = 65536
+
+# Bytes pending on a relay channel above which it is congested: the
+# pollers of the relayed WTPs stop sending requests and the worker stops
+# reading from its WTPs
+CHANNEL_HIGH_WATER_MARK = 4194304
+
+# How often the worker processes are checked and restarted if dead (ms)
+WORKER_CHECK_INTERVAL = 1000
+
+
+def relay_frames(buffer, callback):
+    """Call callback(opcode, conn_id, payload) for every complete message in
+    buffer and remove them from the buffer. Exceptions raised by callback
+    are logged and do not stop the processing of the other messages."""
+
+    offset = 0
+
+    while len(buffer) - offset >= RELAY_HEADER.size:
+
+        opcode, conn_id, length = RELAY_HEADER.unpack_from(buffer, offset)
+        start = offset + RELAY_HEADER.size
+
+        if len(buffer) - start < length:
+            break
+
+        try:
+            callback(opcode, conn_id, bytes(buffer[start:start + length]))
+        except Exception:
+            LOG.exception("Error handling relay message %u (conn %u)",
+                          opcode, conn_id)
+
+        offset = start + length
+
+    del buffer[:offset]
+
+
+class RelayChannel(object):
+    """One end of the unix socket connecting the controller to a worker.
+
+    Keeps track of the bytes written but not yet on the wire. Write
+    callbacks are called when the data they refer to has been written, the
+    IOStream keeps only the last write callback so they are queued here.
+
+    Attributes:
+        stream: the unix socket IOStream
+        pending_bytes: the bytes written and not yet on the wire
+    """
+
+    def __init__(self, stream):
+
+        self.stream = stream
+        self.pending_bytes = 0
+        self.__buffer = bytearray()
+        self.__callbacks = []
+
+        self.stream.set_close_callback(self._on_disconnect)
+        self._wait()
+
+    @property
+    def congested(self):
+        """Return True if the pending bytes are above the high-water
+        mark."""
+
+        return self.pending_bytes >= CHANNEL_HIGH_WATER_MARK
+
+    def send(self, opcode, conn_id, payload, callback=None):
+        """Send a relay message, call callback when it has been written."""
+
+        if self.stream.closed():
+            return
+
+        self.pending_bytes += RELAY_HEADER.size + len(payload)
+
+        if callback:
+            self.__callbacks.append(callback)
+
+        self.stream.write(RELAY_HEADER.pack(opcode, conn_id, len(payload)),
+                          self._on_written)
+
+        if payload:
+            self.stream.write(payload, self._on_written)
+
+    def _on_written(self):
+        """All the buffered data has been written."""
+
+        self.pending_bytes = 0
+
+        callbacks = self.__callbacks
+        self.__callbacks = []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                LOG.exception("Error in relay write callback")
+
+        self._on_drained()
+
+    def _wait(self):
+        """Wait for incoming data."""
+
+        if self.stream.closed():
+            return
+
+        self.stream.read_bytes(READ_CHUNK_SIZE, self._on_read, partial=True)
+
+    def _on_read(self, data):
+        """Dispatch the relay messages received, then wait for more."""
+
+        try:
+            self.__buffer.extend(data)
+            relay_frames(self.__buffer, self._on_message)
+        finally:
+            self._wait()
+
+    def _on_message(self, opcode, conn_id, payload):
+        """Handle a relay message."""
+
+        raise NotImplementedError()
+
+    def _on_drained(self):
+        """Called when all the pending bytes have been written."""
+
+        pass
+
+    def _on_disconnect(self):
+        """Called when the channel is closed."""
+
+        pass
+
+
+class RelayStream(object):
+    """A WTP connection owned by a worker process.
+
+    Implements the subset of the IOStream interface used by LVAPPConnection.
+
+    Attributes:
+        channel: the channel of the worker owning the connection
+        conn_id: the connection id within the worker
+        paused: True if the bytes pending on the WTP connection (in the
+            worker) are above the high-water mark
+    """
+
+    def __init__(self, channel, conn_id):
+
+        self.channel = channel
+        self.conn_id = conn_id
+        self.paused = False
+        self.__buffer = bytearray()
+        self.__read = None
+        self.__closed = False
+        self.__close_callback = None
+
+    @property
+    def congested(self):
+        """Return True if the worker or the relay channel are not keeping
+        up with the data sent to the WTP."""
+
+        return self.paused or self.channel.congested
+
+    def set_nodelay(self, value):
+        """Nagle is managed by the worker process."""
+
+        pass
+
+    def set_close_callback(self, callback):
+        """Call the given callback when the stream is closed."""
+
+        self.__close_callback = callback
+
+    def closed(self):
+        """Return True if the stream has been closed."""
+
+        return self.__closed
+
+    def read_bytes(self, num_bytes, callback, partial=False):
+        """Read num_bytes (or up to num_bytes if partial) and call callback
+        with the data."""
+
+        self.__read = (num_bytes, callback, partial)
+        self.__deliver()
+
+    def write(self, data, callback=None):
+        """Relay data to the WTP, call callback when it has been written to
+        the relay channel."""
+
+        if self.__closed:
+            return
+
+        self.channel.send(RELAY_DATA, self.conn_id, data, callback)
+
+    def close(self):
+        """Close the stream and ask the worker to close the WTP connection."""
+
+        if self.__closed:
+            return
+
+        self.channel.send(RELAY_CLOSE, self.conn_id, b'')
+        self.on_close()
+
+    def feed(self, data):
+        """Add data received from the WTP."""
+
+        if self.__closed:
+            return
+
+        self.__buffer.extend(data)
+        self.__deliver()
+
+    def on_close(self):
+        """The WTP connection has been closed."""
+
+        if self.__closed:
+            return
+
+        self.__closed = True
+        self.__read = None
+        self.channel.streams.pop(self.conn_id, None)
+
+        if self.__close_callback:
+            callback = self.__close_callback
+            self.__close_callback = None
+            tornado.ioloop.IOLoop.current().add_callback(callback)
+
+    def __deliver(self):
+        """Complete the pending read, if enough data is available."""
+
+        if not self.__read or not self.__buffer:
+            return
+
+        num_bytes, callback, partial = self.__read
+
+        if not partial and len(self.__buffer) < num_bytes:
+            return
+
+        self.__read = None
+
+        data = bytes(self.__buffer[:num_bytes])
+        del self.__buffer[:num_bytes]
+
+        tornado.ioloop.IOLoop.current().add_callback(callback, data)
+
+
+class WorkerChannel(RelayChannel):
+    """The channel to a worker process, controller side.
+
+    Attributes:
+        relay: the LVAPPRelay that accepted the channel
+        streams: the relayed WTP connections, conn_id -> RelayStream
+        pid: the pid of the worker (reported with the statistics)
+        stats: the last statistics reported by the worker
+    """
+
+    def __init__(self, stream, relay):
+
+        self.relay = relay
+        self.streams = {}
+        self.pid = None
+        self.stats = {}
+
+        RelayChannel.__init__(self, stream)
+
+        self.relay.coordinator.attach(self)
+
+    def send(self, opcode, conn_id, payload, callback=None):
+        """Send a relay message to the worker."""
+
+        # state changes must reach the worker before the data they caused
+        if opcode == RELAY_DATA:
+            self.relay.coordinator.flush()
+
+        super().send(opcode, conn_id, payload, callback)
+
+    def _on_message(self, opcode, conn_id, payload):
+        """Handle a relay message."""
+
+        if opcode == RELAY_DATA:
+
+            if conn_id in self.streams:
+                self.streams[conn_id].feed(payload)
+
+        elif opcode == RELAY_OPEN:
+
+            addr = tuple(json.loads(payload.decode()))
+            stream = RelayStream(self, conn_id)
+            self.streams[conn_id] = stream
+            self.relay.server.handle_stream(stream, addr)
+
+        elif opcode == RELAY_CLOSE:
+
+            if conn_id in self.streams:
+                self.streams[conn_id].on_close()
+
+        elif opcode in (RELAY_PAUSE, RELAY_RESUME):
+
+            if conn_id in self.streams:
+                self.streams[conn_id].paused = opcode == RELAY_PAUSE
+
+        elif opcode == RELAY_STATS:
+
+            self.stats = json.loads(payload.decode())
+            self.pid = self.stats.pop('pid', self.pid)
+
+        else:
+
+            LOG.error("Unknown relay opcode %u", opcode)
+
+    def _on_disconnect(self):
+        """The worker is gone, close all its WTP connections."""
+
+        LOG.error("LVAPP worker %s disconnected, closing %u connection(s)",
+                  self.pid, len(self.streams))
+
+        for stream in list(self.streams.values()):
+            stream.on_close()
+
+        self.relay.coordinator.detach(self)
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        out = dict(self.stats)
+
+        out['pid'] = self.pid
+        out['connections'] = len(self.streams)
+
+        return out
+
+
+class LVAPPRelay(TCPServer):
+    """Spawns the LVAPP worker processes and accepts their relay channels.
+
+    Attributes:
+        server: the LVAPPServer handling the relayed connections
+        port: the LVAPP port shared by the workers
+        workers: the number of worker processes
+        path: the unix socket used by the workers to reach the controller
+        coordinator: the StateCoordinator replicating the state to the
+            workers
+    """
+
+    def __init__(self, server, port, workers, coordinator):
+
+        TCPServer.__init__(self)
+
+        self.server = server
+        self.port = port
+        self.workers = workers
+        self.path = "/tmp/empower-lvapp-%u.sock" % os.getpid()
+        self.coordinator = coordinator
+        self.channels = []
+        self.processes = []
+        self.restarts = 0
+
+        self.add_socket(tornado.netutil.bind_unix_socket(self.path))
+
+        atexit.register(self.stop_workers)
+
+        for _ in range(self.workers):
+            self.start_worker()
+
+        self.__checker = \
+            tornado.ioloop.PeriodicCallback(self.__check_workers,
+                                            WORKER_CHECK_INTERVAL)
+        self.__checker.start()
+
+    def handle_stream(self, stream, address):
+        self.channels = [c for c in self.channels if not c.stream.closed()]
+        self.channels.append(WorkerChannel(stream, self))
+
+    def start_worker(self):
+        """Start a new worker process."""
+
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [root] + [p for p in [env.get('PYTHONPATH')] if p])
+
+        cmd = [sys.executable, "-m", "empower.lvapp.lvappworker",
+               "--port=%u" % self.port, "--ipc=%s" % self.path,
+               "--window=%u" % self.server.probe_cache.window]
+
+        process = subprocess.Popen(cmd, env=env)
+        self.processes.append(process)
+
+        LOG.info("LVAPP worker %u started", process.pid)
+
+    def __check_workers(self):
+        """Restart the worker processes that exited."""
+
+        for process in list(self.processes):
+
+            if process.poll() is None:
+                continue
+
+            LOG.error("LVAPP worker %u exited (%d), restarting",
+                      process.pid, process.returncode)
+
+            self.processes.remove(process)
+            self.restarts += 1
+            self.start_worker()
+
+    def stop_workers(self):
+        """Terminate all the worker processes."""
+
+        self.__checker.stop()
+
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+
+        self.processes = []
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        channels = [c for c in self.channels if not c.stream.closed()]
+
+        return {'port': self.port,
+                'workers': [c.to_dict() for c in channels],
+                'restarts': self.restarts,
+                'connections': sum(len(c.streams) for c in channels)}
@@ -17,6 +17,8 @@
 
 """LVAP Protocol Server."""
 
+import time
+
 from tornado.tcpserver import TCPServer
 
 from empower.core.pnfpserver import BaseTenantPNFDevHandler
@@ -26,6 +28,12 @@ from empower.core.pnfpserver import PNFPServer
 from empower.core.module import ModuleWorker
 from empower.core.module import ModuleEventWorker
 from empower.lvapp.lvappconnection import LVAPPConnection
+from empower.lvapp.lvapprelay import LVAPPRelay
+from empower.lvapp.lvappcoordinator import StateCoordinator
+from empower.lvapp.probecache import ProbeCache
+from empower.lvapp.probecache import DEFAULT_WINDOW
+from empower.lvapp.probecache import DEFAULT_STA_RATE
+from empower.lvapp.probecache import DEFAULT_GLOBAL_RATE
 from empower.persistence.persistence import TblWTP
 from empower.core.wtp import WTP
 
@@ -85,35 +93,184 @@ class ModuleLVAPPWorker(ModuleWorker):
         ModuleWorker.__init__(self, LVAPPServer.__module__, module, pt_type,
                               pt_packet)
 
+        # request key -> [issuer module_id, subscribers module_ids, ts]
+        self.outstanding = {}
+
+        # request key -> (ts, response), the last response received
+        self.responses = {}
+
+        # issuer module_id -> key of its request waiting for a response
+        self.issued = {}
+
+        # module_id -> request key, request key -> number of modules
+        self.keys = {}
+        self.refs = {}
+
+        self.requests = {'issued': 0,
+                         'sent': 0,
+                         'shared': 0,
+                         'cached': 0}
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        out = dict(self.requests)
+
+        out['module_type'] = self.module.MODULE_NAME
+        out['modules'] = len(self.modules)
+        out['outstanding'] = len(self.outstanding)
+
+        if self.requests['issued']:
+            out['saved'] = 1 - self.requests['sent'] / self.requests['issued']
+
+        return out
+
+    def share_request(self, module, key):
+        """Share wire requests among modules polling the same target.
+
+        Must be called by a module right before sending a request. The key
+        identifies what the request targets (e.g. a block or an LVAP), the
+        same request sent by modules of different tenants/apps produces the
+        same response. Returns True if the module has been served without a
+        new request, i.e. it joined a request already outstanding or it got
+        a response not older than half its period. Returns False if the
+        module must send the request, whose response will then be fanned
+        out to all the modules subscribing to it in the meanwhile.
+        """
+
+        now = time.time()
+
+        self.__set_key(module.module_id, key)
+        self.requests['issued'] += 1
+
+        if key in self.outstanding:
+
+            issuer, subscribers, timestamp = self.outstanding[key]
+
+            # the response may have been lost, send a new request
+            if (now - timestamp) * 1000 < module.every:
+                subscribers.add(module.module_id)
+                self.requests['shared'] += 1
+                return True
+
+        if key in self.responses:
+
+            timestamp, response = self.responses[key]
+
+            if (now - timestamp) * 1000 < module.every / 2:
+                self.requests['cached'] += 1
+                module.handle_response(response)
+                return True
+
+        self.outstanding[key] = [module.module_id, set([module.module_id]),
+                                 now]
+        self.issued[module.module_id] = key
+        self.requests['sent'] += 1
+
+        return False
+
     def handle_packet(self, response):
         """Handle response message."""
 
-        if response.module_id not in self.modules:
+        key = self.issued.pop(response.module_id, None)
+        outstanding = self.outstanding.get(key)
+
+        if outstanding and outstanding[0] == response.module_id:
+            del self.outstanding[key]
+            self.responses[key] = (time.time(), response)
+            subscribers = outstanding[1]
+        else:
+            subscribers = [response.module_id]
+
+        self.log.info("Received %s response (id=%u, subscribers=%u)",
+                      self.module.MODULE_NAME, response.module_id,
+                      len(subscribers))
+
+        modules = [self.modules[x] for x in subscribers if x in self.modules]
+
+        if not modules:
+            return
+
+        # the work shared by the subscribers is done once
+        modules[0].process_response(response, modules)
+
+        for module in modules:
+            module.handle_response(response)
+
+    def remove_module(self, module_id):
+        """Remove a module and the requests no other module refers to."""
+
+        ModuleWorker.remove_module(self, module_id)
+
+        key = self.keys.pop(module_id, None)
+
+        if key is not None:
+            self.__release(key)
+
+    def __set_key(self, module_id, key):
+        """Set the request key of a module, release the previous one."""
+
+        previous = self.keys.get(module_id)
+
+        if previous == key:
+            return
+
+        self.keys[module_id] = key
+        self.refs[key] = self.refs.get(key, 0) + 1
+
+        if previous is not None:
+            self.__release(previous)
+
+    def __release(self, key):
+        """Drop a reference to key, drop the outstanding request and the
+        last response of key if no other module refers to it."""
+
+        self.refs[key] -= 1
+
+        if self.refs[key]:
             return
 
-        module = self.modules[response.module_id]
+        del self.refs[key]
 
-        self.log.info("Received %s response (id=%u)", self.module.MODULE_NAME,
-                      response.module_id)
+        outstanding = self.outstanding.pop(key, None)
 
-        module.handle_response(response)
+        if outstanding and self.issued.get(outstanding[0]) == key:
+            del self.issued[outstanding[0]]
+
+        self.responses.pop(key, None)
 
 
 class LVAPPServer(PNFPServer, TCPServer):
-    """Exposes the LVAP API."""
+    """Exposes the LVAP API.
+
+    If workers is greater than zero the WTP connections are accepted by
+    the given number of worker processes sharing the LVAPP port and relayed
+    to this server (see lvapprelay), otherwise the server listens on the
+    LVAPP port directly.
+    """
 
     PNFDEV = WTP
     TBL_PNFDEV = TblWTP
 
-    def __init__(self, port, pt_types, pt_types_handlers):
+    def __init__(self, port, pt_types, pt_types_handlers, workers=0,
+                 probe_cache=None):
 
         PNFPServer.__init__(self, pt_types, pt_types_handlers)
         TCPServer.__init__(self)
 
         self.port = int(port)
+        self.workers = int(workers)
         self.connection = None
+        self.relay = None
+        self.coordinator = None
+        self.probe_cache = probe_cache or ProbeCache()
 
-        self.listen(self.port)
+        if self.workers > 0:
+            self.coordinator = StateCoordinator()
+            self.relay = LVAPPRelay(self, self.port, self.workers,
+                                    self.coordinator)
+        else:
+            self.listen(self.port)
 
         self.lvaps = {}
         self.__assoc_id = 0
@@ -122,6 +279,18 @@ class LVAPPServer(PNFPServer, TCPServer):
         self.log.info('Incoming connection from %r', address)
         self.connection = LVAPPConnection(stream, address, server=self)
 
+    def to_dict(self):
+        """ Return a dict representation of the object. """
+
+        out = super().to_dict()
+        out['probes'] = self.probe_cache.to_dict()
+
+        if self.relay:
+            out['relay'] = self.relay.to_dict()
+            out['relay']['state'] = self.coordinator.to_dict()
+
+        return out
+
     @property
     def assoc_id(self):
         """ Return next association id. """
@@ -130,10 +299,22 @@ class LVAPPServer(PNFPServer, TCPServer):
         return self.__assoc_id
 
 
-def launch(port=DEFAULT_PORT):
+def launch(port=DEFAULT_PORT, workers=0, probe_window=DEFAULT_WINDOW,
+           sta_probe_rate=DEFAULT_STA_RATE,
+           global_probe_rate=DEFAULT_GLOBAL_RATE):
     """Start LVAPP Server Module."""
 
-    server = LVAPPServer(int(port), PT_TYPES, PT_TYPES_HANDLERS)
+    sta_probe_rate = float(sta_probe_rate)
+    global_probe_rate = float(global_probe_rate)
+
+    probe_cache = ProbeCache(window=int(probe_window),
+                             sta_rate=sta_probe_rate,
+                             sta_burst=2 * sta_probe_rate,
+                             global_rate=global_probe_rate,
+                             global_burst=2 * global_probe_rate)
+
+    server = LVAPPServer(int(port), PT_TYPES, PT_TYPES_HANDLERS, int(workers),
+                         probe_cache)
 
     rest_server = RUNTIME.components[RESTServer.__module__]
     rest_server.add_handler_class(TenantWTPHandler, server)
@@ -144,5 +325,6 @@ def launch(port=DEFAULT_PORT):
     rest_server.add_handler_class(TenantLVAPPortHandler, server)
     rest_server.add_handler_class(TenantLVAPNextHandler, server)
 
-    server.log.info("LVAP Server available at %u", server.port)
+    server.log.info("LVAP Server available at %u (%u workers)", server.port,
+                    server.workers)
     return server
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""LVAPP worker process.
+
+Accepts WTP connections on the LVAPP port (shared with the other workers
+through SO_REUSEPORT, the kernel balances incoming connections across the
+workers), frames and decodes the messages of its WTPs, drops the ones the
+controller would ignore using the state replicated by the controller and
+forwards the others. See lvapprelay.
+
+Reading from the WTPs is paused while the channel to the controller is
+congested, the controller is told when a WTP is not keeping up with the
+data sent to it.
+
+Started by the controller with:
+
+    python3 -m empower.lvapp.lvappworker --port=<port> --ipc=<path> \
+        --window=<probe window in ms>
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import logging
+import tornado.ioloop
+import tornado.netutil
+import tornado.iostream
+
+from argparse import ArgumentParser
+from tornado.tcpserver import TCPServer
+
+from empower.lvapp import PT_PROBE_REQUEST
+from empower.lvapp import PROBE_REQUEST
+from empower.lvapp import PT_AUTH_REQUEST
+from empower.lvapp import AUTH_REQUEST
+from empower.lvapp import PT_ASSOC_REQUEST
+from empower.lvapp import ASSOC_REQUEST
+from empower.lvapp.lvapprelay import RELAY_OPEN
+from empower.lvapp.lvapprelay import RELAY_DATA
+from empower.lvapp.lvapprelay import RELAY_CLOSE
+from empower.lvapp.lvapprelay import RELAY_PAUSE
+from empower.lvapp.lvapprelay import RELAY_RESUME
+from empower.lvapp.lvapprelay import RELAY_STATE
+from empower.lvapp.lvapprelay import RELAY_STATS
+from empower.lvapp.lvapprelay import READ_CHUNK_SIZE
+from empower.lvapp.lvapprelay import RelayChannel
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+# Fixed LVAPP header (version, type, length)
+HEADER_FORMAT = struct.Struct("!BBH")
+
+# Pending bytes on a WTP connection above which the controller is told to
+# stop polling the WTP
+HIGH_WATER_MARK = 262144
+
+# How often the statistics are sent to the controller and the probe
+# history is pruned (ms)
+STATS_INTERVAL = 5000
+
+# The messages handled by the worker and their parsers
+FILTERED = {PT_PROBE_REQUEST: PROBE_REQUEST,
+            PT_AUTH_REQUEST: AUTH_REQUEST,
+            PT_ASSOC_REQUEST: ASSOC_REQUEST}
+
+
+class StateReplica(object):
+    """The controller state replicated to this worker (see
+    lvappcoordinator), used to drop the messages the controller would
+    ignore.
+
+    Attributes:
+        window: the probe window in seconds, probe requests from the same
+            station and WTP are forwarded at most once per window
+        state: the replicated sets ("allowed", "denied", "lvaps", "wtps")
+            of 6 bytes addresses
+        probes: (sta, wtp) -> time the last probe request was forwarded
+        stats: the messages received, forwarded and dropped (per reason)
+    """
+
+    def __init__(self, window):
+
+        self.window = window / 1000
+        self.state = {'allowed': set(),
+                      'denied': set(),
+                      'lvaps': set(),
+                      'wtps': set()}
+        self.probes = {}
+        self.stats = {'received': 0,
+                      'forwarded': 0,
+                      'lvap': 0,
+                      'acl': 0,
+                      'ssid': 0,
+                      'duplicate': 0}
+
+    def apply(self, update):
+        """Apply a state message."""
+
+        if update['reset']:
+            for entries in self.state.values():
+                entries.clear()
+
+        for key, addr, present in update['updates']:
+
+            addr = bytes.fromhex(addr.replace(':', ''))
+
+            if present:
+                self.state[key].add(addr)
+            else:
+                self.state[key].discard(addr)
+
+    def admit(self, msg_type, frame):
+        """Return True if the message must be forwarded."""
+
+        self.stats['received'] += 1
+
+        reason = None
+
+        if msg_type == PT_PROBE_REQUEST:
+            reason = self.probe_filter(PROBE_REQUEST.parse(frame))
+        elif msg_type in FILTERED:
+            reason = self.request_filter(FILTERED[msg_type].parse(frame))
+
+        if reason:
+            self.stats[reason] += 1
+            return False
+
+        self.stats['forwarded'] += 1
+        return True
+
+    def acl_filter(self, sta):
+        """Return "acl" if sta is not allowed or is denied."""
+
+        allowed = self.state['allowed']
+
+        if allowed and sta not in allowed:
+            return "acl"
+
+        if sta in self.state['denied']:
+            return "acl"
+
+        return None
+
+    def probe_filter(self, request):
+        """Return the reason why the probe request must be dropped, None if
+        it must be forwarded."""
+
+        sta = request.sta
+
+        if sta in self.state['lvaps']:
+            return "lvap"
+
+        if self.acl_filter(sta):
+            return "acl"
+
+        if request.wtp not in self.state['wtps']:
+            return "ssid"
+
+        now = time.time()
+        key = (sta, request.wtp)
+
+        if now - self.probes.get(key, 0) < self.window:
+            return "duplicate"
+
+        self.probes[key] = now
+
+        return None
+
+    def request_filter(self, request):
+        """Return the reason why the auth/assoc request must be dropped,
+        None if it must be forwarded."""
+
+        if request.sta not in self.state['lvaps']:
+            return "lvap"
+
+        return self.acl_filter(request.sta)
+
+    def prune(self):
+        """Drop the probe history older than the window."""
+
+        deadline = time.time() - self.window
+
+        for key in [k for k, v in self.probes.items() if v < deadline]:
+            del self.probes[key]
+
+
+class WorkerConnection(object):
+    """A WTP connection owned by this worker.
+
+    Attributes:
+        worker: the LVAPPWorker owning the connection
+        conn_id: the connection id
+        stream: the WTP IOStream
+        pending_bytes: the bytes written to the WTP not yet on the wire
+        paused: True if the controller has been told the WTP is congested
+    """
+
+    def __init__(self, worker, conn_id, stream):
+
+        self.worker = worker
+        self.conn_id = conn_id
+        self.stream = stream
+        self.pending_bytes = 0
+        self.paused = False
+        self.__buffer = bytearray()
+        self.stream.set_nodelay(True)
+        self.stream.set_close_callback(self._on_disconnect)
+        self.wait()
+
+    def write(self, data):
+        """Write data received from the controller to the WTP."""
+
+        if self.stream.closed():
+            return
+
+        self.pending_bytes += len(data)
+        self.stream.write(data, self._on_written)
+
+        if not self.paused and self.pending_bytes >= HIGH_WATER_MARK:
+            self.paused = True
+            self.worker.channel.send(RELAY_PAUSE, self.conn_id, b'')
+
+    def _on_written(self):
+        """All the buffered data has been written."""
+
+        self.pending_bytes = 0
+
+        if self.paused:
+            self.paused = False
+            self.worker.channel.send(RELAY_RESUME, self.conn_id, b'')
+
+    def wait(self):
+        """Wait for incoming data, unless the channel is congested."""
+
+        if self.stream.closed():
+            return
+
+        if self.worker.channel.congested:
+            self.worker.blocked.add(self)
+            return
+
+        self.stream.read_bytes(READ_CHUNK_SIZE, self._on_read, partial=True)
+
+    def _on_read(self, data):
+        """Extract the complete messages from the buffer and forward the
+        admitted ones to the controller with a single relay message."""
+
+        self.__buffer.extend(data)
+
+        offset = 0
+        forward = []
+
+        with memoryview(self.__buffer) as view:
+
+            while len(view) - offset >= HEADER_FORMAT.size:
+
+                _, msg_type, length = \
+                    HEADER_FORMAT.unpack_from(view, offset)
+
+                if length < HEADER_FORMAT.size:
+                    LOG.error("Invalid message length %u", length)
+                    self.stream.close()
+                    return
+
+                if len(view) - offset < length:
+                    break
+
+                try:
+                    with view[offset:offset + length] as frame:
+                        if self.worker.replica.admit(msg_type, frame):
+                            forward.append(bytes(frame))
+                except Exception:
+                    LOG.exception("Unable to parse message type %u", msg_type)
+                    self.stream.close()
+                    return
+
+                offset += length
+
+        del self.__buffer[:offset]
+
+        if forward:
+            self.worker.channel.send(RELAY_DATA, self.conn_id,
+                                     b''.join(forward))
+
+        self.wait()
+
+    def _on_disconnect(self):
+        """Notify the controller."""
+
+        self.worker.blocked.discard(self)
+
+        if self.worker.connections.pop(self.conn_id, None):
+            self.worker.channel.send(RELAY_CLOSE, self.conn_id, b'')
+
+
+class ControllerChannel(RelayChannel):
+    """The channel to the controller, worker side."""
+
+    def __init__(self, stream, worker):
+
+        self.worker = worker
+
+        RelayChannel.__init__(self, stream)
+
+    def _on_message(self, opcode, conn_id, payload):
+        """Handle a relay message."""
+
+        if opcode == RELAY_STATE:
+            self.worker.replica.apply(json.loads(payload.decode()))
+            return
+
+        if conn_id not in self.worker.connections:
+            return
+
+        connection = self.worker.connections[conn_id]
+
+        if opcode == RELAY_DATA:
+            connection.write(payload)
+        elif opcode == RELAY_CLOSE:
+            del self.worker.connections[conn_id]
+            connection.stream.close()
+        else:
+            LOG.error("Unknown relay opcode %u", opcode)
+
+    def _on_drained(self):
+        """Resume reading from the WTPs."""
+
+        self.worker.resume()
+
+    def _on_disconnect(self):
+        """The controller is gone, exit."""
+
+        LOG.info("Controller disconnected, exiting")
+        tornado.ioloop.IOLoop.current().stop()
+
+
+class LVAPPWorker(TCPServer):
+    """LVAPP worker.
+
+    Attributes:
+        port: the LVAPP port
+        path: the unix socket of the controller
+        replica: the replicated controller state
+        connections: the WTP connections owned by this worker
+        blocked: the connections not reading while the channel is
+            congested
+        channel: the channel to the controller
+    """
+
+    def __init__(self, port, path, window):
+
+        TCPServer.__init__(self)
+
+        self.port = port
+        self.path = path
+        self.replica = StateReplica(window)
+        self.connections = {}
+        self.blocked = set()
+        self.channel = None
+        self.__conn_id = 0
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stream = tornado.iostream.IOStream(sock)
+        stream.set_close_callback(self._on_connect_failed)
+        stream.connect(self.path, lambda: self._on_connected(stream))
+
+    def _on_connect_failed(self):
+        """The controller is not available, exit."""
+
+        LOG.error("Unable to connect to %s, exiting", self.path)
+        tornado.ioloop.IOLoop.current().stop()
+
+    def _on_connected(self, stream):
+        """Start accepting WTP connections."""
+
+        self.channel = ControllerChannel(stream, self)
+
+        self.add_sockets(tornado.netutil.bind_sockets(self.port,
+                                                      reuse_port=True))
+
+        self.send_stats()
+        tornado.ioloop.PeriodicCallback(self.send_stats,
+                                        STATS_INTERVAL).start()
+
+        LOG.info("LVAPP worker available at %u", self.port)
+
+    def handle_stream(self, stream, address):
+
+        self.__conn_id += 1
+
+        self.channel.send(RELAY_OPEN, self.__conn_id,
+                          json.dumps(address).encode())
+
+        self.connections[self.__conn_id] = \
+            WorkerConnection(self, self.__conn_id, stream)
+
+    def resume(self):
+        """Resume reading from the blocked connections."""
+
+        blocked = self.blocked
+        self.blocked = set()
+
+        for connection in blocked:
+            connection.wait()
+
+    def send_stats(self):
+        """Send the statistics to the controller, prune the probe
+        history."""
+
+        self.replica.prune()
+
+        stats = dict(self.replica.stats)
+
+        stats['pid'] = os.getpid()
+        stats['blocked'] = len(self.blocked)
+        stats['probes'] = len(self.replica.probes)
+
+        self.channel.send(RELAY_STATS, 0, json.dumps(stats).encode())
+
+
+def main(argv):
+    """Start the LVAPP worker."""
+
+    parser = ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--ipc", required=True)
+    parser.add_argument("--window", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    LVAPPWorker(args.port, args.ipc, args.window)
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
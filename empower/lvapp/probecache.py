@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Probe request cache.
+
+A station probing the network is usually heard by several WTPs, each one
+reporting every probe request to the controller. The cache collapses the
+probe requests received for the same station within a time window, the
+LVAP is then spawned only once, on one of the WTPs that heard the station.
+The probe requests opening a window are also rate limited per station and
+globally using token buckets, the ones received while the window is open
+only add a hearer and are never limited.
+"""
+
+import time
+import tornado.ioloop
+
+from empower.core.tenant import T_TYPE_SHARED
+
+from empower.main import RUNTIME
+
+import empower.logger
+LOG = empower.logger.get_logger()
+
+# Aggregation window in ms, probes from the same station received within
+# the window are collapsed into a single one
+DEFAULT_WINDOW = 50
+
+# Per-station rate limit (probes/s and burst)
+DEFAULT_STA_RATE = 10
+DEFAULT_STA_BURST = 20
+
+# Global rate limit (probes/s and burst)
+DEFAULT_GLOBAL_RATE = 1000
+DEFAULT_GLOBAL_BURST = 2000
+
+# How often idle per-station buckets are dropped (ms)
+PRUNE_INTERVAL = 10000
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter.
+
+    Attributes:
+        rate: the tokens added every second
+        burst: the bucket size
+    """
+
+    def __init__(self, rate, burst):
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.time()
+
+    def refill(self, now):
+        """Add the tokens accumulated since the last refill."""
+
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def consume(self, now):
+        """Consume a token, return False if the bucket is empty."""
+
+        self.refill(now)
+
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+
+class ProbeCache(object):
+    """Probe request cache.
+
+    The first probe request from a station opens a window. Probe requests
+    received from the same station until the window closes only add their
+    WTP to the set of hearers, without consuming tokens, so that the LVAP
+    is spawned knowing all the hearers. When the window closes the LVAP is
+    spawned on the least loaded hearer. With a zero window the LVAP is
+    spawned as soon as the first probe request is received.
+
+    Attributes:
+        window: the aggregation window in ms
+        sta_rate: per-station rate limit (probes/s)
+        sta_burst: per-station burst
+        global_rate: global rate limit (probes/s)
+        global_burst: global burst
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, sta_rate=DEFAULT_STA_RATE,
+                 sta_burst=DEFAULT_STA_BURST, global_rate=DEFAULT_GLOBAL_RATE,
+                 global_burst=DEFAULT_GLOBAL_BURST):
+
+        self.window = window
+        self.sta_rate = sta_rate
+        self.sta_burst = sta_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+
+        # sta -> TokenBucket
+        self.buckets = {}
+
+        # sta -> {wtp: (connection, request)}, the wtps that heard sta
+        self.pending = {}
+
+        self.stats = {'received': 0,
+                      'absorbed': 0,
+                      'sta_limited': 0,
+                      'global_limited': 0,
+                      'spawned': 0}
+
+        self.__pruner = tornado.ioloop.PeriodicCallback(self.__prune,
+                                                        PRUNE_INTERVAL)
+        self.__pruner.start()
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        out = dict(self.stats)
+
+        out['window'] = self.window
+        out['pending'] = len(self.pending)
+        out['buckets'] = len(self.buckets)
+
+        return out
+
+    def probe(self, sta, wtp, connection, request):
+        """Handle a probe request from sta reported by wtp."""
+
+        self.stats['received'] += 1
+
+        # window already open, just add the hearer
+        if sta in self.pending:
+            self.stats['absorbed'] += 1
+            self.pending[sta][wtp] = (connection, request)
+            return
+
+        now = time.time()
+
+        if sta not in self.buckets:
+            self.buckets[sta] = TokenBucket(self.sta_rate, self.sta_burst)
+
+        if not self.buckets[sta].consume(now):
+            self.stats['sta_limited'] += 1
+            return
+
+        if not self.global_bucket.consume(now):
+            self.stats['global_limited'] += 1
+            return
+
+        self.pending[sta] = {wtp: (connection, request)}
+
+        if not self.window:
+            self.__spawn(sta)
+            return
+
+        tornado.ioloop.IOLoop.current().call_later(self.window / 1000,
+                                                   self.__spawn, sta)
+
+    def __spawn(self, sta):
+        """Close the window and spawn the LVAP on the best hearer."""
+
+        hearers = self.pending.pop(sta, {})
+
+        # the lvap has been created in the meanwhile (e.g. status lvap)
+        if sta in RUNTIME.lvaps:
+            return
+
+        # only the wtps with at least a non-shared tenant can spawn lvaps
+        candidates = [wtp for wtp, (conn, _) in hearers.items()
+                      if wtp.connection is conn and self.__has_ssids(wtp)]
+
+        if not candidates:
+            return
+
+        wtp = min(candidates, key=lambda x: len(RUNTIME.load_wtp_lvaps(x)))
+        connection, request = hearers[wtp]
+
+        self.stats['spawned'] += 1
+
+        connection.spawn_lvap(sta, request)
+
+    @classmethod
+    def __has_ssids(cls, wtp):
+        """Return True if wtp belongs to at least one non-shared
+        tenant."""
+
+        return any(tenant.bssid_type != T_TYPE_SHARED
+                   for tenant in RUNTIME.load_tenants(wtp.addr).values())
+
+    def __prune(self):
+        """Drop the buckets of the stations that are not probing anymore,
+        i.e. whose bucket is full."""
+
+        now = time.time()
+
+        for sta in list(self.buckets.keys()):
+            bucket = self.buckets[sta]
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self.buckets[sta]
@@ -345,6 +345,10 @@ class LVNFPMainHandler(tornado.websocket.WebSocketHandler):
                 virtual_port.next.lvnf = lvnf
                 virtual_port.next.port = virtual_port
 
+                # keep track of the rules pointing to this port
+                if virtual_port_id in lvnf.ports:
+                    virtual_port.prev = lvnf.ports[virtual_port_id].prev
+
                 lvnf.ports[virtual_port.virtual_port_id] = virtual_port
 
             lvnf.returncode = status_lvnf['returncode']
@@ -29,6 +29,7 @@ from uuid import UUID
 from ipaddress import ip_address
 
 from empower.core.core import EmpowerRuntime
+from empower.core.cqm import DEFAULT_MAX_AGE
 
 RUNTIME = None
 
@@ -76,10 +77,14 @@ class EmpowerOptions(Options):
         self.ctrl_ip = ip_address("192.168.100.158")
         self.ctrl_port = 5533
         self.ctrl_adv_iface = "wlp2s0"
+        self.cqm_max_age = DEFAULT_MAX_AGE
 
     def _set_ctrl_port(self, given_name, name, value):
         self.ctrl_port = int(value)
 
+    def _set_cqm_max_age(self, given_name, name, value):
+        self.cqm_max_age = int(value)
+
     def _set_ctrl_ip(self, given_name, name, value):
         self.ctrl_ip = ip_address(value)
 
@@ -118,6 +123,8 @@ Notable options include:
   --ctrl-adv            Advertise controller (bool, default is false)
   --ctrl-ip=<ip>        Controller address (ip, default is 192.168.100.158)
   --ctrl-port=<port>    Controller port (int, default is 5533)
+  --cqm-max-age=<s>     Min age of the expired UCQM/NCQM rows (int, default
+                        is 120, 0 never expires the rows)
 
 C1, C2, etc. are component names (e.g., Python modules). The supported options
 are up to the module.
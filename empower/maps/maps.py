@@ -17,6 +17,8 @@
 
 """Common channel quality and conflict maps module."""
 
+import time
+
 from construct import UBInt8
 from construct import UBInt16
 from construct import UBInt32
@@ -28,6 +30,7 @@ from construct import Struct
 from construct import Array
 
 from empower.datatypes.etheraddress import EtherAddress
+from empower.core.codec import compile_struct
 from empower.core.module import Module
 from empower.core.resourcepool import CQM
 from empower.core.resourcepool import ResourceBlock
@@ -37,6 +40,9 @@ from empower.lvapp import PT_VERSION
 from empower.main import RUNTIME
 
 
+# Metrics recorded in the time-series store
+METRICS = ['last_rssi_avg', 'last_rssi_std', 'last_packets', 'mov_rssi']
+
 POLLER_ENTRY_TYPE = Sequence("img_entries",
                              Bytes("addr", 6),
                              UBInt8("last_rssi_std"),
@@ -45,23 +51,26 @@ POLLER_ENTRY_TYPE = Sequence("img_entries",
                              UBInt32("hist_packets"),
                              SBInt8("mov_rssi"))
 
-POLLER_REQUEST = Struct("poller_request", UBInt8("version"),
-                        UBInt8("type"),
-                        UBInt16("length"),
-                        UBInt32("seq"),
-                        UBInt32("module_id"),
-                        Bytes("hwaddr", 6),
-                        UBInt8("channel"),
-                        UBInt8("band"))
-
-POLLER_RESPONSE = Struct("poller_response", UBInt8("version"),
-                         UBInt8("type"),
-                         UBInt16("length"),
-                         UBInt32("seq"),
-                         UBInt32("module_id"),
-                         Bytes("wtp", 6),
-                         UBInt16("nb_entries"),
-                         Array(lambda ctx: ctx.nb_entries, POLLER_ENTRY_TYPE))
+POLLER_REQUEST = \
+    compile_struct(Struct("poller_request", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          UBInt32("module_id"),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band")))
+
+POLLER_RESPONSE = \
+    compile_struct(Struct("poller_response", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          UBInt32("module_id"),
+                          Bytes("wtp", 6),
+                          UBInt16("nb_entries"),
+                          Array(lambda ctx: ctx.nb_entries,
+                                POLLER_ENTRY_TYPE)))
 
 
 class Maps(Module):
@@ -78,12 +87,19 @@ class Maps(Module):
         # parameters
         self._block = None
 
-        # data structures
-        self.maps = CQM()
-
     def __eq__(self, other):
         return super().__eq__(other) and self.block == other.block
 
+    @property
+    def maps(self):
+        """Return the view of the block row in the channel quality matrix
+        of this module."""
+
+        if not self.block:
+            return CQM()
+
+        return getattr(RUNTIME, self.MODULE_NAME).view(self.block)
+
     @property
     def block(self):
         return self._block
@@ -156,6 +172,13 @@ class Maps(Module):
             self.log.info("WTP %s not connected", wtp.addr)
             return
 
+        if wtp.connection.congested:
+            self.log.info("WTP %s congested", wtp.addr)
+            return
+
+        if self.worker.share_request(self, self.block):
+            return
+
         req = Container(version=PT_VERSION,
                         type=self.PT_REQUEST,
                         length=26,
@@ -170,36 +193,42 @@ class Maps(Module):
                       self.MODULE_NAME, self.block, self.module_id)
 
         msg = POLLER_REQUEST.build(req)
-        wtp.connection.stream.write(msg)
+        wtp.connection.send_message(msg)
 
-    def handle_response(self, response):
-        """Handle an incoming poller response message.
+    def process_response(self, response, modules):
+        """Update the block row with an incoming poller response message,
+        once for all the modules sharing the request.
         Args:
-            message, a poller response message
+            response, a poller response message
+            modules, the modules sharing the request
         Returns:
             None
         """
 
-        # update cache
-        setattr(self.block, self.MODULE_NAME, CQM())
-        map_entry_block = getattr(self.block, self.MODULE_NAME)
+        entries = [(EtherAddress(x[0]),) + tuple(x[1:])
+                   for x in response.img_entries]
 
-        # update this object
-        self.maps = CQM()
+        # the row is kept for a few periods of the slowest module
+        period = max(x.every for x in modules) / 1000
 
-        for entry in response.img_entries:
+        # update the block row in place
+        getattr(RUNTIME, self.MODULE_NAME).update(self.block, entries,
+                                                  period=period)
 
-            addr = EtherAddress(entry[0])
+    def handle_response(self, response):
+        """Handle an incoming poller response message, the block row has
+        already been updated by process_response.
+        Args:
+            message, a poller response message
+        Returns:
+            None
+        """
 
-            value = {'addr': addr,
-                     'last_rssi_std': entry[1],
-                     'last_rssi_avg': entry[2],
-                     'last_packets': entry[3],
-                     'hist_packets': entry[4],
-                     'mov_rssi': entry[5]}
+        timestamp = time.time()
 
-            map_entry_block[addr] = value
-            self.maps[addr] = value
+        for addr, value in self.maps.items():
+            for metric in METRICS:
+                self.record(addr, metric, value[metric], timestamp)
 
         # call callback
         self.handle_callback(self)
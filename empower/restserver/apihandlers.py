@@ -58,10 +58,16 @@ class EmpowerAPIHandler(tornado.web.RequestHandler):
             self.finish(json.dumps(out))
 
     def write_as_json(self, value):
-        """Return reply as a json document."""
+        """Return reply as a compact json document, indented and with
+        sorted keys if the pretty argument is set (e.g. ?pretty=1)."""
 
-        self.write(json.dumps(value, sort_keys=True, indent=4,
-                              cls=EmpowerEncoder))
+        if self.get_argument("pretty", "0") not in ("0", "false"):
+            self.write(json.dumps(value, sort_keys=True, indent=4,
+                                  cls=EmpowerEncoder))
+            return
+
+        for chunk in RUNTIME.json_serializer.iterencode(value):
+            self.write(chunk)
 
     def prepare(self):
         """Prepare to handler reply."""
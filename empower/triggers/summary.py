@@ -17,6 +17,8 @@
 
 """Summary triggers module."""
 
+import time
+
 from construct import Container
 from construct import Struct
 from construct import SBInt8
@@ -33,6 +35,7 @@ from construct import Padding
 from construct import Bit
 
 from empower.core.app import EmpowerApp
+from empower.core.codec import compile_struct
 from empower.datatypes.etheraddress import EtherAddress
 from empower.lvapp import PT_VERSION
 from empower.lvapp.lvappserver import ModuleLVAPPWorker
@@ -40,6 +43,7 @@ from empower.lvapp import PT_CAPS
 from empower.core.resourcepool import ResourceBlock
 from empower.core.resourcepool import ResourcePool
 from empower.core.module import Module
+from empower.triggers.summaryframes import SummaryFrames
 
 from empower.main import RUNTIME
 
@@ -47,17 +51,18 @@ PT_ADD_SUMMARY = 0x22
 PT_SUMMARY = 0x23
 PT_DEL_SUMMARY = 0x24
 
-ADD_SUMMARY = Struct("add_summary", UBInt8("version"),
-                     UBInt8("type"),
-                     UBInt16("length"),
-                     UBInt32("seq"),
-                     UBInt32("module_id"),
-                     Bytes("addr", 6),
-                     Bytes("hwaddr", 6),
-                     UBInt8("channel"),
-                     UBInt8("band"),
-                     SBInt16("limit"),
-                     UBInt16("period"))
+ADD_SUMMARY = \
+    compile_struct(Struct("add_summary", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          UBInt32("module_id"),
+                          Bytes("addr", 6),
+                          Bytes("hwaddr", 6),
+                          UBInt8("channel"),
+                          UBInt8("band"),
+                          SBInt16("limit"),
+                          UBInt16("period")))
 
 SUMMARY_ENTRY = Sequence("frames",
                          Bytes("ra", 6),
@@ -74,20 +79,22 @@ SUMMARY_ENTRY = Sequence("frames",
                          UBInt8("subtype"),
                          UBInt32("length"))
 
-SUMMARY_TRIGGER = Struct("summary", UBInt8("version"),
-                         UBInt8("type"),
-                         UBInt16("length"),
-                         UBInt32("seq"),
-                         UBInt32("module_id"),
-                         Bytes("wtp", 6),
-                         UBInt16("nb_entries"),
-                         Array(lambda ctx: ctx.nb_entries, SUMMARY_ENTRY))
+SUMMARY_TRIGGER = \
+    compile_struct(Struct("summary", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          UBInt32("module_id"),
+                          Bytes("wtp", 6),
+                          UBInt16("nb_entries"),
+                          Array(lambda ctx: ctx.nb_entries, SUMMARY_ENTRY)))
 
-DEL_SUMMARY = Struct("del_summary", UBInt8("version"),
-                     UBInt8("type"),
-                     UBInt16("length"),
-                     UBInt32("seq"),
-                     UBInt32("module_id"))
+DEL_SUMMARY = \
+    compile_struct(Struct("del_summary", UBInt8("version"),
+                          UBInt8("type"),
+                          UBInt16("length"),
+                          UBInt32("seq"),
+                          UBInt32("module_id")))
 
 
 class Summary(Module):
@@ -107,7 +114,7 @@ class Summary(Module):
         self._period = 2000
 
         # data structures
-        self.frames = []
+        self.frames = SummaryFrames()
 
     def __eq__(self, other):
 
@@ -244,7 +251,7 @@ class Summary(Module):
                       self.MODULE_NAME, self.block, self.module_id)
 
         msg = ADD_SUMMARY.build(req)
-        wtp.connection.stream.write(msg)
+        wtp.connection.send_message(msg)
 
     def handle_response(self, response):
         """Handle an incoming response message.
@@ -254,87 +261,28 @@ class Summary(Module):
             None
         """
 
-        self.frames = []
-
-        for recv in response.frames:
-
-            if recv[3].mcs:
-                rate = int(recv[6])
-            else:
-                rate = float(recv[6]) / 2
-
-            if recv[3].mcs:
-                rtype = "HT"
-            else:
-                rtype = "LE"
-
-            if recv[7] == 0x00:
-                pt_type = "MNGT"
-            elif recv[7] == 0x04:
-                pt_type = "CTRL"
-            elif recv[7] == 0x08:
-                pt_type = "DATA"
-            else:
-                pt_type = "DATA (%s)" % recv[7]
-
-            if pt_type == "MNGT":
-
-                if recv[8] == 0x00:
-                    pt_subtype = "ASSOCREQ"
-                elif recv[8] == 0x10:
-                    pt_subtype = "ASSOCRESP"
-                elif recv[8] == 0x20:
-                    pt_subtype = "AUTHREQ"
-                elif recv[8] == 0x30:
-                    pt_subtype = "AUTHRESP"
-                elif recv[8] == 0x40:
-                    pt_subtype = "PROBEREQ"
-                elif recv[8] == 0x50:
-                    pt_subtype = "PROBERESP"
-                elif recv[8] == 0x80:
-                    pt_subtype = "BEACON"
-                elif recv[8] == 0x90:
-                    pt_subtype = "ATIM"
-                elif recv[8] == 0xA0:
-                    pt_subtype = "DISASSOC"
-                elif recv[8] == 0xb0:
-                    pt_subtype = "AUTH"
-                elif recv[8] == 0xc0:
-                    pt_subtype = "DEAUTH"
-                elif recv[8] == 0xd0:
-                    pt_subtype = "ACTION"
-                else:
-                    pt_subtype = "MNGT (%s)" % recv[8]
-
-            elif pt_type == "CTRL":
-
-                pt_subtype = "UNKN (%s)" % recv[8]
-
-            elif pt_type == "DATA":
-
-                if recv[8] == 0x00:
-                    pt_subtype = "DATA"
-                elif recv[8] == 0x40:
-                    pt_subtype = "DATA"
-                elif recv[8] == 0x80:
-                    pt_subtype = "QOS"
-                elif recv[8] == 0xC0:
-                    pt_subtype = "QOSNULL"
-                else:
-                    pt_subtype = "UNKN (%s)" % recv[8]
-
-            frame = {'ra': EtherAddress(recv[0]),
-                     'ta': EtherAddress(recv[1]),
-                     'tsft': recv[2],
-                     'seq': recv[4],
-                     'rssi': recv[5],
-                     'rate': rate,
-                     'rtype': rtype,
-                     'type': pt_type,
-                     'subtype': pt_subtype,
-                     'length': recv[9]}
-
-            self.frames.append(frame)
+        self.frames = SummaryFrames(response.frames)
+
+        # per transmitter averages
+        stats = {}
+
+        for ta, rssi, length in zip(self.frames.addrs('ta'),
+                                    self.frames.rssi, self.frames.length):
+
+            entry = stats.setdefault(ta, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += rssi
+            entry[2] += length
+
+        timestamp = time.time()
+
+        for ta, (frames, rssi, length) in stats.items():
+
+            addr = EtherAddress(ta)
+
+            self.record(addr, 'frames', frames, timestamp)
+            self.record(addr, 'rssi', rssi / frames, timestamp)
+            self.record(addr, 'length', length / frames, timestamp)
 
         self.handle_callback(self)
 
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Columnar storage of the frames reported by the summary trigger.
+
+Frames are stored as one typed array per field (addresses as 6 bytes
+records in a bytearray). The frame type and subtype names are decoded
+with lookup tables only when needed. Indexing a SummaryFrames object
+returns a SummaryFrame, a lazy read-only view of a single frame
+supporting the same keys as the dicts used before (ra, ta, tsft, seq,
+rssi, rate, rtype, type, subtype, length).
+"""
+
+from array import array
+
+from empower.datatypes.etheraddress import EtherAddress
+
+FIELDS = ['ra', 'ta', 'tsft', 'seq', 'rssi', 'rate', 'rtype', 'type',
+          'subtype', 'length']
+
+# frame type names, by type code
+TYPES = ["DATA (%u)" % x for x in range(256)]
+TYPES[0x00] = "MNGT"
+TYPES[0x04] = "CTRL"
+TYPES[0x08] = "DATA"
+
+# frame subtype names, by type code and subtype code
+MNGT_SUBTYPES = ["MNGT (%u)" % x for x in range(256)]
+MNGT_SUBTYPES[0x00] = "ASSOCREQ"
+MNGT_SUBTYPES[0x10] = "ASSOCRESP"
+MNGT_SUBTYPES[0x20] = "AUTHREQ"
+MNGT_SUBTYPES[0x30] = "AUTHRESP"
+MNGT_SUBTYPES[0x40] = "PROBEREQ"
+MNGT_SUBTYPES[0x50] = "PROBERESP"
+MNGT_SUBTYPES[0x80] = "BEACON"
+MNGT_SUBTYPES[0x90] = "ATIM"
+MNGT_SUBTYPES[0xA0] = "DISASSOC"
+MNGT_SUBTYPES[0xB0] = "AUTH"
+MNGT_SUBTYPES[0xC0] = "DEAUTH"
+MNGT_SUBTYPES[0xD0] = "ACTION"
+
+DATA_SUBTYPES = ["UNKN (%u)" % x for x in range(256)]
+DATA_SUBTYPES[0x00] = "DATA"
+DATA_SUBTYPES[0x40] = "DATA"
+DATA_SUBTYPES[0x80] = "QOS"
+DATA_SUBTYPES[0xC0] = "QOSNULL"
+
+UNKN_SUBTYPES = ["UNKN (%u)" % x for x in range(256)]
+
+SUBTYPES = [UNKN_SUBTYPES] * 256
+SUBTYPES[0x00] = MNGT_SUBTYPES
+SUBTYPES[0x08] = DATA_SUBTYPES
+
+
+def dictionary_encode(keys, decode):
+    """Encode a column as the list of its distinct values and the index of
+    the value of every row."""
+
+    values = {}
+    index = [values.setdefault(x, len(values)) for x in keys]
+
+    return {'values': [decode(x) for x in values], 'index': index}
+
+
+class SummaryFrame(object):
+    """A read-only view of a frame in a SummaryFrames object."""
+
+    __slots__ = ('frames', 'index')
+
+    def __init__(self, frames, index):
+
+        self.frames = frames
+        self.index = index
+
+    def __getitem__(self, key):
+
+        return self.frames.value(key, self.index)
+
+    def __contains__(self, key):
+        return key in FIELDS
+
+    def keys(self):
+        """Return the frame fields."""
+
+        return list(FIELDS)
+
+    def to_dict(self):
+        """Return JSON-serializable representation of the object."""
+
+        return {x: self[x] for x in FIELDS}
+
+
+class SummaryFrames(object):
+    """Frames reported by the summary trigger, stored by column.
+
+    Attributes:
+        tsft: the frames TSF timers
+        seq: the frames sequence numbers
+        rssi: the frames RSSI
+        rate: the frames rate codes (MCS index or rate in 500 Kbps)
+        mcs: 1 if the rate code is an MCS index, 0 otherwise
+        type: the frames type codes
+        subtype: the frames subtype codes
+        length: the frames length
+        ra: the frames receiver addresses (6 bytes per frame)
+        ta: the frames transmitter addresses (6 bytes per frame)
+    """
+
+    def __init__(self, entries=()):
+
+        self.tsft = array('Q')
+        self.seq = array('H')
+        self.rssi = array('b')
+        self.rate = array('B')
+        self.mcs = array('B')
+        self.type = array('B')
+        self.subtype = array('B')
+        self.length = array('I')
+        self.ra = bytearray()
+        self.ta = bytearray()
+
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        """Append a frame as parsed from a SUMMARY_ENTRY."""
+
+        self.ra += entry[0]
+        self.ta += entry[1]
+        self.tsft.append(entry[2])
+        self.mcs.append(1 if entry[3].mcs else 0)
+        self.seq.append(entry[4])
+        self.rssi.append(entry[5])
+        self.rate.append(entry[6])
+        self.type.append(entry[7])
+        self.subtype.append(entry[8])
+        self.length.append(entry[9])
+
+    def __len__(self):
+        return len(self.tsft)
+
+    def __getitem__(self, index):
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("frame index out of range")
+
+        return SummaryFrame(self, index)
+
+    def __iter__(self):
+
+        for index in range(len(self)):
+            yield SummaryFrame(self, index)
+
+    def value(self, key, index):
+        """Return the decoded value of field key of frame index."""
+
+        if key == 'ra' or key == 'ta':
+            raw = getattr(self, key)
+            return EtherAddress(bytes(raw[index * 6:index * 6 + 6]))
+
+        if key == 'rate':
+            rate = self.rate[index]
+            return int(rate) if self.mcs[index] else float(rate) / 2
+
+        if key == 'rtype':
+            return "HT" if self.mcs[index] else "LE"
+
+        if key == 'type':
+            return TYPES[self.type[index]]
+
+        if key == 'subtype':
+            return SUBTYPES[self.type[index]][self.subtype[index]]
+
+        if key in ('tsft', 'seq', 'rssi', 'length'):
+            return getattr(self, key)[index]
+
+        raise KeyError(key)
+
+    def addrs(self, key):
+        """Return the raw (6 bytes) addresses of column ra or ta."""
+
+        raw = bytes(getattr(self, key))
+
+        return [raw[x:x + 6] for x in range(0, len(raw), 6)]
+
+    def column(self, key):
+        """Return the decoded values of field key."""
+
+        if key == 'ra' or key == 'ta':
+            return [EtherAddress(x) for x in self.addrs(key)]
+
+        if key == 'rate':
+            return [int(r) if m else float(r) / 2
+                    for r, m in zip(self.rate, self.mcs)]
+
+        if key == 'rtype':
+            return ["HT" if x else "LE" for x in self.mcs]
+
+        if key == 'type':
+            return [TYPES[x] for x in self.type]
+
+        if key == 'subtype':
+            return [SUBTYPES[t][s] for t, s in zip(self.type, self.subtype)]
+
+        if key in ('tsft', 'seq', 'rssi', 'length'):
+            return getattr(self, key).tolist()
+
+        raise KeyError(key)
+
+    def to_dict(self):
+        """Return a columnar JSON-serializable representation of the
+        frames. Numeric fields are lists with one value per frame, the
+        other fields are dictionary encoded as {'values': [...], 'index':
+        [...]}, where index holds the position in values of the value of
+        every frame."""
+
+        out = {'count': len(self)}
+
+        for key in ('tsft', 'seq', 'rssi', 'rate', 'length'):
+            out[key] = self.column(key)
+
+        for key in ('ra', 'ta'):
+            out[key] = dictionary_encode(self.addrs(key),
+                                         lambda x: str(EtherAddress(x)))
+
+        out['rtype'] = dictionary_encode(self.mcs,
+                                         lambda x: "HT" if x else "LE")
+
+        out['type'] = dictionary_encode(self.type, lambda x: TYPES[x])
+
+        out['subtype'] = \
+            dictionary_encode(zip(self.type, self.subtype),
+                              lambda x: SUBTYPES[x[0]][x[1]])
+
+        return out
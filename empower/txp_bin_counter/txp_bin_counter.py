@@ -17,6 +17,8 @@
 
 """TXP bin counters module."""
 
+import time
+
 from construct import UBInt8
 from construct import Bytes
 from construct import Sequence
@@ -28,6 +30,9 @@ from construct import Array
 
 from empower.datatypes.etheraddress import EtherAddress
 from empower.lvapp.lvappserver import ModuleLVAPPWorker
+from empower.core.histogram import Histogram
+from empower.core.histogram import CUMULATIVE
+from empower.core.histogram import MODES
 from empower.core.module import Module
 from empower.core.app import EmpowerApp
 from empower.core.resourcepool import ResourceBlock
@@ -80,17 +85,20 @@ class TXPBinCounter(Module):
         self._mcast = None
         self._bins = [8192]
         self._block = None
+        self._mode = CUMULATIVE
 
         # data structures
         self.tx_packets = []
         self.tx_bytes = []
+        self._tx_hist = None
 
     def __eq__(self, other):
 
         return super().__eq__(other) and \
             self.mcast == other.mcast and \
             self.block == other.block and \
-            self.bins == other.bins
+            self.bins == other.bins and \
+            self.mode == other.mode
 
     @property
     def mcast(self):
@@ -172,12 +180,29 @@ class TXPBinCounter(Module):
 
             self._block = match.pop()
 
+    @property
+    def mode(self):
+        """Return the counters mode."""
+
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode):
+        """Set the counters mode, either cumulative (default) or delta
+        (difference with the previous report)."""
+
+        if mode not in MODES:
+            raise ValueError("mode must be one of %s" % ", ".join(MODES))
+
+        self._mode = mode
+
     def to_dict(self):
         """ Return a JSON-serializable dictionary representing the Stats """
 
         out = super().to_dict()
 
         out['bins'] = self.bins
+        out['mode'] = self.mode
         out['tx_bytes'] = self.tx_bytes
         out['tx_packets'] = self.tx_packets
 
@@ -203,6 +228,13 @@ class TXPBinCounter(Module):
             self.log.info("WTP %s not connected", wtp.addr)
             return
 
+        if wtp.connection.congested:
+            self.log.info("WTP %s congested", wtp.addr)
+            return
+
+        if self.worker.share_request(self, (self.block, self.mcast)):
+            return
+
         stats_req = Container(version=PT_VERSION,
                               type=PT_TXP_BIN_COUNTER_REQUEST,
                               length=26,
@@ -219,62 +251,8 @@ class TXPBinCounter(Module):
                       self.module_id)
 
         msg = TXP_BIN_COUNTER_REQUEST.build(stats_req)
-        wtp.connection.stream.write(msg)
-
-
-    def fill_bytes_samples(self, data):
-        """ Compute samples.
-
-        Samples are in the following format (after ordering):
-
-        [[60, 3], [66, 2], [74, 1], [98, 40], [167, 2], [209, 2], [1466, 1762]]
-
-        Each 2-tuple has format [ size, count ] where count is the number of
-        size-long (bytes, including the Ethernet 2 header) TX/RX by the LVAP.
-
-        """
+        wtp.connection.send_message(msg)
 
-        samples = sorted(data, key=lambda entry: entry[0])
-        out = [0] * len(self.bins)
-
-        for entry in samples:
-            if len(entry) == 0:
-                continue
-            size = entry[0]
-            count = entry[1]
-            for i in range(0, len(self.bins)):
-                if size <= self.bins[i]:
-                    out[i] = out[i] + size * count
-                    break
-
-        return out
-
-    def fill_packets_samples(self, data):
-        """ Compute samples.
-
-        Samples are in the following format (after ordering):
-
-        [[60, 3], [66, 2], [74, 1], [98, 40], [167, 2], [209, 2], [1466, 1762]]
-
-        Each 2-tuple has format [ size, count ] where count is the number of
-        size-long (bytes, including the Ethernet 2 header) TX/RX by the LVAP.
-
-        """
-
-        samples = sorted(data, key=lambda entry: entry[0])
-        out = [0] * len(self.bins)
-
-        for entry in samples:
-            if len(entry) == 0:
-                continue
-            size = entry[0]
-            count = entry[1]
-            for i in range(0, len(self.bins)):
-                if size <= self.bins[i]:
-                    out[i] = out[i] + count
-                    break
-
-        return out
 
     def handle_response(self, response):
         """Handle an incoming STATS_RESPONSE message.
@@ -284,9 +262,21 @@ class TXPBinCounter(Module):
             None
         """
 
+        if not self._tx_hist:
+            self._tx_hist = Histogram(self.bins, self.mode)
+
         # update this object
-        self.tx_bytes = self.fill_bytes_samples(response.stats)
-        self.tx_packets = self.fill_packets_samples(response.stats)
+        self._tx_hist.update(response.stats)
+
+        self.tx_bytes = self._tx_hist.bytes
+        self.tx_packets = self._tx_hist.packets
+
+        # update history
+        timestamp = time.time()
+
+        for metric in ('tx_bytes', 'tx_packets'):
+            self.record(self.mcast, metric, sum(getattr(self, metric)),
+                        timestamp)
 
         # call callback
         self.handle_callback(self)
@@ -18,7 +18,6 @@
 """VBSP Connection."""
 
 import time
-import tornado.ioloop
 import socket
 import sys
 
@@ -106,11 +105,7 @@ class VBSPConnection(object):
         self.vbs = None
         self.stream.set_close_callback(self._on_disconnect)
         self.__buffer = b''
-        self._hb_interval_ms = 500
-        self._hb_worker = tornado.ioloop.PeriodicCallback(self._heartbeat_cb,
-                                                          self._hb_interval_ms)
         self.endian = sys.byteorder
-        self._hb_worker.start()
         self._wait()
 
     def to_dict(self):
@@ -121,11 +116,18 @@ class VBSPConnection(object):
     def _heartbeat_cb(self):
         """Check if connection is still active."""
 
-        if self.vbs and not self.stream.closed():
-            timeout = (self.vbs.period / 1000) * 3
-            if (self.vbs.last_seen_ts + timeout) < time.time():
-                LOG.info('Client inactive %s at %r', self.vbs.addr, self.addr)
-                self.stream.close()
+        if not self.vbs or self.stream.closed():
+            return
+
+        timeout = (self.vbs.period / 1000) * 3
+        deadline = self.vbs.last_seen_ts + timeout
+
+        if deadline < time.time():
+            LOG.info('Client inactive %s at %r', self.vbs.addr, self.addr)
+            self.stream.close()
+            return
+
+        RUNTIME.timer_wheel.schedule(self, deadline, self._heartbeat_cb)
 
     def stream_send(self, message):
         """Send message."""
@@ -231,6 +233,10 @@ class VBSPConnection(object):
         vbs.last_seen = main_msg.head.seq
         vbs.last_seen_ts = time.time()
 
+        # start tracking the heartbeat of this connection
+        if self not in RUNTIME.timer_wheel:
+            self._heartbeat_cb()
+
     def _handle_enb_conf_repl(self, message):
         """Handle an incoming eNB configuration reply.
 
@@ -330,6 +336,8 @@ class VBSPConnection(object):
     def _on_disconnect(self):
         """Handle VBSP disconnection."""
 
+        RUNTIME.timer_wheel.cancel(self)
+
         if not self.vbs:
             return
 
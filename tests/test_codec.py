@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Equivalence of the compiled codecs and the construct definitions.
+
+Every compiled message of the LVAPP protocol and of the modules is built
+and parsed with random contents both with the compiled codec and with the
+original construct definition, the results must be identical.
+
+Run with: python3 -m unittest discover tests
+"""
+
+import random
+import unittest
+
+from construct import Struct
+from construct import UBInt8
+
+import empower.lvapp
+import empower.maps.maps
+import empower.counters.counters
+import empower.triggers.summary
+
+from empower.core.codec import CompiledStruct
+from empower.core.codec import compile_struct
+from empower.core.codec import random_message
+
+MODULES = [empower.lvapp,
+           empower.maps.maps,
+           empower.counters.counters,
+           empower.triggers.summary]
+
+# Random messages tested for every codec
+ITERATIONS = 200
+
+
+def compiled_messages():
+    """Return the compiled messages as (name, CompiledStruct)."""
+
+    out = []
+
+    for module in MODULES:
+        for name, value in sorted(vars(module).items()):
+            if isinstance(value, CompiledStruct):
+                out.append(("%s.%s" % (module.__name__, name), value))
+
+    return out
+
+
+class TestCodec(unittest.TestCase):
+    """Compiled codecs tests."""
+
+    def setUp(self):
+
+        self.rnd = random.Random(0)
+        self.messages = compiled_messages()
+
+    def samples(self, codec):
+        """Yield random messages and their construct encoding."""
+
+        for _ in range(ITERATIONS):
+            msg = random_message(self.rnd, codec)
+            yield msg, codec.construct.build(msg)
+
+    def test_compiled(self):
+        """The hot messages are compiled."""
+
+        names = [name for name, _ in self.messages]
+
+        for name in ["HELLO", "PROBE_REQUEST", "AUTH_REQUEST",
+                     "ASSOC_REQUEST", "CAPS", "STATUS_PORT"]:
+            self.assertIn("empower.lvapp.%s" % name, names)
+
+        self.assertIn("empower.maps.maps.POLLER_RESPONSE", names)
+        self.assertIn("empower.counters.counters.STATS_RESPONSE", names)
+        self.assertIn("empower.triggers.summary.SUMMARY_TRIGGER", names)
+
+    def test_fallback(self):
+        """Definitions that cannot be compiled are left to construct."""
+
+        self.assertIsInstance(empower.lvapp.ADD_LVAP, Struct)
+        self.assertIsInstance(empower.lvapp.STATUS_LVAP, Struct)
+
+        field = UBInt8("field")
+        self.assertIs(compile_struct(field), field)
+
+    def test_build(self):
+        """Compiled and construct builders produce the same bytes."""
+
+        for name, codec in self.messages:
+            with self.subTest(message=name):
+                for msg, data in self.samples(codec):
+                    self.assertEqual(codec.build(msg), data)
+
+    def test_parse(self):
+        """Compiled and construct parsers produce the same Container, from
+        bytes, bytearray and memoryview slices."""
+
+        for name, codec in self.messages:
+            with self.subTest(message=name):
+                for _, data in self.samples(codec):
+
+                    expected = codec.construct.parse(data)
+
+                    self.assertEqual(codec.parse(data), expected)
+                    self.assertEqual(codec.parse(bytearray(data)), expected)
+
+                    with memoryview(b'\x00' + data) as view:
+                        self.assertEqual(codec.parse(view[1:]), expected)
+
+    def test_round_trip(self):
+        """Parsing then building returns the original bytes."""
+
+        for name, codec in self.messages:
+            with self.subTest(message=name):
+                for _, data in self.samples(codec):
+                    self.assertEqual(codec.build(codec.parse(data)), data)
+
+    def test_trailing_bytes(self):
+        """Bytes after the end of the message are ignored."""
+
+        for name, codec in self.messages:
+            with self.subTest(message=name):
+                for _, data in self.samples(codec):
+                    self.assertEqual(codec.parse(data + b'\xff' * 8),
+                                     codec.construct.parse(data))
+
+    def test_truncated(self):
+        """Truncated messages are rejected."""
+
+        for name, codec in self.messages:
+            with self.subTest(message=name):
+                for _, data in self.samples(codec):
+
+                    if not data:
+                        continue
+
+                    cut = self.rnd.randint(0, len(data) - 1)
+
+                    with self.assertRaises(Exception):
+                        codec.construct.parse(data[:cut])
+
+                    with self.assertRaises(Exception):
+                        codec.parse(data[:cut])
+
+
+if __name__ == "__main__":
+    unittest.main()
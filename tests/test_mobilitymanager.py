@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Mobility manager handover planning.
+
+MobilityManager.plan is run against a minimal runtime holding a UCQM and
+the LVAPs hosted by every WTP, the max_load cap must account for the
+LVAPs of all the tenants.
+
+Run with: python3 -m unittest discover tests
+"""
+
+import unittest
+
+import empower.logger
+import empower.apps.mobilitymanager.mobilitymanager
+
+from empower.core.cqm import ChannelQualityMatrix
+from empower.apps.mobilitymanager.mobilitymanager import MobilityManager
+
+
+class Runtime(object):
+    """The parts of the runtime used by the planner."""
+
+    def __init__(self):
+
+        self.ucqm = ChannelQualityMatrix()
+        self.wtp_lvaps = {}
+
+    def load_wtp_lvaps(self, wtp):
+        """Return the LVAPs hosted by wtp, of all the tenants."""
+
+        return self.wtp_lvaps.get(wtp.addr, {})
+
+
+class Connection(object):
+    """A WTP connection."""
+
+    congested = False
+
+
+class WTP(object):
+    """A connected WTP."""
+
+    def __init__(self, addr):
+
+        self.addr = addr
+        self.connection = Connection()
+
+
+class Block(object):
+    """A resource block on channel 36."""
+
+    channel = 36
+    band = 0
+
+    def __init__(self, radio):
+
+        self.radio = radio
+
+
+class LVAP(object):
+    """An LVAP scheduled on block."""
+
+    def __init__(self, addr, block):
+
+        self.addr = addr
+        self.wtp = block.radio
+        self.default_block = block
+        self.scheduled_on = [block]
+
+
+class BlockIndex(object):
+    """The blocks of a tenant, by (channel, band)."""
+
+    def __init__(self, blocks):
+
+        self.by_channel = {(36, 0): blocks}
+
+
+class Tenant(object):
+    """A tenant with some blocks."""
+
+    def __init__(self, blocks):
+
+        self.block_index = BlockIndex(blocks)
+
+
+class Planner(MobilityManager):
+    """A mobility manager not bound to the runtime."""
+
+    def __init__(self, blocks, max_load):
+
+        # pylint: disable=super-init-not-called
+        self.log = empower.logger.get_logger()
+        self.limit = -90
+        self.hysteresis = 0
+        self.max_load = max_load
+        self.max_moves = 0
+        self.__tenant = Tenant(blocks)
+
+    @property
+    def tenant(self):
+        return self.__tenant
+
+
+class TestMobilityManager(unittest.TestCase):
+    """MobilityManager.plan tests."""
+
+    def setUp(self):
+
+        # the runtime is bound when the module is imported
+        self.runtime = empower.apps.mobilitymanager.mobilitymanager.RUNTIME
+        empower.apps.mobilitymanager.mobilitymanager.RUNTIME = Runtime()
+
+        self.wtps = [WTP("wtp0"), WTP("wtp1")]
+        self.blocks = [Block(x) for x in self.wtps]
+
+    def tearDown(self):
+
+        empower.apps.mobilitymanager.mobilitymanager.RUNTIME = self.runtime
+
+    def populate(self, lvaps, others):
+        """Host lvaps on wtp0 and others (of another tenant) on wtp1, all
+        of them heard better by wtp1."""
+
+        runtime = empower.apps.mobilitymanager.mobilitymanager.RUNTIME
+
+        for lvap in lvaps:
+            runtime.wtp_lvaps.setdefault("wtp0", {})[lvap.addr] = lvap
+
+        for addr in others:
+            runtime.wtp_lvaps.setdefault("wtp1", {})[addr] = None
+
+        runtime.ucqm.update(self.blocks[0],
+                            [(x.addr, 0, 0, 0, 0, -80) for x in lvaps])
+        runtime.ucqm.update(self.blocks[1],
+                            [(x.addr, 0, 0, 0, 0, -40) for x in lvaps])
+
+    def test_max_load_other_tenants(self):
+        """A WTP full of LVAPs of another tenant accepts no moves."""
+
+        lvaps = [LVAP("sta%u" % x, self.blocks[0]) for x in range(2)]
+        self.populate(lvaps, ["other0", "other1"])
+
+        moves, deferred = Planner(self.blocks, 2).plan(lvaps)
+
+        self.assertEqual(moves, [])
+        self.assertEqual(deferred, 2)
+
+    def test_max_load_staged_moves(self):
+        """The moves staged in the same pass count towards the cap."""
+
+        lvaps = [LVAP("sta%u" % x, self.blocks[0]) for x in range(3)]
+        self.populate(lvaps, ["other0"])
+
+        moves, deferred = Planner(self.blocks, 3).plan(lvaps)
+
+        self.assertEqual(len(moves), 2)
+        self.assertEqual(deferred, 1)
+        self.assertTrue(all(x[1] is self.blocks[1] for x in moves))
+
+
+if __name__ == "__main__":
+    unittest.main()
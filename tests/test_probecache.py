@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 Roberto Riggio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Probe request cache.
+
+Probe requests are fed to a ProbeCache backed by a minimal runtime, the
+LVAP must be spawned once per window on the least loaded of all the WTPs
+that heard the station, whatever the rate limits.
+
+Run with: python3 -m unittest discover tests
+"""
+
+import unittest
+import tornado.ioloop
+
+import empower.lvapp.probecache
+
+from empower.core.tenant import T_TYPE_UNIQUE
+from empower.lvapp.probecache import ProbeCache
+
+
+class Tenant(object):
+    """A non-shared tenant."""
+
+    bssid_type = T_TYPE_UNIQUE
+
+
+class Runtime(object):
+    """The parts of the runtime used by the probe cache."""
+
+    def __init__(self):
+
+        self.lvaps = {}
+        self.wtp_lvaps = {}
+
+    def load_wtp_lvaps(self, wtp):
+        """Return the LVAPs hosted by wtp."""
+
+        return self.wtp_lvaps.get(wtp, {})
+
+    @classmethod
+    def load_tenants(cls, addr):
+        """Every WTP belongs to a non-shared tenant."""
+
+        return {addr: Tenant()}
+
+
+class WTP(object):
+    """A connected WTP."""
+
+    def __init__(self, addr):
+
+        self.addr = addr
+        self.connection = Connection(self)
+
+
+class Connection(object):
+    """A WTP connection recording the spawned LVAPs."""
+
+    spawned = []
+
+    def __init__(self, wtp):
+
+        self.wtp = wtp
+
+    def spawn_lvap(self, sta, request):
+        """Record the spawn."""
+
+        self.spawned.append((sta, self.wtp))
+
+
+class TestProbeCache(unittest.TestCase):
+    """ProbeCache tests."""
+
+    def setUp(self):
+
+        # the runtime is bound when the module is imported
+        self.runtime = empower.lvapp.probecache.RUNTIME
+        empower.lvapp.probecache.RUNTIME = Runtime()
+
+        self.io_loop = tornado.ioloop.IOLoop()
+        self.io_loop.make_current()
+        Connection.spawned = []
+
+    def tearDown(self):
+
+        empower.lvapp.probecache.RUNTIME = self.runtime
+
+        self.io_loop.clear_current()
+        self.io_loop.close(all_fds=True)
+
+    def run_windows(self):
+        """Let the open windows close."""
+
+        self.io_loop.call_later(0.1, self.io_loop.stop)
+        self.io_loop.start()
+
+    def test_hearers_above_burst(self):
+        """All the hearers of an open window are kept."""
+
+        cache = ProbeCache(window=20, sta_burst=2, global_burst=2)
+        wtps = [WTP("wtp%u" % x) for x in range(10)]
+
+        # every wtp but the last one already hosts an lvap
+        for wtp in wtps[:-1]:
+            empower.lvapp.probecache.RUNTIME.wtp_lvaps[wtp] = {wtp.addr: None}
+
+        for wtp in wtps:
+            cache.probe("sta", wtp, wtp.connection, None)
+
+        self.assertEqual(cache.stats['absorbed'], len(wtps) - 1)
+        self.assertEqual(cache.stats['sta_limited'], 0)
+        self.assertEqual(cache.stats['global_limited'], 0)
+
+        self.run_windows()
+
+        self.assertEqual(Connection.spawned, [("sta", wtps[-1])])
+        self.assertEqual(cache.stats['spawned'], 1)
+
+    def test_windows_limited(self):
+        """The probe requests opening a window are rate limited."""
+
+        cache = ProbeCache(window=0, sta_rate=0.001, sta_burst=2)
+        wtp = WTP("wtp")
+
+        for _ in range(5):
+            cache.probe("sta", wtp, wtp.connection, None)
+
+        self.assertEqual(cache.stats['spawned'], 2)
+        self.assertEqual(cache.stats['sta_limited'], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()